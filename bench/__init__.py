@@ -0,0 +1,8 @@
+"""
+Offline benchmark suite for EDINET Data Getter
+
+Runs a full main() against a local stand-in for the EDINET API v2 that serves
+a synthetic corpus of filings. No network access or Google credentials needed.
+
+    python -m bench.run_benchmark --docs 200 --archive-mb 5
+"""
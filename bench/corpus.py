@@ -0,0 +1,222 @@
+"""
+Synthetic EDINET corpus: documents.json lists and filing archives (type=1 / type=5)
+"""
+import io
+import random
+import zipfile
+from datetime import date, timedelta
+from typing import Dict, List
+from xml.sax.saxutils import escape
+
+NAMESPACES = {
+    "xbrli": "http://www.xbrl.org/2003/instance",
+    "jppfs_cor": "http://disclosure.edinet-fsa.go.jp/taxonomy/jppfs/2023-12-01/jppfs_cor",
+    "jpcrp_cor": "http://disclosure.edinet-fsa.go.jp/taxonomy/jpcrp/2023-12-01/jpcrp_cor",
+}
+
+# 企業形式ごとのテキストブロックと、そこに載せる (ラベル, 要素ID, 期間種別)
+LAYOUTS = {
+    "regular": {
+        "prefix": "jpcrp030000-asr-001",
+        "blocks": {
+            "ConsolidatedBalanceSheetTextBlock": [
+                ("純資産合計", "jppfs_cor:NetAssets", "Instant"),
+                ("負債純資産合計", "jppfs_cor:LiabilitiesAndNetAssets", "Instant"),
+            ],
+            "ConsolidatedStatementOfIncomeTextBlock": [
+                ("売上高", "jppfs_cor:NetSales", "Duration"),
+                ("営業利益", "jppfs_cor:OperatingIncome", "Duration"),
+                ("当期純利益", "jppfs_cor:ProfitLoss", "Duration"),
+            ],
+            "ConsolidatedStatementOfCashFlowsTextBlock": [
+                ("営業活動によるキャッシュ・フロー", "jppfs_cor:NetCashProvidedByUsedInOperatingActivities", "Duration"),
+            ],
+        },
+    },
+    "fund": {
+        "prefix": "jpsps070000-asr-001",
+        "blocks": {
+            "BalanceSheetTextBlock": [
+                ("純資産合計", "jppfs_cor:NetAssets", "Instant"),
+                ("負債純資産合計", "jppfs_cor:LiabilitiesAndNetAssets", "Instant"),
+            ],
+            "StatementOfIncomeAndRetainedEarningsTextBlock": [
+                ("営業収益合計", "jppfs_cor:OperatingRevenue1", "Duration"),
+                ("営業利益又は営業損失", "jppfs_cor:OperatingIncome", "Duration"),
+                ("当期純利益又は当期純損失", "jppfs_cor:ProfitLoss", "Duration"),
+            ],
+        },
+    },
+}
+
+
+def make_document_list(target_date: str, docs: int, fund_ratio: float = 0.1, csv_ratio: float = 0.5, seed: int = 0) -> Dict:
+    """documents.json?type=2 と同じ形式の書類一覧を作る"""
+    rng = random.Random(f"{seed}-{target_date}")
+    day = date.fromisoformat(target_date)
+    results = []
+    for index in range(docs):
+        is_fund = rng.random() < fund_ratio
+        doc_id = f"S{day:%y%m%d}{index:04d}"
+        results.append({
+            "seqNumber": index + 1,
+            "docID": doc_id,
+            "edinetCode": f"E{index:05d}",
+            "secCode": None if is_fund else f"{1000 + index}0",
+            "JCN": None,
+            "filerName": f"ベンチマーク{'投資法人' if is_fund else '工業株式会社'}{index}",
+            "fundCode": f"G{index:05d}" if is_fund else None,
+            "ordinanceCode": "030" if is_fund else "010",
+            "formCode": "07A000" if is_fund else "030000",
+            "docTypeCode": "120",
+            "periodStart": (day - timedelta(days=365)).isoformat(),
+            "periodEnd": (day - timedelta(days=90)).isoformat(),
+            "submitDateTime": f"{target_date} 09:00",
+            "docDescription": "有価証券報告書－第1期",
+            "issuerEdinetCode": None,
+            "subjectEdinetCode": None,
+            "subsidiaryEdinetCode": None,
+            "currentReportReason": None,
+            "parentDocID": None,
+            "opeDateTime": None,
+            "withdrawalStatus": "0",
+            "docInfoEditStatus": "0",
+            "disclosureStatus": "0",
+            "xbrlFlag": "1",
+            "pdfFlag": "1",
+            "attachDocFlag": "1",
+            "englishDocFlag": "0",
+            "csvFlag": "1" if rng.random() < csv_ratio else "0",
+            "legalStatus": "1",
+        })
+    return {
+        "metadata": {
+            "title": "提出された書類を把握するためのAPI",
+            "parameter": {"date": target_date, "type": "2"},
+            "resultset": {"count": len(results)},
+            "processDateTime": f"{target_date} 23:59",
+            "status": "200",
+            "message": "OK",
+        },
+        "results": results,
+    }
+
+
+def _member_stem(doc: Dict) -> str:
+    layout = LAYOUTS["fund" if doc["fundCode"] else "regular"]
+    code = doc["fundCode"] or doc["edinetCode"]
+    return f"{layout['prefix']}_{code}-000_{doc['periodEnd']}_01_{doc['submitDateTime'][:10]}"
+
+
+def _facts_for(doc: Dict, rng: random.Random) -> List[tuple]:
+    """(ラベル, 要素ID, 期間種別, 当期の値, 前期の値, ブロック名) の一覧"""
+    layout = LAYOUTS["fund" if doc["fundCode"] else "regular"]
+    facts = []
+    for block_name, items in layout["blocks"].items():
+        for label, element_id, period_type in items:
+            current = rng.randint(-10**11, 10**12)
+            prior = rng.randint(-10**11, 10**12)
+            facts.append((label, element_id, period_type, current, prior, block_name))
+    return facts
+
+
+def filing_facts(doc: Dict, seed: int = 0) -> List[tuple]:
+    """
+    make_xbrl / make_csv_archive に載せる値の一覧（テストで期待値にする）。
+
+    Returns:
+        List[tuple]: (ラベル, 要素ID, 期間種別, 当期の値, 前期の値, ブロック名) の一覧（円単位）。
+    """
+    return _facts_for(doc, random.Random(f"{seed}-{doc['docID']}"))
+
+
+def _text_block(rows: List[tuple], filler_rows: int, rng: random.Random) -> str:
+    """前期・当期の2列を持つ表（百万円単位）をHTMLで作る"""
+    lines = ["<tr><th></th><th>前連結会計年度</th><th>当連結会計年度</th></tr>"]
+    for index in range(filler_rows):
+        lines.append(f"<tr><td><p>その他の項目{index}</p></td><td><p>{rng.randint(0, 99999):,}</p></td><td><p>{rng.randint(0, 99999):,}</p></td></tr>")
+    for label, current, prior in rows:
+        def cell(value):
+            millions = abs(value) // 10**6
+            return f"△{millions:,}" if value < 0 else f"{millions:,}"
+        lines.append(f"<tr><td><p>{label}</p></td><td><p>{cell(prior)}</p></td><td><p>{cell(current)}</p></td></tr>")
+    return f"<div><p>（単位：百万円）</p><table>{''.join(lines)}</table></div>"
+
+
+def make_xbrl(doc: Dict, xbrl_bytes: int, seed: int = 0) -> bytes:
+    """
+    指定サイズ程度のXBRLインスタンス文書を作る。
+
+    テキストブロック、タグ付きの値（当期・前期）に加え、サイズ調整用の
+    テキストブロックとダミーの値を含む。
+    """
+    rng = random.Random(f"{seed}-{doc['docID']}")
+    facts = _facts_for(doc, rng)
+    namespace_decl = " ".join(f'xmlns:{prefix}="{uri}"' for prefix, uri in NAMESPACES.items())
+
+    parts = [f'<?xml version="1.0" encoding="UTF-8"?>\n<xbrli:xbrl {namespace_decl}>']
+    for context_id in ("CurrentYearInstant", "Prior1YearInstant", "CurrentYearDuration", "Prior1YearDuration"):
+        parts.append(f'<xbrli:context id="{context_id}"><xbrli:entity><xbrli:identifier scheme="http://disclosure.edinet-fsa.go.jp">{doc["edinetCode"]}</xbrli:identifier></xbrli:entity></xbrli:context>')
+
+    # 本文の前に置かれる大きな注記ブロック（実際の書類でも財務諸表より前に大量の記述がある）
+    filler_block_bytes = max(0, xbrl_bytes // 2)
+    filler_text = escape("<div>" + "<p>事業の内容に関する記述。</p>" * (filler_block_bytes // 120 + 1) + "</div>")
+    parts.append(f'<jpcrp_cor:DescriptionOfBusinessTextBlock contextRef="CurrentYearDuration">{filler_text}</jpcrp_cor:DescriptionOfBusinessTextBlock>')
+
+    blocks = {}
+    for label, element_id, period_type, current, prior, block_name in facts:
+        blocks.setdefault(block_name, []).append((label, current, prior))
+    for block_name, rows in blocks.items():
+        html_text = escape(_text_block(rows, filler_rows=60, rng=rng))
+        parts.append(f'<jpcrp_cor:{block_name} contextRef="CurrentYearDuration">{html_text}</jpcrp_cor:{block_name}>')
+
+    for label, element_id, period_type, current, prior, block_name in facts:
+        for context_prefix, value in (("CurrentYear", current), ("Prior1Year", prior)):
+            parts.append(f'<{element_id} contextRef="{context_prefix}{period_type}" unitRef="JPY" decimals="-6">{value}</{element_id}>')
+
+    # 残りのサイズはダミーの値で埋める
+    size = sum(len(part.encode("utf-8")) for part in parts)
+    index = 0
+    while size < xbrl_bytes:
+        line = f'<jpcrp_cor:OtherItem{index} contextRef="CurrentYearDuration" unitRef="JPY" decimals="0">{rng.randint(0, 10**9)}</jpcrp_cor:OtherItem{index}>'
+        parts.append(line)
+        size += len(line)
+        index += 1
+
+    parts.append("</xbrli:xbrl>")
+    return "\n".join(parts).encode("utf-8")
+
+
+def make_xbrl_archive(doc: Dict, archive_bytes: int, xbrl_bytes: int, seed: int = 0) -> bytes:
+    """documents/{docID}?type=1 と同じ構成のZIP（PDF・画像相当の圧縮できないファイルでサイズを調整）"""
+    rng = random.Random(f"{seed}-{doc['docID']}-archive")
+    stem = _member_stem(doc)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr("XBRL/PublicDoc/0000000_header.htm", "<html><body>表紙</body></html>")
+        zip_file.writestr(f"XBRL/PublicDoc/{stem}.xbrl", make_xbrl(doc, xbrl_bytes, seed))
+        zip_file.writestr(f"XBRL/PublicDoc/{stem}.xsd", "<schema/>")
+        zip_file.writestr(f"XBRL/AuditDoc/jpaud-aar-cn-001_{doc['edinetCode']}-000_{doc['periodEnd']}_01.xbrl", "<xbrli:xbrl/>")
+        padding = max(0, archive_bytes - buffer.tell())
+        zip_file.writestr("XBRL/PublicDoc/images/image01.png", rng.getrandbits(8 * padding).to_bytes(padding, "little") if padding else b"", compress_type=zipfile.ZIP_STORED)
+    return buffer.getvalue()
+
+
+def make_csv_archive(doc: Dict, seed: int = 0) -> bytes:
+    """documents/{docID}?type=5 と同じ構成のZIP（UTF-16・タブ区切りのCSV）"""
+    rng = random.Random(f"{seed}-{doc['docID']}")
+    facts = _facts_for(doc, rng)
+    header = ("要素ID", "項目名", "コンテキストID", "相対年度", "連結・個別", "期間・時点", "ユニットID", "単位", "値")
+    rows = [header]
+    for label, element_id, period_type, current, prior, _ in facts:
+        for context_prefix, value in (("CurrentYear", current), ("Prior1Year", prior)):
+            rows.append((element_id, label, f"{context_prefix}{period_type}", context_prefix, "連結", period_type, "JPY", "円", str(value)))
+    for index in range(500):
+        rows.append((f"jpcrp_cor:OtherItem{index}", f"その他{index}", "CurrentYearDuration", "当期", "連結", "期間", "JPY", "円", str(rng.randint(0, 10**9))))
+    data = "\n".join("\t".join(f'"{cell}"' for cell in row) for row in rows).encode("utf-16")
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr(f"XBRL_TO_CSV/{_member_stem(doc)}.csv", data)
+        zip_file.writestr(f"XBRL_TO_CSV/jpaud-aar-cn-001_{doc['edinetCode']}-000_{doc['periodEnd']}_01.csv", "".encode("utf-16"))
+    return buffer.getvalue()
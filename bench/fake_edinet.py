@@ -0,0 +1,217 @@
+"""
+Local stand-in for the EDINET API v2 (documents.json / documents/{docID})
+"""
+import json
+import multiprocessing
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from bench import corpus
+
+API_PREFIX = "/api/v2"
+
+
+class FakeEdinetServer:
+    """
+    合成コーパスを返すEDINET API v2 互換のHTTPサーバー。
+
+    書類一覧は日付ごと、アーカイブは書類IDごとに生成してメモリに保持する。
+    latency を指定すると、各レスポンスの前にその秒数だけ待つ（回線の往復時間の模擬）。
+
+    Args:
+        docs_per_day (int): 1日あたりの書類数。
+        archive_bytes (int): XBRLアーカイブ（type=1）1件あたりのサイズ。
+        xbrl_bytes (int): アーカイブ内のインスタンス文書のサイズ。
+        fund_ratio (float): ファンド（fundCodeあり）の割合。
+        csv_ratio (float): csvFlag=1 の書類の割合。
+        latency (float): 応答ごとの遅延（秒）。
+        seed (int): 乱数シード。
+    """
+
+    def __init__(self, docs_per_day=50, archive_bytes=2 * 1024 * 1024, xbrl_bytes=512 * 1024,
+                 fund_ratio=0.1, csv_ratio=0.5, latency=0.0, seed=0):
+        self.docs_per_day = docs_per_day
+        self.archive_bytes = archive_bytes
+        self.xbrl_bytes = xbrl_bytes
+        self.fund_ratio = fund_ratio
+        self.csv_ratio = csv_ratio
+        self.latency = latency
+        self.seed = seed
+        self.requests = 0
+        self.bytes_sent = 0
+        self._docs = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    @lru_cache(maxsize=None)
+    def document_list(self, target_date):
+        document_list = corpus.make_document_list(
+            target_date, self.docs_per_day, self.fund_ratio, self.csv_ratio, self.seed
+        )
+        with self._lock:
+            for doc in document_list["results"]:
+                self._docs[doc["docID"]] = doc
+        return json.dumps(document_list, ensure_ascii=False).encode("utf-8")
+
+    @lru_cache(maxsize=None)
+    def archive(self, doc_id, doc_type):
+        doc = self._docs[doc_id]
+        if doc_type == "5":
+            return corpus.make_csv_archive(doc, self.seed)
+        return corpus.make_xbrl_archive(doc, self.archive_bytes, self.xbrl_bytes, self.seed)
+
+    def prepare(self, target_date):
+        """計測に生成時間が含まれないよう、指定日の書類一覧とアーカイブを事前に生成する"""
+        self.document_list(target_date)
+        for doc_id in list(self._docs):
+            self.archive(doc_id, "1")
+            if self._docs[doc_id]["csvFlag"] == "1":
+                self.archive(doc_id, "5")
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                if server.latency:
+                    time.sleep(server.latency)
+
+                if url.path == "/_stats":
+                    with server._lock:
+                        stats = {"requests": server.requests, "bytes_sent": server.bytes_sent}
+                    self._send(200, "application/json", json.dumps(stats).encode("utf-8"), count=False)
+                elif url.path == f"{API_PREFIX}/documents.json":
+                    self._send(200, "application/json; charset=utf-8", server.document_list(query.get("date", "")))
+                elif url.path.startswith(f"{API_PREFIX}/documents/"):
+                    doc_id = url.path.rsplit("/", 1)[-1]
+                    if doc_id not in server._docs:
+                        self._send(404, "application/json", b'{"metadata": {"status": "404"}}')
+                        return
+                    archive = server.archive(doc_id, query.get("type", "1"))
+                    range_header = self.headers.get("Range", "")
+                    if range_header.startswith("bytes=-"):
+                        # 末尾の指定バイト数だけを返す（セントラルディレクトリの先読み用）
+                        tail = archive[-int(range_header[len("bytes=-"):]):]
+                        content_range = f"bytes {len(archive) - len(tail)}-{len(archive) - 1}/{len(archive)}"
+                        self._send(206, "application/octet-stream", tail, {"Content-Range": content_range})
+                    else:
+                        self._send(200, "application/octet-stream", archive)
+                else:
+                    self._send(404, "text/plain", b"not found")
+
+            def _send(self, status, content_type, body, headers=None, count=True):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+                if not count:
+                    return
+                with server._lock:
+                    server.requests += 1
+                    server.bytes_sent += len(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self, host="127.0.0.1", port=0):
+        """バックグラウンドスレッドでサーバーを起動し、APIのベースURLを返す"""
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def _serve(options, target_date, connection):
+    fake = FakeEdinetServer(**options)
+    fake.prepare(target_date)
+    connection.send(fake.start())
+    connection.recv()  # 停止の合図を待つ
+    fake.stop()
+
+
+class FakeEdinetProcess:
+    """
+    FakeEdinetServer を別プロセスで動かす。
+
+    合成コーパスをベンチマーク対象と同じプロセスのメモリに置かないため、
+    計測するピークRSSにサーバー側の使用量が含まれない。
+    """
+
+    def __init__(self, target_date, **options):
+        self.target_date = target_date
+        self.options = options
+        self.base_url = None
+        self._process = None
+        self._connection = None
+
+    def start(self):
+        """コーパスを生成してサーバーを起動し、APIのベースURLを返す"""
+        self._connection, child_connection = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=_serve, args=(self.options, self.target_date, child_connection), daemon=True
+        )
+        self._process.start()
+        self.base_url = self._connection.recv()
+        return self.base_url
+
+    def stats(self):
+        """これまでのリクエスト数と送信バイト数"""
+        import requests
+
+        return requests.get(self.base_url.replace(API_PREFIX, "/_stats"), timeout=10).json()
+
+    def stop(self):
+        if self._process is not None:
+            self._connection.send("stop")
+            self._process.join(timeout=10)
+            self._process = None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="EDINET API v2 のローカル模擬サーバー")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--docs", type=int, default=50, help="1日あたりの書類数")
+    parser.add_argument("--archive-mb", type=float, default=2.0)
+    parser.add_argument("--latency", type=float, default=0.0, help="応答ごとの遅延（秒）")
+    args = parser.parse_args()
+
+    fake = FakeEdinetServer(docs_per_day=args.docs, archive_bytes=int(args.archive_mb * 1024 * 1024), latency=args.latency)
+    print(f"EDINET_API_BASE_URL={fake.start(port=args.port)}")
+    try:
+        fake._thread.join()
+    except KeyboardInterrupt:
+        fake.stop()
@@ -0,0 +1,125 @@
+"""
+Import-time budget check: measures `python -X importtime` for the entry points
+
+    python -m bench.import_budget
+    python -m bench.import_budget --budget-ms 250 --repeat 5 --top 15
+    python -m bench.import_budget --target module.financials --json import_budget.json
+
+Each target is imported in a fresh interpreter. The check fails (exit code 1)
+if the import takes longer than the budget, pulls in a module that should only
+be loaded on first use, or leaves threads running after the import.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 使うときまで読み込まないはずのモジュール（トップレベルのパッケージ名）
+LAZY_MODULES = ("pandas", "numpy", "lxml", "bs4", "gspread", "oauth2client", "tkinter", "tkcalendar", "pyarrow")
+
+DEFAULT_TARGETS = ("edinet_processer", "module.financials", "module.config")
+
+# インポート後に出力する、副作用の確認用の情報
+_PROBE = (
+    "import threading, json; __import__({target!r}); "
+    "print(json.dumps({{'threads': threading.active_count()}}))"
+)
+
+
+def measure(target: str):
+    """
+    新しいインタープリターで target をインポートし、インポート時間とスレッド数を返す。
+
+    Returns:
+        dict: total_ms（target の累積時間）、modules（target のインポートで読み込まれた
+            モジュール名 -> 累積ミリ秒。インタープリターの起動時に読み込まれるものは除く）、threads。
+    """
+    modules, stdout = _importtime(_PROBE.format(target=target))
+    startup, _ = _importtime("import threading, json")
+    return {
+        "total_ms": modules.get(target, 0.0),
+        "modules": {name: ms for name, ms in modules.items() if name not in startup},
+        "threads": json.loads(stdout.strip().splitlines()[-1])["threads"],
+    }
+
+
+def _importtime(code: str):
+    """`python -X importtime -c code` を実行し、（モジュール名 -> 累積ミリ秒, 標準出力）を返す"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True, encoding="utf-8",
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"インポートに失敗しました: {code}\n{result.stderr}")
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # 見出し行
+        modules[name.strip()] = int(cumulative) / 1000
+    return modules, result.stdout
+
+
+def check(target: str, budget_ms: float, repeat: int):
+    """repeat 回測って最小値を使い、予算・遅延読み込み・スレッドを確認する"""
+    runs = [measure(target) for _ in range(max(1, repeat))]
+    best = min(runs, key=lambda run: run["total_ms"])
+    eager = sorted({name.split(".")[0] for name in best["modules"]} & set(LAZY_MODULES))
+    problems = []
+    if best["total_ms"] > budget_ms:
+        problems.append(f"インポート時間 {best['total_ms']:.1f} ms が予算 {budget_ms} ms を超えています")
+    if eager:
+        problems.append(f"インポート時に読み込まれています: {', '.join(eager)}")
+    if best["threads"] > 1:
+        problems.append(f"インポート後に {best['threads'] - 1} 個のスレッドが動いています")
+    return {
+        "target": target,
+        "total_ms": round(best["total_ms"], 1),
+        "budget_ms": budget_ms,
+        "runs_ms": [round(run["total_ms"], 1) for run in runs],
+        "threads": best["threads"],
+        "eager_modules": eager,
+        "slowest": sorted(best["modules"].items(), key=lambda item: item[1], reverse=True),
+        "problems": problems,
+    }
+
+
+def print_report(reports, top: int):
+    for report in reports:
+        status = "OK" if not report["problems"] else "NG"
+        print(f"\n== {report['target']}: {report['total_ms']} ms (budget {report['budget_ms']} ms) [{status}]")
+        for problem in report["problems"]:
+            print(f"   ! {problem}")
+        print(f"   {'module':<48}{'cumulative ms':>14}")
+        for name, cumulative in report["slowest"][:top]:
+            print(f"   {name:<48}{cumulative:>14.1f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="エントリーポイントのインポート時間の予算チェック")
+    parser.add_argument("--target", action="append", help="計測するモジュール（複数指定可）")
+    parser.add_argument("--budget-ms", type=float, default=300.0, help="1モジュールあたりのインポート時間の上限")
+    parser.add_argument("--repeat", type=int, default=3, help="計測回数（最小値を使う）")
+    parser.add_argument("--top", type=int, default=10, help="表示する遅いモジュールの数")
+    parser.add_argument("--json", type=Path, help="結果をJSONで保存するパス")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    reports = [check(target, args.budget_ms, args.repeat) for target in (args.target or DEFAULT_TARGETS)]
+    print_report(reports, args.top)
+    if args.json:
+        for report in reports:
+            report["slowest"] = report["slowest"][:args.top]
+        args.json.write_text(json.dumps(reports, ensure_ascii=False, indent=2), encoding="utf-8")
+    sys.exit(1 if any(report["problems"] for report in reports) else 0)
@@ -0,0 +1,282 @@
+"""
+End-to-end benchmark: runs edinet_processer.main() against the fake EDINET server
+
+    python -m bench.run_benchmark --docs 100 --archive-mb 5 --latency 0.05
+    python -m bench.run_benchmark --docs 100 --warm        # 2回目（キャッシュあり）も計測
+    python -m bench.run_benchmark --json bench_result.json
+    python -m bench.run_benchmark --docs 100 --profile      # ステージごとの pstats・メモリ確保を log/profile/ に保存
+"""
+import argparse
+import json
+import logging
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.fake_edinet import FakeEdinetProcess
+
+
+class StageTimer:
+    """ステージごとの処理時間（開始・終了時刻）をスレッドセーフに記録する"""
+
+    def __init__(self):
+        self.spans = {}
+        self.walls = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, start, end):
+        with self._lock:
+            self.spans.setdefault(stage, []).append((start, end))
+
+    def record_latency(self, stage, elapsed, wall_stage):
+        """
+        開始時刻が取れない処理（別プロセスでの解析など）の経過時間を記録する。
+        スループットは wall_stage の実時間で計算する。
+        """
+        with self._lock:
+            self.spans.setdefault(stage, []).append((None, elapsed))
+            self.walls[stage] = wall_stage
+
+    def wrap(self, stage, function):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(stage, start, time.perf_counter())
+        return timed
+
+    def summary(self):
+        """ステージごとの件数・スループット（件/秒, 並列実行を考慮した実時間あたり）・レイテンシの分位点"""
+        report = {}
+        for stage, spans in self.spans.items():
+            if stage in self.walls:
+                latencies = sorted(elapsed for _, elapsed in spans)
+                wall_spans = self.spans.get(self.walls[stage], [])
+            else:
+                latencies = sorted(end - start for start, end in spans)
+                wall_spans = spans
+            wall = (max(end for _, end in wall_spans) - min(start for start, _ in wall_spans)) if wall_spans else 0.0
+            report[stage] = {
+                "count": len(spans),
+                "wall_seconds": round(wall, 4),
+                "throughput_per_second": round(len(spans) / wall, 2) if wall > 0 else None,
+                "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+                "max_ms": round(latencies[-1] * 1000, 2),
+            }
+        return report
+
+
+def percentile(sorted_values, q):
+    """ソート済みの値の q パーセンタイル（線形補間）"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def peak_rss_mb(who="self"):
+    """ピークRSS（MB）。resource モジュールがない環境では None"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    # Linux は KB、macOS は byte 単位
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(usage.ru_maxrss / divisor, 1)
+
+
+def timed_analyze(doc, member):
+    """
+    解析ステージの計測用ラッパー。
+
+    解析プロセス内で計測した時間とピークRSSを結果と一緒に返す
+    （spawn 環境でも親プロセスの状態に依存しないようにするため）。
+    """
+    from module.financials import analyze_filing
+    from module.pipeline import Fallback
+
+    start = time.perf_counter()
+    row = analyze_filing(doc, member)
+    if isinstance(row, Fallback):
+        # パイプラインがXBRLを取得し直して解析するため、計測値を付けずにそのまま返す
+        return row
+    return row, time.perf_counter() - start, peak_rss_mb()
+
+
+def instrument(processer, fetch_module, timer, workdir, parse_peaks):
+    """edinet_processer をベンチマーク用に差し替える（一時フォルダ・計測・書き込み先）"""
+    from module.archive_cache import ArchiveCache
+    from module.config import config
+    from module.document_index import DocumentListIndex
+    from module.ledger import ProcessingLedger
+    from module.timeseries import TimeSeriesStore
+
+    # 出力先はすべて一時フォルダにする
+    for key in ("json_folder", "md_folder", "output_folder", "metrics_folder"):
+        config[key] = workdir / key
+        config[key].mkdir(exist_ok=True)
+    processer.archive_cache = ArchiveCache(workdir / "archives", config['archive_cache_max_bytes'])
+    fetch_module.document_index = DocumentListIndex(workdir / "document_lists.sqlite3")
+    # 毎回新しい台帳にして、2回目もキャッシュ経由で全件を処理させる
+    processer.ledger = ProcessingLedger(workdir / f"ledger_{time.time_ns()}.sqlite3")
+    processer.timeseries = TimeSeriesStore(workdir / f"timeseries_{time.time_ns()}.sqlite3")
+
+    # Googleスプレッドシートには書き込まない（ローカルの出力先は一時フォルダに書き込む）
+    processer.write_to_spreadsheet = lambda data: None
+
+    list_documents = fetch_module.fetch_edinet_documents
+    processer.fetch_edinet_documents = timer.wrap(
+        "list", lambda date, key, save_json=True, **kwargs: list_documents(date, key, save_json=False, **kwargs)
+    )
+    processer.fetch_xbrl = timer.wrap("fetch", processer.fetch_xbrl)
+    processer.fetch_xbrl_fallback = timer.wrap("fetch", processer.fetch_xbrl_fallback)
+    processer.read_xbrl_member = timer.wrap("extract", processer.read_xbrl_member)
+    processer.read_csv_member = timer.wrap("extract_csv", processer.read_csv_member)
+
+    run_pipeline = processer.run_pipeline
+
+    def timed_pipeline(items, fetch, analyze, **kwargs):
+        on_result = kwargs.pop("on_result", None)
+        if on_result is not None:
+            # 台帳には計測値を除いた解析結果だけを渡す
+            kwargs["on_result"] = lambda item, output: on_result(item, output[0] if output else None)
+        start = time.perf_counter()
+        outputs = run_pipeline(items, fetch, timed_analyze, **kwargs)
+        timer.record("pipeline", start, time.perf_counter())
+        rows = []
+        for output in outputs:
+            if output is None:
+                rows.append(None)
+                continue
+            row, elapsed, peak = output
+            # 解析は別プロセスの場合があるため、経過時間だけを記録する
+            timer.record_latency("analyze", elapsed, wall_stage="pipeline")
+            if peak is not None:
+                parse_peaks.append(peak)
+            rows.append(row)
+        return rows
+
+    processer.run_pipeline = timed_pipeline
+
+
+def run(args):
+    from module.config import config
+
+    config['max_download_workers'] = args.download_workers
+    config['max_parse_workers'] = args.parse_workers
+    config['use_csv_extraction'] = not args.no_csv
+    config['archive_range_probe'] = args.range_probe
+    # ローカルサーバー相手なのでレート制限はかけない（共有クライアントは初回利用時に作られる）
+    config['edinet_requests_per_second'] = 0
+
+    import edinet_processer
+    from module import fetch_edinet_documents as fetch_module
+    from module.logger import setup_logger
+
+    # main() より先にログを設定しておき、レベルの変更が上書きされないようにする
+    setup_logger()
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    fake = FakeEdinetProcess(
+        args.date,
+        docs_per_day=args.docs,
+        archive_bytes=int(args.archive_mb * 1024 * 1024),
+        xbrl_bytes=int(args.xbrl_mb * 1024 * 1024),
+        fund_ratio=args.fund_ratio,
+        csv_ratio=args.csv_ratio,
+        latency=args.latency,
+    )
+    config['edinet_api_base_url'] = fake.start()
+
+    reports = []
+    try:
+        with tempfile.TemporaryDirectory(prefix="edinet_bench_") as tmp:
+            workdir = Path(tmp)
+            original = {name: getattr(edinet_processer, name) for name in (
+                "fetch_edinet_documents", "fetch_xbrl", "read_xbrl_member", "read_csv_member", "run_pipeline"
+            )}
+            for run_index in range(2 if args.warm else 1):
+                for name, function in original.items():
+                    setattr(edinet_processer, name, function)
+                timer = StageTimer()
+                parse_peaks = []
+                instrument(edinet_processer, fetch_module, timer, workdir, parse_peaks)
+
+                stats_before = fake.stats()
+                start = time.perf_counter()
+                final_data = edinet_processer.main(
+                    args.docs, start_date=args.date, profile=args.profile, profile_sample_every=args.profile_sample
+                ) or []
+                elapsed = time.perf_counter() - start
+                timer.record("total", start, start + elapsed)
+                stats_after = fake.stats()
+
+                reports.append({
+                    "run": "warm" if run_index else "cold",
+                    "documents": args.docs,
+                    "rows": len(final_data),
+                    "elapsed_seconds": round(elapsed, 3),
+                    "documents_per_second": round(args.docs / elapsed, 2) if elapsed > 0 else None,
+                    "http_requests": stats_after["requests"] - stats_before["requests"],
+                    "downloaded_mb": round((stats_after["bytes_sent"] - stats_before["bytes_sent"]) / 1024 / 1024, 2),
+                    "stages": timer.summary(),
+                    "peak_rss_mb": peak_rss_mb(),
+                    "peak_rss_parse_workers_mb": max(parse_peaks) if args.parse_workers and parse_peaks else None,
+                })
+    finally:
+        fake.stop()
+    return reports
+
+
+def print_report(reports):
+    for report in reports:
+        print(f"\n== {report['run']} run: {report['rows']}/{report['documents']} rows in {report['elapsed_seconds']}s "
+              f"({report['documents_per_second']} docs/s, {report['http_requests']} requests, {report['downloaded_mb']} MB)")
+        print(f"   peak RSS: main {report['peak_rss_mb']} MB, parse workers {report['peak_rss_parse_workers_mb'] or '-'} MB")
+        print(f"   {'stage':<12}{'count':>7}{'docs/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for stage, stats in report["stages"].items():
+            print(f"   {stage:<12}{stats['count']:>7}{stats['throughput_per_second'] or '-':>10}"
+                  f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="EDINETデータ取得処理のベンチマーク（オフライン）")
+    parser.add_argument("--docs", type=int, default=50, help="処理する書類数")
+    parser.add_argument("--date", default="2025-06-27", help="書類一覧の日付")
+    parser.add_argument("--archive-mb", type=float, default=2.0, help="XBRLアーカイブ1件のサイズ")
+    parser.add_argument("--xbrl-mb", type=float, default=0.5, help="インスタンス文書1件のサイズ")
+    parser.add_argument("--fund-ratio", type=float, default=0.1, help="ファンドの割合")
+    parser.add_argument("--csv-ratio", type=float, default=0.5, help="csvFlag=1 の割合")
+    parser.add_argument("--no-csv", action="store_true", help="CSVからの抽出を無効にする")
+    parser.add_argument("--range-probe", action="store_true", help="ダウンロード前に Range でセントラルディレクトリを確認する")
+    parser.add_argument("--latency", type=float, default=0.0, help="応答ごとの遅延（秒）")
+    parser.add_argument("--download-workers", type=int, default=4)
+    parser.add_argument("--parse-workers", type=int, default=2)
+    parser.add_argument("--warm", action="store_true", help="キャッシュが効いた2回目も計測する")
+    parser.add_argument("--profile", action="store_true", help="ステージごとに cProfile・tracemalloc で計測する")
+    parser.add_argument("--profile-sample", type=int, default=1, help="N社に1社だけ計測する")
+    parser.add_argument("--verbose", action="store_true", help="INFOレベルのログも出力する")
+    parser.add_argument("--json", type=Path, help="結果をJSONで保存するパス")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    reports = run(args)
+    print_report(reports)
+    if args.json:
+        args.json.write_text(json.dumps(reports, ensure_ascii=False, indent=2), encoding="utf-8")
@@ -1,29 +1,36 @@
+import argparse
+import os
 import requests
 import zipfile
-import io
-import os
-import pandas as pd
-import gspread
-from bs4 import BeautifulSoup
-import lxml
-import sys
-from oauth2client.service_account import ServiceAccountCredentials
-try:
-    import tkinter as tk
-    from tkinter import messagebox
-    from tkcalendar import Calendar
-    TKINTER_AVAILABLE = True
-except ImportError:
-    TKINTER_AVAILABLE = False
-    print("Warning: tkinter not available. GUI features will be disabled.")
-from datetime import datetime
-
-from module.fetch_edinet_documents import *
-from module.xbrl_reader import *
-from module.logger import *
+from functools import partial
+from itertools import chain, islice
+from typing import Dict
+
+from module.fetch_edinet_documents import fetch_edinet_documents, fetch_edinet_documents_range, prefetch_document_lists
+from module.document_filter import DocumentFilter
+from module.logger import log_long_msg, logger, setup_logger
 from module.config import config
+from module.archive_cache import ArchiveCache
 from module.docs import save_run_summary, save_config_documentation
-
+from module.financials import analyze_filing, preload_parsers
+from module.ledger import ProcessingLedger
+from module.metrics import count, document, save_run_metrics, stage, start_run
+from module.edinet_client import shared_client
+from module.pipeline import run_pipeline
+from module.profiling import start_profiling, stop_profiling
+from module.ratios import apply_ratios
+from module.sheets_writer import write_rows
+from module.sinks import build_sinks, write_to_sinks
+from module.timeseries import TimeSeriesStore
+from module.xbrl_archive import (
+    CENTRAL_DIRECTORY_PROBE_BYTES, match_csv_member, match_xbrl_member, member_names_from_tail,
+    read_csv_member, read_xbrl_member,
+)
+
+# pandas・lxml・gspread・oauth2client・tkinter は使うときに読み込む
+# （インポートだけなら認証もGUIの読み込みも行わず、ワーカープロセスの起動も軽くする）
+tk = messagebox = Calendar = None
+TKINTER_AVAILABLE = None  # load_gui() の初回呼び出しで判定する
 
 DATE_FOR_SHEET = "YYYY-MM-DD"
 # Configuration is now handled by config.py
@@ -34,60 +41,193 @@ EDINET_API_KEY = config['edinet_api_key']
 ##Google API認証（事前にJSONキーをダウンロードして設定）
 SERVICE_ACCOUNT_FILE = str(config['google_service_account_file'])
 scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-creds = ServiceAccountCredentials.from_json_keyfile_name(SERVICE_ACCOUNT_FILE, scope)
-client = gspread.authorize(creds)
+client = None
 
 
-# XBRLファイルをダウンロード & 解凍
-def download_and_extract_xbrl(download_url, save_folder=None, fund_code:str = "G12239"):
-    from module.logger import logger
-    
-    if save_folder is None:
-        save_folder = str(config['xbrl_folder'])
-    os.makedirs(save_folder, exist_ok=True)
+def get_client():
+    """gspread クライアントを初回利用時に認証して返す（認証情報がなくてもインポートはできる）"""
+    global client
+    if client is None:
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+
+        creds = ServiceAccountCredentials.from_json_keyfile_name(SERVICE_ACCOUNT_FILE, scope)
+        client = gspread.authorize(creds)
+    return client
+
+# 書類IDをキーにしたダウンロード済みアーカイブのキャッシュ（再実行時はネットワークを使わない）
+archive_cache = ArchiveCache(config['archive_cache_folder'], config['archive_cache_max_bytes'])
+
+# 書類IDごとの処理状態と結果の台帳（途中で止まっても再実行時に続きから処理する）
+ledger = ProcessingLedger(config['ledger_file'])
+
+# 会社・期末日ごとの値の時系列（1つの書類から当期と前期の値を保存する）
+timeseries = TimeSeriesStore(config['timeseries_file'])
+
+# 処理済みかどうかを台帳に1回で問い合わせる書類の数
+LEDGER_LOOKUP_BATCH = 100
+
+
+# XBRLファイルをダウンロードし、対象の .xbrl だけをメモリ上で取り出す
+def download_and_extract_xbrl(download_url, codes, doc_id=None):
+    """
+    書類のZIPをチャンク単位でストリーミングしながら一時ファイル（一定サイズまではメモリ）に
+    受け取り、ディスクに展開せずに対象のXBRLを取り出す。
+    XBRLも同じサイズを超える場合は一時ファイルに展開する（解析後に XbrlMember.discard で削除）。
+
+    codes は優先順（fundコード -> EDINETコード など）に、同じアーカイブに対して試す。
+    doc_id を渡すと、アーカイブキャッシュにあればダウンロードせずにそれを使う。
+    見つからなければ None を返す。
+    """
+    # 大きなXBRLはメモリに読み込まず一時ファイルに展開し、解析ワーカーにはパスだけを渡す
+    read_member = partial(read_xbrl_member, spool_max_bytes=config['download_spool_max_bytes'])
+    return _download_and_read_member(download_url, codes, doc_id, read_member, match_xbrl_member, "XBRL")
 
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36",
-    }
+
+# CSV形式（type=5）のZIPをダウンロードし、本文のCSVだけをメモリ上で取り出す
+def download_and_extract_csv(download_url, codes, doc_id=None):
+    """download_and_extract_xbrl のCSV版。キャッシュのキーは `{doc_id}_csv`。"""
+    cache_key = f"{doc_id}_csv" if doc_id else None
+    return _download_and_read_member(download_url, codes, cache_key, read_csv_member, match_csv_member, "CSV")
+
+
+def _download_and_read_member(download_url, codes, cache_key, read_member, match_member, label):
+    from module.logger import logger
 
     params = {
         "Subscription-Key": EDINET_API_KEY
     }
     
+    archive = None
     try:
-        response = requests.get(download_url, headers=headers, params=params)
-        response.raise_for_status()  # HTTPエラーが発生した場合は例外を発生させる
-        
-        zip_path = os.path.join(save_folder, "edinet_xbrl.zip")
-        with open(zip_path, "wb") as f:
-            f.write(response.content)
-
-        with zipfile.ZipFile(zip_path, "r") as zip_ref:
-            zip_ref.extractall(save_folder)
-            
-        logger.info(f"✅ XBRLダウンロード・解凍完了: {fund_code}")
-
-        folder_public_doc = os.path.abspath(os.path.join(save_folder, "XBRL/PublicDoc"))
-        # XBRLファイルを検索
-        for root, _, files in os.walk(folder_public_doc):
-            for file in files:
-                if file.endswith(".xbrl") and fund_code and (fund_code in file):
-                    target_xbrl = os.path.join(root, file)
-                    log_long_msg(f"見つかったXBRLファイル: {target_xbrl}")
-                    return target_xbrl
-                    
-        logger.warning(f"⚠️ {fund_code} に該当するXBRLファイルが見つかりませんでした")
-        return None
+        archive = archive_cache.get(cache_key)
+        from_cache = archive is not None
+        if from_cache:
+            logger.info(f"♻️ キャッシュ済みのアーカイブを使用します: {cache_key}")
+            count("cache_hits")
+        else:
+            count("cache_misses")
+            if config['archive_range_probe']:
+                with stage("range_probe"):
+                    may_contain = _archive_may_contain(download_url, params, codes, match_member)
+                if not may_contain:
+                    logger.warning(f"⚠️ {codes} に該当する{label}ファイルがないため、ダウンロードを中止しました")
+                    count("range_probe_skips")
+                    return None
+            # 接続の使い回し・タイムアウト・再試行・レート制限は共有クライアントが行う
+            # 本文はチャンク単位で受け取り、一定サイズを超えた分は一時ファイルに書き出す
+            with stage("download") as span:
+                archive = shared_client().download(download_url, params=params, max_memory=config['download_spool_max_bytes'])
+                span.add_bytes(archive.seek(0, os.SEEK_END))
+                archive.seek(0)
+
+        # ZIPのセントラルディレクトリから対象メンバーを探し、そのメンバーだけを読み込む
+        with stage("unzip"):
+            member = read_member(archive, codes)
+        logger.info(f"✅ {label}ダウンロード・解凍完了: {codes}")
+
+        # ZIPとして読めたアーカイブだけをキャッシュする
+        if not from_cache:
+            try:
+                archive_cache.put(cache_key, archive)
+            except Exception as e:
+                logger.exception(f"アーカイブのキャッシュ保存に失敗しましたが、処理を続けます: {cache_key}")
+
+        if member is None:
+            logger.warning(f"⚠️ {codes} に該当する{label}ファイルが見つかりませんでした")
+            return None
+
+        log_long_msg(f"見つかった{label}ファイル: {member.name}")
+        return member
         
     except requests.exceptions.RequestException as e:
-        logger.exception(f"XBRLダウンロード中にネットワークエラーが発生しました: {fund_code}")
+        logger.exception(f"{label}ダウンロード中にネットワークエラーが発生しました: {codes}")
         raise
     except zipfile.BadZipFile as e:
-        logger.exception(f"ZIPファイルの解凍に失敗しました: {fund_code}")
+        logger.exception(f"ZIPファイルの解凍に失敗しました: {codes}")
         raise
     except Exception as e:
-        logger.exception(f"XBRLダウンロード・解凍中に予期しないエラーが発生しました: {fund_code}")
+        logger.exception(f"{label}ダウンロード・解凍中に予期しないエラーが発生しました: {codes}")
         raise
+    finally:
+        if archive is not None:
+            archive.close()
+
+
+def _archive_may_contain(download_url, params, codes, match_member):
+    """
+    Range リクエストでアーカイブの末尾だけを取得し、セントラルディレクトリに
+    対象のメンバーがあるかを調べる。判定できない場合（Range 非対応など）は True。
+    """
+    from module.logger import logger
+
+    try:
+        tail = shared_client().fetch_tail(download_url, params=params, size=CENTRAL_DIRECTORY_PROBE_BYTES)
+    except requests.exceptions.RequestException as e:
+        logger.exception(f"アーカイブ末尾の取得に失敗しました。通常どおりダウンロードします: {codes}")
+        return True
+    if tail is None:
+        return True
+    names = member_names_from_tail(*tail)
+    if names is None:
+        return True
+    return match_member(names, codes) is not None
+
+
+# パイプラインのネットワークステージ: 1書類分のCSVまたはXBRLを取得して返す
+def fetch_xbrl(doc):
+    with document(doc["書類ID"]), stage("fetch") as span:
+        member = _fetch_member(doc)
+        if member is None:
+            span.fail()
+        return member
+
+
+# CSVから当期の値が取れなかった書類について、パイプラインが代わりにXBRLを取得する
+def fetch_xbrl_fallback(doc):
+    with document(doc["書類ID"]), stage("fetch") as span:
+        logger.info(f"📂 {doc['企業名']} のXBRLをダウンロード中...")
+        member = _fetch_xbrl_member(doc, [doc["fundCode"], doc["EDINETコード"]])
+        if member is None:
+            span.fail()
+        return member
+
+
+def _fetch_member(doc):
+    log_long_msg(f"# 次の企業: {doc['企業名']}")
+    logger.info("xbrl_path ダウンロードURLは:")
+    logger.info(doc["XBRLダウンロードURL"])
+    logger.info(f"📂 {doc['企業名']} のXBRLをダウンロード中...")
+
+    # ファンドコードが取れなければ EDINETコードをとる（同じアーカイブ内で検索するため再ダウンロードしない）
+    codes = [doc["fundCode"], doc["EDINETコード"]]
+
+    # CSVが提供されていれば、集計済みのCSVから抽出する（テキストブロックの解析より軽く正確）
+    # CSVから値が取れなかった場合は、解析後にパイプラインが fetch_xbrl_fallback でXBRLを取得する
+    if config['use_csv_extraction'] and doc.get("csvFlag") == "1":
+        try:
+            csv_member = download_and_extract_csv(doc["CSVダウンロードURL"], codes, doc_id=doc["書類ID"])
+            if csv_member:
+                return csv_member
+        except Exception as e:
+            logger.exception(f"CSVダウンロードに失敗しました: {doc['企業名']}")
+        logger.info(f"{doc['企業名']} はCSVを利用できないため、XBRLのテキストブロックから抽出します")
+
+    return _fetch_xbrl_member(doc, codes)
+
+
+def _fetch_xbrl_member(doc, codes):
+    try:
+        xbrl_member = download_and_extract_xbrl(doc["XBRLダウンロードURL"], codes, doc_id=doc["書類ID"])
+    except Exception as e:
+        logger.exception(f"XBRLダウンロードに失敗しました: {doc['企業名']}")
+        logger.info(f"❌ {doc['企業名']} のXBRLダウンロードに失敗しました。次の企業に進みます。")
+        return None
+
+    if not xbrl_member:
+        logger.info(f"❌ {doc['企業名']} のXBRLファイルが見つかりませんでした")
+        return None
+    return xbrl_member
 
 
 # Googleスプレッドシートにデータを書き込む
@@ -95,104 +235,58 @@ def write_to_spreadsheet(data):
     global DATE_FOR_SHEET
     
     try:
-        ss = client.open_by_url(SPREADSHEET_URL)
+        ss = get_client().open_by_url(SPREADSHEET_URL)
         logger.info("✅ Googleスプレッドシートに接続しました")
     except Exception as e:
         logger.exception("Googleスプレッドシートへの接続に失敗しました")
         raise
 
+    # シートの作成・書式設定・値の書き込みはまとめて送信し、既存シートには差分だけを書き込む
     try:
-        # 必要な行数と列数を計算
-        num_rows = max(len(data) + 2, 100)  # データ行 + ヘッダー + 予備
-        num_cols = max(len(data[0]) if data else 10, 10)  # データの列数が基準（最低10列）
-
-        # シートが存在するか確認し、なければ作成
         sheet_name_data = f"{SHEET_NAME}_{DATE_FOR_SHEET}"
-        try:
-            sheet = ss.worksheet(sheet_name_data)
-            logger.info(f"✅ 既存シート '{sheet_name_data}' を使用します")
-        except gspread.exceptions.WorksheetNotFound:
-            sheet = ss.add_worksheet(title=sheet_name_data, rows=str(num_rows), cols=str(num_cols))
-            logger.info(f"✅ シート '{sheet_name_data}' を新規作成しました！（{num_rows}行 × {num_cols}列）")
-
-        # 既存シートの内容をクリア
-        try:
-            sheet.clear()
-            logger.info("✅ シートの内容をクリアしました")
-        except Exception as e:
-            logger.exception("シートクリア中にエラーが発生しました")
-            raise
-
-        headers = [
-            "EDINETコード", "fundコード", "会計期間開始", "会計期間終了", "書類提出日",
-            "企業名", "書類ID", "配当性向", "EPS", "株価収益率",
-            "営業活動によるキャッシュ・フロー",
-            "売上高", "営業利益", "当期純利益", "営業利益率", "配当利回り", 
-            "純資産合計", "負債純資産合計", "自己資本比率",
-            "営業収益合計", "当期純利益又は当期純損失", "営業利益又は営業損失"
-        ]
-        
-        try:
-            sheet.append_row(headers)
-            logger.info("✅ ヘッダー行を追加しました")
-        except Exception as e:
-            logger.exception("ヘッダー行追加中にエラーが発生しました")
-            raise
-
-        # headersが辞書のキーとして使われている前提
-        data_to_insert = []
-        for row_idx, row in enumerate(data):
-            new_row = []
-            for key in headers:
-                try:
-                    new_row.append(row[key])
-                except Exception as e:
-                    logger.exception(f"{row.get('企業名', 'Unknown')}: {key}に有効なデータがありません")
-                    new_row.append("NA")
-
-            data_to_insert.append(new_row)
-
-        # 一括で行を追加する
-        try:
-            sheet.append_rows(data_to_insert)
-            logger.info(f"✅ {len(data_to_insert)}行のデータを追加しました")
-        except Exception as e:
-            logger.exception("データ行追加中にエラーが発生しました")
-            raise
-
-        # 全ての書式をリセット
-        try:
-            start_col_letter = "A"
-            end_col_letter = col_number_to_letter(len(headers) + 1)
-            range_ = f'{start_col_letter}:{end_col_letter}'
-            sheet.format(range_, {
-                "numberFormat": {
-                    "type": "NUMBER",
-                    "pattern": "@"
-                }
-            })
-            logger.info(f"✅ 書式設定を適用した範囲: {range_}")
-        except Exception as e:
-            logger.exception("書式設定中にエラーが発生しました")
-            # 書式設定エラーは処理を止めない
-            logger.info("書式設定に失敗しましたが、データ書き込みは完了しています")
-            
+        write_rows(
+            ss,
+            sheet_name_data,
+            data,
+            diff=config['sheets_diff_writes'],
+            chunk_rows=config['sheets_batch_rows'],
+        )
     except Exception as e:
         logger.exception("Googleスプレッドシート書き込み処理中にエラーが発生しました")
         raise
 
 
-# 列番号をアルファベットに変換する関数
-def col_number_to_letter(col_num):
-    col_letter = ""
-    while col_num > 0:
-        col_num, remainder = divmod(col_num - 1, 26)
-        col_letter = chr(remainder + 65) + col_letter
-    return col_letter
+def load_gui() -> bool:
+    """tkinter / tkcalendar を初回利用時に読み込み、GUIが使えるかを返す"""
+    global tk, messagebox, Calendar, TKINTER_AVAILABLE
+    if TKINTER_AVAILABLE is None:
+        try:
+            import tkinter as tk
+            from tkinter import messagebox
+            from tkcalendar import Calendar
+            TKINTER_AVAILABLE = True
+        except ImportError:
+            TKINTER_AVAILABLE = False
+            print("Warning: tkinter not available. GUI features will be disabled.")
+    return TKINTER_AVAILABLE
 
 
 # メイン処理
-def main(company_conuts:int=None, start_date=None):
+def main(company_conuts:int=None, start_date=None, end_date=None, profile=None, profile_sample_every=None):
+    """
+    書類一覧の取得から出力先への書き込みまでを実行する。
+
+    profile が True なら（省略時は config['profile_enabled']）、ステージごとに cProfile と
+    tracemalloc で計測し、config['profile_folder'] に pstats とレポートを保存する。
+    profile_sample_every 社に1社だけ計測する（省略時は config['profile_sample_every']）。
+    """
+    # ログの出力先は実行時に設定する（設定済みなら何もしない）
+    setup_logger()
+    if profile is None:
+        profile = config['profile_enabled']
+    if profile_sample_every is None:
+        profile_sample_every = config['profile_sample_every']
+
     # Use configuration defaults if not provided
     if company_conuts is None:
         company_conuts = config['default_company_count']
@@ -202,165 +296,179 @@ def main(company_conuts:int=None, start_date=None):
     # 最大データ取得数
     # company_conuts = 10
     # start_date="2025-03-08"
-    skip_company_word_list = config['skip_company_words']
-
-    logger.info("📌 EDINETの書類を取得中...")
-    logger.info(f"日付: {start_date}")
-    documents = fetch_edinet_documents(start_date, EDINET_API_KEY)
-    # logger.info(documents)
 
-    if not documents:
-        logger.error("⚠️ 取得できる書類がありません。")
-        return
-
-    final_data = []
-    
-    for doc in documents[: + company_conuts]:
-        log_long_msg("# 次の企業")
-
-        # ファンドだったら処理スキップ
-        skip_flag = False
-        for word in skip_company_word_list:
-            if word in doc['企業名']:
-                skip_flag = True
-                continue
-        if skip_flag is True:
-            log_long_msg(f"{doc['企業名']} の処理はスキップします")
-            continue
-
-        data_dict = {
-            "配当性向": "",
-            "EPS": "",
-            "株価収益率": "",
-            "営業CF": "",
-            "営業利益率": "",
-            "配当利回り": "",
-            "自己資本比率": "",
-        }
-        # logger.info(doc)
-        logger.info("xbrl_path ダウンロードURLは:")
-        logger.info(doc["XBRLダウンロードURL"])
-        logger.info(f"📂 {doc['企業名']} のXBRLをダウンロード中...")
-        xbrl_path = None
-        try:
-            if doc["fundCode"] is not None:
-                logger.info("fundです。スキップします。")
-                continue
-            # ファンドコードが取れなければ EDINETコードをとる
-            logger.info("fundコード")
-            logger.info(doc["fundコード"])
-            logger.info(doc["fundCode"])
-            xbrl_path = download_and_extract_xbrl(doc["XBRLダウンロードURL"], str(config['xbrl_folder']), fund_code=doc["fundCode"])
-        except Exception as e:
-            logger.exception(f"fundCodeでのXBRLダウンロードに失敗しました: {doc['企業名']}")   
+    # ステージごとの処理時間・転送量・キャッシュヒット・失敗数を記録する
+    metrics = start_run(start_date)
+    profiler = start_profiling(
+        profile_sample_every, config['profile_top_n'], config['profile_memory'], target_date=start_date
+    ) if profile else None
+    try:
+        return _run(company_conuts, start_date, end_date, metrics)
+    finally:
+        if profiler is not None:
+            stop_profiling()
             try:
-                # ファンドコードが取れなければ EDINETコードをとる
-                logger.info("EDINETコード")
-                logger.info(doc["EDINETコード"])
-                xbrl_path = download_and_extract_xbrl(doc["XBRLダウンロードURL"], str(config['xbrl_folder']), fund_code=doc["EDINETコード"])
+                profile_path = profiler.write(config['profile_folder'])
+                logger.info(f"🔬 ステージごとのプロファイルを保存しました: {profile_path}")
             except Exception as e:
-                logger.exception(f"EDINETコードでのXBRLダウンロードに失敗しました: {doc['企業名']}")    
-                logger.info(f"❌ {doc['企業名']} のXBRLダウンロードに失敗しました。次の企業に進みます。")
-                continue
+                logger.exception("プロファイルの保存中にエラーが発生しました")
 
 
-        logger.info("xbrl_path は:")
-        logger.info(xbrl_path)
-        if not xbrl_path:
-            logger.info(f"❌ {doc['企業名']} のXBRLファイルが見つかりませんでした")
-            continue
+def _run(company_conuts, start_date, end_date, metrics):
+    """main() の本体（プロファイラの開始・保存は main() で行う）"""
+    logger.info("📌 EDINETの書類を取得中...")
+    if end_date:
+        # 期間指定の場合は各日の一覧を並列に取得し、書類IDで重複を除いて日付順に流す
+        # （取得済みの日の書類から処理を始めるため、一覧の取得時間はこの後のパイプラインと重なる。
+        #   各日の取得時間は fetch_edinet_documents_range が "list" ステージとして計測する）
+        logger.info(f"期間: {start_date} 〜 {end_date}")
+        source = fetch_edinet_documents_range(
+            start_date, end_date, EDINET_API_KEY, max_workers=config['max_download_workers']
+        )
+    else:
+        logger.info(f"日付: {start_date}")
+        with stage("list"):
+            source = fetch_edinet_documents(start_date, EDINET_API_KEY)
+
+    # 一覧は読んだ分だけを残す（サマリー・件数の集計用）
+    documents = []
+
+    def listed_documents():
+        for doc in source:
+            documents.append(doc)
+            yield doc
+
+    # ダウンロードの前にメタデータで絞り込み、件数の上限は絞り込んだ後に適用する。
+    # 上限に達したら残りの一覧は読まない（期間指定では、先読みした日より後の日の一覧を取得しない）
+    skipped: Dict[str, int] = {}
+    targets = islice(DocumentFilter.from_config(config).iter_targets(listed_documents(), skipped), company_conuts)
+
+    # 前回までに処理済みの書類は台帳の結果を使い、未処理・失敗した書類だけを処理する
+    completed = {}
+    ordered_targets = []
+    resume = config['resume_runs']
+
+    def pending_documents():
+        # 台帳は LEDGER_LOOKUP_BATCH 件ずつまとめて1回の問い合わせで引く
+        nonlocal resume
+        while True:
+            batch = list(islice(targets, LEDGER_LOOKUP_BATCH))
+            if not batch:
+                return
+            ordered_targets.extend(batch)
+            rows = {}
+            if resume:
+                try:
+                    rows = ledger.completed_rows(doc["書類ID"] for doc in batch)
+                except Exception as e:
+                    logger.exception("処理台帳の読み込みに失敗しました。以降の書類はすべて処理します")
+                    resume = False
+            completed.update(rows)
+            for doc in batch:
+                if doc["書類ID"] not in rows:
+                    yield doc
 
-        # XBRL ファイルの解析。fundの場合。
-        logger.info(f"📊 {doc['企業名']} のXBRLを解析中...")
-        financial_data = {}
-        
-        # Try fund-specific extraction first
-        try:
-            fund_balance_config = config['xbrl_extraction']['fund']['balance_sheet']
-            financial_data = extract_values_from_xbrl(xbrl_path, fund_balance_config['target_block_name'], fund_balance_config['search_words_list'])
-            
-            fund_profit_config = config['xbrl_extraction']['fund']['profit_loss']
-            profit_loss = extract_values_from_xbrl(xbrl_path, fund_profit_config['target_block_name'], fund_profit_config['search_words_list'])
-            if profit_loss:
-                financial_data = {**financial_data, **profit_loss}
-            logger.info(f"✅ {doc['企業名']} fund形式でのXBRL解析が成功しました")
-        except Exception as e:
-            logger.exception(f"fund形式でのXBRL解析に失敗しました: {doc['企業名']}")
-            logger.info("通常企業形式での解析を試行します。")
-        
-        # Try regular company extraction if fund extraction failed or didn't get enough data
-        if not financial_data or len(financial_data) == 0:
-            try:
-                regular_balance_config = config['xbrl_extraction']['regular_company']['balance_sheet']
-                financial_data = extract_values_from_xbrl(xbrl_path, regular_balance_config['target_block_name'], regular_balance_config['search_words_list'])
-                
-                regular_profit_config = config['xbrl_extraction']['regular_company']['profit_loss']
-                profit_loss = extract_values_from_xbrl(xbrl_path, regular_profit_config['target_block_name'], regular_profit_config['search_words_list'])
-                if profit_loss:
-                    financial_data = {**financial_data, **profit_loss}
-                logger.info(f"✅ {doc['企業名']} 通常企業形式でのXBRL解析が成功しました")
-            except Exception as e:
-                logger.exception(f"通常企業形式でのXBRL解析に失敗しました: {doc['企業名']}")
-                logger.info(f"❌ {doc['企業名']} のXBRL解析に失敗しました。次の企業に進みます。")
-                continue
+    try:
+        pending = pending_documents()
+        first = next(pending, None)
+        if first is None and not documents:
+            logger.error("⚠️ 取得できる書類がありません。")
+            return
+        pending = chain([first], pending) if first is not None else iter(())
 
-        # キャッシュフロー取得 ConsolidatedStatementOfCashFlowsTextBlock
-        try:
-            cash_flow_config = config['xbrl_extraction']['regular_company']['cash_flow']
-            cash_flow_data = extract_values_from_xbrl(xbrl_path, cash_flow_config['target_block_name'], cash_flow_config['search_words_list'])
-            if cash_flow_data:
-                financial_data = {**financial_data, **cash_flow_data}
-                logger.info(f"✅ {doc['企業名']} キャッシュフロー取得成功")
-        except Exception as e:
-            logger.exception(f"キャッシュフロー取得に失敗しました: {doc['企業名']}")
-            logger.info("キャッシュフローなしで処理を続けます。")
+        processed = {}
 
-        # 財務指標の計算
-        # fundの場合の営業利益率計算
-        try:
-            if "当期純利益又は当期純損失" in financial_data and "営業収益合計" in financial_data:
-                if financial_data["当期純利益又は当期純損失"] is not None and financial_data["営業収益合計"] is not None:
-                    data_dict["営業利益率"] = float(financial_data["当期純利益又は当期純損失"]) / float(financial_data["営業収益合計"]) * 100
-                    data_dict["営業利益率"] = round(data_dict["営業利益率"], 2)
-                    logger.info(f"✅ {doc['企業名']} fund形式営業利益率計算成功: {data_dict['営業利益率']}%")
-        except Exception as e:
-            logger.exception(f"fund形式営業利益率計算に失敗しました: {doc['企業名']}")
-            
-        # 通常企業の場合の営業利益率計算
-        try:
-            if "営業利益" in financial_data and "売上高" in financial_data:
-                if financial_data["営業利益"] is not None and financial_data["売上高"] is not None:
-                    data_dict["営業利益率"] = float(financial_data["営業利益"]) / float(financial_data["売上高"]) * 100
-                    data_dict["営業利益率"] = round(data_dict["営業利益率"], 2)
-                    logger.info(f"✅ {doc['企業名']} 通常企業営業利益率計算成功: {data_dict['営業利益率']}%")
-        except Exception as e:
-            logger.exception(f"通常企業営業利益率計算に失敗しました: {doc['企業名']}")
-            
-        # 自己資本比率計算
-        try:
-            if "純資産合計" in financial_data and "負債純資産合計" in financial_data:
-                if financial_data["純資産合計"] is not None and financial_data["負債純資産合計"] is not None:
-                    data_dict["自己資本比率"] = float(financial_data["純資産合計"]) / float(financial_data["負債純資産合計"]) * 100
-                    data_dict["自己資本比率"] = round(data_dict["自己資本比率"], 2)
-                    logger.info(f"✅ {doc['企業名']} 自己資本比率計算成功: {data_dict['自己資本比率']}%")
-        except Exception as e:
-            logger.exception(f"自己資本比率計算に失敗しました: {doc['企業名']}")
-
-        final_data.append({**doc, **data_dict, **financial_data})
-        logger.info(f"✅ {doc['企業名']} の処理が完了しました")
+        def record_result(doc, row):
+            processed[doc["書類ID"]] = row
+            with document(doc["書類ID"]):
+                count("documents_processed" if row else "documents_failed")
+            try:
+                ledger.record(doc, row, target_date=start_date)
+            except Exception as e:
+                logger.exception(f"処理台帳への記録に失敗しましたが、処理を続けます: {doc['企業名']}")
+
+        # 解析モジュールは処理する書類があるときだけ読み込む（解析ワーカーはこれを引き継ぐ）
+        if first is not None:
+            preload_parsers()
+
+        # ダウンロードはスレッドプール、XBRL解析はプロセスプールで並列実行する（結果は元の順序）
+        logger.info(f"🚀 並列処理を開始します（ダウンロード: {config['max_download_workers']}並列, 解析: {config['max_parse_workers']}プロセス）")
+        results = run_pipeline(
+            pending,
+            fetch=fetch_xbrl,
+            analyze=analyze_filing,
+            max_fetch_workers=config['max_download_workers'],
+            max_parse_workers=config['max_parse_workers'],
+            on_result=record_result,
+            fallback=fetch_xbrl_fallback,
+        )
+    finally:
+        # 上限に達して読むのをやめた一覧は閉じる（期間指定では先読み中の日の取得を取り消す）
+        if hasattr(source, "close"):
+            source.close()
+
+    for reason, skipped_count in skipped.items():
+        count(f"documents_skipped_{reason}", skipped_count)
+    if skipped:
+        details = ", ".join(f"{reason}: {skipped_count}件" for reason, skipped_count in skipped.items())
+        logger.info(f"🔎 {sum(skipped.values())}件の書類をスキップしました（{details}）")
+    logger.info(f"🔎 処理対象: {len(ordered_targets)}社（上限: {company_conuts}社）")
+    if completed:
+        logger.info(f"♻️ 処理済みの{len(completed)}社は台帳の結果を使いました")
+    count("documents_listed", len(documents))
+    count("documents_from_ledger", len(completed))
+
+    final_data = [
+        completed.get(doc["書類ID"]) or processed.get(doc["書類ID"])
+        for doc in ordered_targets
+    ]
+    final_data = [row for row in final_data if row]
+
+    # 財務指標は全社分をまとめて計算する（台帳の結果にも最新の計算式を適用する）
+    try:
+        with stage("ratios"):
+            apply_ratios(final_data)
+    except Exception as e:
+        logger.exception("財務指標の計算中にエラーが発生しました。指標なしで書き込みます")
 
-    logger.info("📝 Googleスプレッドシートに書き込み中...")
     try:
-        write_to_spreadsheet(final_data)
+        with stage("timeseries"):
+            points = timeseries.record(final_data)
+        logger.info(f"📈 時系列に{points}件の値を保存しました（前期の値を含む）")
+    except Exception as e:
+        logger.exception("時系列への保存に失敗しましたが、処理を続けます")
+    failed_count = sum(1 for row in results if not row)
+    if failed_count:
+        logger.info(f"⚠️ {failed_count}社は失敗として台帳に記録しました（再実行すると処理し直します）")
+
+    # 設定された出力先（Googleスプレッドシート・Parquet・CSV・SQLite）に書き込む
+    sinks = build_sinks(
+        config['output_sinks'],
+        config['output_folder'],
+        write_sheets=lambda data: write_to_spreadsheet(data),
+    )
+    logger.info(f"📝 出力先に書き込み中: {', '.join(sink.name for sink in sinks) or 'なし'}")
+    with stage("write"):
+        written = write_to_sinks(sinks, final_data, partition=start_date)
+    if written.get("sheets"):
         logger.info("✅ Googleスプレッドシート書き込み完了！")
         logger.info(SPREADSHEET_URL)
-    except Exception as e:
-        logger.exception("Googleスプレッドシート書き込み中にエラーが発生しました")
+    if not all(written.values()):
         logger.info("処理は続行されます...")
     
+    # 計測結果を JSON（と Prometheus の textfile）に保存し、サマリーにも載せる
+    run_metrics = None
+    if config['metrics_enabled']:
+        try:
+            metrics_path = save_run_metrics(metrics, config['metrics_folder'], config['prometheus_textfile'])
+            run_metrics = metrics.summary()
+            logger.info(f"📈 ステージごとの計測結果を保存しました: {metrics_path}")
+        except Exception as e:
+            logger.exception("計測結果の保存中にエラーが発生しました")
+
     # Generate documentation
     try:
-        summary_path = save_run_summary(documents, final_data, start_date)
+        summary_path = save_run_summary(documents, final_data, start_date, metrics=run_metrics)
         logger.info(f"📄 処理結果のサマリーを保存しました: {summary_path}")
         
         config_doc_path = save_config_documentation()
@@ -372,47 +480,50 @@ def main(company_conuts:int=None, start_date=None):
     logger.info(f"🎉 全処理完了！ 処理対象: {len(documents)}社, 成功: {len(final_data)}社")
     return final_data
 
-if TKINTER_AVAILABLE:
-    def open_calendar(root, listbox, dates):
-        """カレンダーを開いて日付を選択"""
-        top = tk.Toplevel(root)
-        top.title("日付を選択")
-        
-        cal = Calendar(top, selectmode="day", date_pattern="yyyy-mm-dd", width=100)
-        cal.pack(pady=20)
-
-        def select_date():
-            date = cal.get_date()
-            if date and date not in dates:  # 重複防止
-                dates.append(date)
-                listbox.insert(tk.END, date)
-            top.destroy()
-        
-        tk.Button(top, text="OK", command=select_date).pack(pady=10)
+def open_calendar(root, listbox, dates):
+    """カレンダーを開いて日付を選択"""
+    top = tk.Toplevel(root)
+    top.title("日付を選択")
+
+    cal = Calendar(top, selectmode="day", date_pattern="yyyy-mm-dd", width=100)
+    cal.pack(pady=20)
+
+    def select_date():
+        date = cal.get_date()
+        if date and date not in dates:  # 重複防止
+            dates.append(date)
+            listbox.insert(tk.END, date)
+        top.destroy()
+
+    tk.Button(top, text="OK", command=select_date).pack(pady=10)
 
-    def delete_selected_date(listbox, dates):
-        """リストから選択された日付を削除"""
-        try:
-            selected_index = listbox.curselection()[0]  # 選択されたインデックス
-            selected_date = listbox.get(selected_index)  # 選択された日付
-            listbox.delete(selected_index)  # Listboxから削除
-            dates.remove(selected_date)  # datesリストから削除
-        except IndexError:
-            messagebox.showwarning("警告", "削除する日付を選択してください")
-
-    def run_main(dates, company_conuts):
-        global DATE_FOR_SHEET
-        if not dates:
-            messagebox.showerror("エラー", "最低1つの日付を入力してください")
-            return
-        for date in dates:
-            DATE_FOR_SHEET = date
-            main(company_conuts, start_date=date)
+
+def delete_selected_date(listbox, dates):
+    """リストから選択された日付を削除"""
+    try:
+        selected_index = listbox.curselection()[0]  # 選択されたインデックス
+        selected_date = listbox.get(selected_index)  # 選択された日付
+        listbox.delete(selected_index)  # Listboxから削除
+        dates.remove(selected_date)  # datesリストから削除
+    except IndexError:
+        messagebox.showwarning("警告", "削除する日付を選択してください")
+
+
+def run_main(dates, company_conuts):
+    global DATE_FOR_SHEET
+    if not dates:
+        messagebox.showerror("エラー", "最低1つの日付を入力してください")
+        return
+    # 選択された日付の書類一覧を先にまとめて並列取得しておく
+    prefetch_document_lists(dates, EDINET_API_KEY, max_workers=config['max_download_workers'])
+    for date in dates:
+        DATE_FOR_SHEET = date
+        main(company_conuts, start_date=date)
 
 
 def run_gui():
     """Run the GUI interface if tkinter is available"""
-    if not TKINTER_AVAILABLE:
+    if not load_gui():
         print("GUI not available. Use main() function directly.")
         return
         
@@ -441,8 +552,17 @@ def run_gui():
     root.mainloop()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EDINETから有価証券報告書の財務データを取得する")
+    parser.add_argument("--profile", action="store_true", help="ステージごとに cProfile・tracemalloc で計測する")
+    parser.add_argument("--profile-sample", type=int, help="N社に1社だけ計測する（省略時は PROFILE_SAMPLE_EVERY）")
+    args = parser.parse_args()
+    if args.profile:
+        config['profile_enabled'] = True
+    if args.profile_sample:
+        config['profile_sample_every'] = args.profile_sample
+
     # If GUI is available, run the GUI interface
-    if TKINTER_AVAILABLE:
+    if load_gui():
         run_gui()
     else:
         # Run command line interface
@@ -0,0 +1,223 @@
+"""
+Persistent LRU cache of EDINET filing archives keyed by docID
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Union
+
+from .logger import logger
+
+# ハッシュ計算・コピー時に1回で読み込むサイズ
+_CHUNK_SIZE = 1024 * 1024
+
+
+class ArchiveCache:
+    """
+    書類ID（docID）をキーにした、ダウンロード済みZIPのディスクキャッシュ。
+
+    EDINETの書類は docID ごとに不変なので、一度取得したアーカイブは再実行や
+    バックフィルでそのまま再利用できる。ファイル名は `{docID}-{sha256}.zip` とし、
+    読み込み時にハッシュを検証して壊れたエントリは破棄する。
+    書き込みは一時ファイル経由の os.replace で原子的に行い、合計サイズが
+    上限を超えたら最後に使われた時刻が古いものから削除する。
+
+    Windows ではほかのスレッドが開いているファイルを削除・置換できないため、
+    削除できなかったファイルは索引から外したうえで合計サイズに含めたまま残し、
+    次の put で削除し直す。
+
+    Args:
+        folder (Path): キャッシュの保存先フォルダ。
+        max_bytes (int): キャッシュ全体の最大サイズ（バイト）。0以下ならキャッシュしない。
+    """
+
+    def __init__(self, folder: Path, max_bytes: int):
+        self.folder = Path(folder)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = None  # docID -> Path（古い順）
+        self._sizes: Dict[Path, int] = {}  # ディスク上のファイル -> サイズ（削除待ちを含む）
+        self._stale = set()  # 索引から外したが、開かれていて削除できなかったファイル
+        self._total_bytes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _load(self):
+        """初回アクセス時にフォルダを走査して索引を作る（呼び出し側でロック済み）"""
+        if self._entries is not None:
+            return
+        self.folder.mkdir(parents=True, exist_ok=True)
+        # 書き込み途中で中断された一時ファイルは破棄する
+        for tmp_path in self.folder.glob("*.tmp"):
+            tmp_path.unlink(missing_ok=True)
+        files = sorted(self.folder.glob("*-*.zip"), key=lambda path: path.stat().st_mtime)
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._stale = set()
+        self._total_bytes = 0
+        for path in files:
+            doc_id = path.name.split("-", 1)[0]
+            # 前回削除できずに残った古い版は、新しい版を残して削除し直す
+            previous = self._entries.get(doc_id)
+            if previous is not None:
+                self._stale.add(previous)
+            self._entries[doc_id] = path
+            self._add_file(path, path.stat().st_size)
+        self._purge_stale()
+
+    def _add_file(self, path: Path, size: int):
+        self._total_bytes += size - self._sizes.get(path, 0)
+        self._sizes[path] = size
+
+    def _remove_file(self, path: Path) -> bool:
+        """ファイルを削除して合計サイズから除く。開かれていて削除できなければ False。"""
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"⚠️ 使用中のためキャッシュを削除できませんでした。後で削除し直します: {path.name} ({e})")
+            return False
+        self._total_bytes -= self._sizes.pop(path, 0)
+        return True
+
+    def _discard(self, doc_id: str):
+        path = self._entries.pop(doc_id, None)
+        if path is not None and not self._remove_file(path):
+            self._stale.add(path)
+
+    def _live_bytes(self) -> int:
+        """索引にあるエントリの合計サイズ（削除待ちのファイルを除く）"""
+        return self._total_bytes - sum(self._sizes.get(path, 0) for path in self._stale)
+
+    def _purge_stale(self):
+        """削除できなかったファイルの削除をやり直す"""
+        for path in list(self._stale):
+            if self._remove_file(path):
+                self._stale.discard(path)
+
+    def get(self, doc_id: str) -> Optional[BinaryIO]:
+        """
+        キャッシュ済みのアーカイブを開いて返す（呼び出し側で close すること）。
+        ハッシュはチャンク単位で検証するため、アーカイブ全体をメモリに載せない。
+        未登録・破損の場合は None。
+        """
+        if not self.enabled or not doc_id:
+            return None
+        with self._lock:
+            self._load()
+            path = self._entries.get(doc_id)
+        if path is None:
+            return None
+
+        # ハッシュの計算はロックの外で行い、ほかのスレッドの get / put を待たせない
+        # （計算中に削除されても、開いたファイルはそのまま読める）
+        archive = None
+        try:
+            archive = open(path, "rb")
+            digest = _sha256_of(archive)
+        except FileNotFoundError:
+            # 開く前にほかのスレッドが削除した
+            return None
+        except OSError:
+            if archive is not None:
+                archive.close()
+            logger.exception(f"キャッシュの読み込みに失敗しました: {path}")
+            self._discard_if_current(doc_id, path)
+            return None
+
+        expected_digest = path.stem.split("-", 1)[1]
+        if digest != expected_digest:
+            archive.close()
+            logger.warning(f"⚠️ キャッシュが破損していたため破棄します: {path.name}")
+            self._discard_if_current(doc_id, path)
+            return None
+
+        # LRU: 最後に使われた時刻として mtime を更新する
+        with self._lock:
+            if self._entries.get(doc_id) == path:
+                self._entries.move_to_end(doc_id)
+                try:
+                    os.utime(path)
+                except FileNotFoundError:
+                    pass
+        archive.seek(0)
+        return archive
+
+    def _discard_if_current(self, doc_id: str, path: Path):
+        """検証中にほかのスレッドが置き換えていなければ、エントリを削除する"""
+        with self._lock:
+            if self._entries.get(doc_id) == path:
+                self._discard(doc_id)
+
+    def put(self, doc_id: str, archive: Union[bytes, BinaryIO]):
+        """
+        アーカイブを原子的に保存し、上限を超えた分を古い順に削除する。
+
+        archive にはバイト列か、シーク可能なファイルオブジェクト（ダウンロード済みの
+        一時ファイルなど）を渡す。ファイルの場合は先頭からチャンク単位でコピーし、
+        終了後は先頭に戻す。
+        """
+        if isinstance(archive, (bytes, bytearray)):
+            archive = io.BytesIO(archive)
+        size = archive.seek(0, os.SEEK_END)
+        archive.seek(0)
+        if not self.enabled or not doc_id or size > self.max_bytes:
+            return
+        with self._lock:
+            self._load()
+            self._purge_stale()
+
+            fd, tmp_path = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+            try:
+                digest = hashlib.sha256()
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in iter(lambda: archive.read(_CHUNK_SIZE), b""):
+                        digest.update(chunk)
+                        f.write(chunk)
+                    f.flush()
+                    os.fsync(f.fileno())
+                path = self.folder / f"{doc_id}-{digest.hexdigest()}.zip"
+                if (path == self._entries.get(doc_id) or path in self._stale) and path.exists():
+                    # 同じ内容のファイルがあればそれを使う（開かれていると置換できないため）
+                    os.unlink(tmp_path)
+                    self._stale.discard(path)
+                    os.utime(path)
+                else:
+                    self._discard(doc_id)
+                    os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"⚠️ キャッシュに保存できませんでした: {doc_id} ({e})")
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                return
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+            finally:
+                archive.seek(0)
+
+            self._entries[doc_id] = path
+            self._entries.move_to_end(doc_id)
+            self._add_file(path, size)
+
+            # 削除待ちのファイルは次の put で削除し直すため、上限の判定には含めない
+            # （含めると、開かれているファイルが1つあるだけで他のエントリをすべて削除してしまう）
+            while self._live_bytes() > self.max_bytes and self._entries:
+                oldest_doc_id = next(iter(self._entries))
+                logger.info(f"🗑️ キャッシュ上限のため削除します: {oldest_doc_id}")
+                self._discard(oldest_doc_id)
+
+
+def _sha256_of(file: BinaryIO) -> str:
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
@@ -24,20 +24,20 @@ _load_env_file()
 # Setup base directory (use parent directory as project root)
 base_dir = Path(__file__).parent.parent
 
-# Get folder paths and create directories if they don't exist
+# Get folder paths (each folder is created when something is first written to it)
 json_folder = base_dir / os.getenv('JSON_FOLDER', 'json')
 log_folder = base_dir / os.getenv('LOG_FOLDER', 'log')
 md_folder = base_dir / os.getenv('MD_FOLDER', 'md')
 xbrl_folder = base_dir / os.getenv('XBRL_FOLDER', 'xbrl_files')
-
-# Create directories if they don't exist
-for folder in [json_folder, log_folder, md_folder, xbrl_folder]:
-    folder.mkdir(exist_ok=True)
+output_folder = base_dir / os.getenv('OUTPUT_FOLDER', 'output')
+metrics_folder = base_dir / os.getenv('METRICS_FOLDER', 'metrics')
+profile_folder = base_dir / os.getenv('PROFILE_FOLDER', 'log/profile')
 
 # Configuration dictionary
 config = {
     # API Configuration
     'edinet_api_key': os.getenv('EDINET_API_KEY'),
+    'edinet_api_base_url': os.getenv('EDINET_API_BASE_URL', 'https://disclosure.edinet-fsa.go.jp/api/v2').rstrip('/'),
     'google_drive_folder_url': os.getenv('GOOGLE_SPREADSHEET_URL'),
     'google_service_account_file': base_dir / os.getenv('GOOGLE_SERVICE_ACCOUNT_FILE', '_gcp_key.json'),
     
@@ -46,16 +46,64 @@ config = {
     'log_folder': log_folder,
     'md_folder': md_folder,
     'xbrl_folder': xbrl_folder,
+    'output_folder': output_folder,
+    'metrics_folder': metrics_folder,
+    'profile_folder': profile_folder,
+    'archive_cache_folder': xbrl_folder / 'archives',
+    'document_index_file': json_folder / 'document_lists.sqlite3',
+    'ledger_file': json_folder / 'ledger.sqlite3',
+    'timeseries_file': json_folder / 'timeseries.sqlite3',
     
     # Default Settings
     'default_company_count': int(os.getenv('DEFAULT_COMPANY_COUNT', '1')),
     'default_start_date': os.getenv('DEFAULT_START_DATE', '2024-03-08'),
     'sheet_name': os.getenv('SHEET_NAME', 'EDINET_Data'),
     
+    # Output Sinks (comma separated: sheets, parquet, csv, sqlite)
+    'output_sinks': [name.strip().lower() for name in os.getenv('OUTPUT_SINKS', 'sheets').split(',') if name.strip()],
+    
+    # Google Sheets Write Settings
+    'sheets_diff_writes': os.getenv('SHEETS_DIFF_WRITES', 'true').lower() == 'true',
+    'sheets_batch_rows': int(os.getenv('SHEETS_BATCH_ROWS', '2000')),
+    
+    # Concurrency Settings
+    'max_download_workers': int(os.getenv('MAX_DOWNLOAD_WORKERS', '4')),
+    'max_parse_workers': int(os.getenv('MAX_PARSE_WORKERS', '2')),
+    'edinet_requests_per_second': float(os.getenv('EDINET_REQUESTS_PER_SECOND', '2')),
+    'edinet_request_burst': float(os.getenv('EDINET_REQUEST_BURST', '2')),
+    
+    # EDINET HTTP Client Settings (timeouts in seconds, exponential backoff with jitter on 429/5xx)
+    'edinet_connect_timeout': float(os.getenv('EDINET_CONNECT_TIMEOUT', '10')),
+    'edinet_read_timeout': float(os.getenv('EDINET_READ_TIMEOUT', '60')),
+    'edinet_max_retries': int(os.getenv('EDINET_MAX_RETRIES', '5')),
+    'edinet_backoff_base': float(os.getenv('EDINET_BACKOFF_BASE', '1')),
+    'edinet_backoff_max': float(os.getenv('EDINET_BACKOFF_MAX', '60')),
+    
+    # Resume Settings (skip docIDs already recorded as done in the ledger)
+    'resume_runs': os.getenv('RESUME_RUNS', 'true').lower() == 'true',
+    
+    # Archive Cache Settings (0 disables the cache)
+    'archive_cache_max_bytes': int(float(os.getenv('ARCHIVE_CACHE_MAX_MB', '2048')) * 1024 * 1024),
+    
+    # Download Settings (archives larger than the spool size are buffered on disk while downloading)
+    'download_spool_max_bytes': int(float(os.getenv('DOWNLOAD_SPOOL_MAX_MB', '8')) * 1024 * 1024),
+    'archive_range_probe': os.getenv('ARCHIVE_RANGE_PROBE', 'false').lower() == 'true',
+    
+    # Run Metrics Settings (per-stage timings saved as JSON; optional Prometheus textfile)
+    'metrics_enabled': os.getenv('METRICS_ENABLED', 'true').lower() == 'true',
+    'prometheus_textfile': base_dir / os.getenv('PROMETHEUS_TEXTFILE') if os.getenv('PROMETHEUS_TEXTFILE') else None,
+    
+    # Profiling Settings (cProfile + tracemalloc per stage; one in N companies is profiled)
+    'profile_enabled': os.getenv('PROFILE_ENABLED', 'false').lower() == 'true',
+    'profile_sample_every': int(os.getenv('PROFILE_SAMPLE_EVERY', '1')),
+    'profile_top_n': int(os.getenv('PROFILE_TOP_N', '20')),
+    'profile_memory': os.getenv('PROFILE_MEMORY', 'true').lower() == 'true',
+    
     # Log Settings
     'log_file': log_folder / os.getenv('LOG_FILE', 'logfile.log'),
     'max_log_lines': int(os.getenv('MAX_LOG_LINES', '10000')),
     'delete_log_lines': int(os.getenv('DELETE_LOG_LINES', '2000')),
+    'log_queue': os.getenv('LOG_QUEUE', 'false').lower() == 'true',
     
     # Skip company word list
     'skip_company_words': [
@@ -64,31 +112,95 @@ config = {
         "インベストメン", "投信",
     ],
     
+    # Document list prefilter (comma-separated codes; empty means no restriction)
+    'filter_require_xbrl': os.getenv('FILTER_REQUIRE_XBRL', 'true').lower() == 'true',
+    'filter_skip_withdrawn': os.getenv('FILTER_SKIP_WITHDRAWN', 'true').lower() == 'true',
+    'filter_ordinance_codes': [code.strip() for code in os.getenv('FILTER_ORDINANCE_CODES', '010').split(',') if code.strip()],
+    'filter_form_codes': [code.strip() for code in os.getenv('FILTER_FORM_CODES', '').split(',') if code.strip()],
+    
+    # Use the pre-tabulated CSV (documents/{docID}?type=5) when csvFlag == '1'
+    'use_csv_extraction': os.getenv('USE_CSV_EXTRACTION', 'true').lower() == 'true',
+    
+    # Look up tagged XBRL facts by element ID before scraping the TextBlock HTML
+    'use_fact_extraction': os.getenv('USE_FACT_EXTRACTION', 'true').lower() == 'true',
+    
+    # Stream XBRL with iterparse, keep only the needed facts/blocks and stop once they are found
+    'xbrl_streaming': os.getenv('XBRL_STREAMING', 'true').lower() == 'true',
+    
+    # Prior periods read from the same filing (0 = current period only); stored in the time series
+    'prior_periods': int(os.getenv('PRIOR_PERIODS', '1')),
+    
+    # Context IDs tried in order when reading tagged facts (CSV / XBRL facts)
+    'fact_context_priority': [
+        'CurrentYearInstant', 'CurrentYearDuration',
+        'CurrentYearInstant_NonConsolidatedMember', 'CurrentYearDuration_NonConsolidatedMember',
+    ],
+    
+    # Financial ratios evaluated over all filings at once (module/ratios.py)
+    # numerator / denominator: 出力の列。scale: 掛ける値。round: 小数点以下の桁数。
+    # filer_types: 適用する提出者の種類（fund / regular_company、省略時はすべて）。同じ name の計算式は後のものを優先する。
+    # ファンドの書類は DocumentFilter で除外するため、ファンド向けの計算式は置かない
+    'financial_ratios': [
+        {'name': '営業利益率', 'numerator': '営業利益', 'denominator': '売上高',
+         'scale': 100, 'round': 2, 'filer_types': ['regular_company']},
+        {'name': '自己資本比率', 'numerator': '純資産合計', 'denominator': '負債純資産合計',
+         'scale': 100, 'round': 2},
+        # 前期比（同じ書類の前期の列から計算する。PRIOR_PERIODS=0 では計算しない）
+        {'name': '売上高成長率', 'growth': '売上高', 'scale': 100, 'round': 2},
+        {'name': '営業利益成長率', 'growth': '営業利益', 'scale': 100, 'round': 2},
+        {'name': '当期純利益成長率', 'growth': '当期純利益', 'scale': 100, 'round': 2},
+    ],
+    
     # XBRL extraction configuration
+    # element_ids: 検索ワードに対応するXBRL要素ID（優先順）。CSV・タグ付きの値からの抽出で使う
     'xbrl_extraction': {
         'fund': {
             'balance_sheet': {
                 'target_block_name': 'BalanceSheetTextBlock',
-                'search_words_list': ['純資産合計', '負債純資産合計']
+                'search_words_list': ['純資産合計', '負債純資産合計'],
+                'element_ids': {
+                    '純資産合計': ['jppfs_cor:NetAssets'],
+                    '負債純資産合計': ['jppfs_cor:LiabilitiesAndNetAssets'],
+                },
             },
             'profit_loss': {
                 'target_block_name': 'StatementOfIncomeAndRetainedEarningsTextBlock',
-                'search_words_list': ['営業収益合計', '営業利益又は営業損失', '当期純利益又は当期純損失']
+                'search_words_list': ['営業収益合計', '営業利益又は営業損失', '当期純利益又は当期純損失'],
+                'element_ids': {
+                    '営業収益合計': ['jppfs_cor:OperatingRevenue1', 'jppfs_cor:OperatingRevenue2'],
+                    '営業利益又は営業損失': ['jppfs_cor:OperatingIncome'],
+                    '当期純利益又は当期純損失': ['jppfs_cor:ProfitLoss', 'jppfs_cor:NetIncomeLoss'],
+                },
             }
         },
         'regular_company': {
             'balance_sheet': {
                 'target_block_name': 'ConsolidatedBalanceSheetTextBlock',
-                'search_words_list': ['純資産合計', '負債純資産合計']
+                'search_words_list': ['純資産合計', '負債純資産合計'],
+                'element_ids': {
+                    '純資産合計': ['jppfs_cor:NetAssets', 'jpigp_cor:EquityIFRS'],
+                    '負債純資産合計': ['jppfs_cor:LiabilitiesAndNetAssets', 'jpigp_cor:LiabilitiesAndEquityIFRS'],
+                },
             },
             'profit_loss': {
                 'target_block_name': 'ConsolidatedStatementOfIncomeTextBlock',
-                'search_words_list': ['売上高', '営業利益', '当期純利益']
+                'search_words_list': ['売上高', '営業利益', '当期純利益'],
+                'element_ids': {
+                    '売上高': ['jppfs_cor:NetSales', 'jpigp_cor:RevenueIFRS', 'jpcrp_cor:NetSalesSummaryOfBusinessResults'],
+                    '営業利益': ['jppfs_cor:OperatingIncome', 'jpigp_cor:OperatingProfitLossIFRS'],
+                    '当期純利益': ['jppfs_cor:ProfitLoss', 'jppfs_cor:ProfitLossAttributableToOwnersOfParent', 'jpigp_cor:ProfitLossIFRS'],
+                },
             },
             'cash_flow': {
                 'target_block_name': 'ConsolidatedStatementOfCashFlowsTextBlock',
-                'search_words_list': ['営業活動によるキャッシュ・フロー']
+                'search_words_list': ['営業活動によるキャッシュ・フロー'],
+                'element_ids': {
+                    '営業活動によるキャッシュ・フロー': [
+                        'jppfs_cor:NetCashProvidedByUsedInOperatingActivities',
+                        'jpigp_cor:NetCashProvidedByUsedInOperatingActivitiesIFRS',
+                    ],
+                },
             }
         }
     }
-}
\ No newline at end of file
+}
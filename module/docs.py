@@ -1,15 +1,15 @@
 """
 Documentation utilities for EDINET Data Getter
 """
-import os
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from .config import config
 
 
-def generate_run_summary(documents: List[Dict], processed_data: List[Dict], start_date: str) -> str:
-    """Generate a markdown summary of the processing run"""
+def generate_run_summary(documents: List[Dict], processed_data: List[Dict], start_date: str,
+                         metrics: Optional[Dict[str, Any]] = None) -> str:
+    """Generate a markdown summary of the processing run (with per-stage timings if metrics is given)"""
     
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
@@ -34,7 +34,12 @@ def generate_run_summary(documents: List[Dict], processed_data: List[Dict], star
     summary += f"""
 ### Skipped Documents
 Total skipped: {len(documents) - len(processed_data)}
+"""
+
+    if metrics:
+        summary += generate_metrics_section(metrics)
 
+    summary += f"""
 ## Configuration Used
 - **XBRL Folder**: {config['xbrl_folder']}
 - **JSON Folder**: {config['json_folder']}
@@ -57,10 +62,39 @@ Generated by EDINET Data Getter on {timestamp}
     return summary
 
 
-def save_run_summary(documents: List[Dict], processed_data: List[Dict], start_date: str) -> Path:
+def generate_metrics_section(metrics: Dict[str, Any]) -> str:
+    """Generate the per-stage timing section from RunMetrics.summary()"""
+    section = f"""
+## Stage Timings
+Total elapsed: {metrics.get('elapsed_seconds')}s
+
+| Stage | Count | Failures | Total (s) | p50 (ms) | p95 (ms) | Max (ms) | Bytes |
+|-------|------:|---------:|----------:|---------:|---------:|---------:|------:|
+"""
+    for stage, stats in metrics['stages'].items():
+        section += (
+            f"| {stage} | {stats['count']} | {stats['failures']} | {stats['total_seconds']:.3f} "
+            f"| {stats['p50_ms']} | {stats['p95_ms']} | {stats['max_ms']} | {stats['bytes']} |\n"
+        )
+
+    if metrics['counters']:
+        section += "\n### Counters\n"
+        for name, value in sorted(metrics['counters'].items()):
+            section += f"- **{name}**: {value:g}\n"
+
+    failed = {doc_id: entry for doc_id, entry in metrics['documents'].items() if entry['failures']}
+    if failed:
+        section += "\n### Documents with Failed Stages\n"
+        for doc_id, entry in failed.items():
+            section += f"- {doc_id}: {entry['failures']} failed stage(s)\n"
+    return section
+
+
+def save_run_summary(documents: List[Dict], processed_data: List[Dict], start_date: str,
+                     metrics: Optional[Dict[str, Any]] = None) -> Path:
     """Save the run summary to a markdown file"""
     
-    summary_content = generate_run_summary(documents, processed_data, start_date)
+    summary_content = generate_run_summary(documents, processed_data, start_date, metrics=metrics)
     
     # Create filename with timestamp
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -0,0 +1,89 @@
+"""
+Metadata-based prefilter for the EDINET document list, applied before any download
+"""
+import re
+from typing import Dict, Iterable, Iterator, Optional
+
+# スキップ理由（ログ・計測のカウンター名に使う）
+REASON_FUND = "fund"
+REASON_SKIP_WORD = "skip_word"
+REASON_NO_XBRL = "no_xbrl"
+REASON_WITHDRAWN = "withdrawn"
+REASON_ORDINANCE = "ordinance"
+REASON_FORM = "form"
+
+
+class DocumentFilter:
+    """
+    書類一覧のメタデータだけで、処理しない書類を判定する。
+
+    ダウンロード前に一覧に対して（ストリームのまま）適用する。判定は次の順に行い、最初に該当した理由を返す。
+
+    - fundCode があればファンド
+    - 提出者名にスキップ語のいずれかを含む（スキップ語は1つの正規表現にまとめて照合する）
+    - xbrlFlag が "1" でない（XBRLがない）
+    - withdrawalStatus が "0" でない（取下げ・取下げ済みの書類）
+    - ordinanceCode / formCode が許可されたコードに含まれない（空なら制限しない）
+
+    キーがない書類（古いレスポンスなど）は、その項目では判定しない。
+
+    Args:
+        skip_words (Iterable[str]): 提出者名に含まれていたらスキップする語。
+        require_xbrl (bool): XBRLがない書類をスキップするか。
+        skip_withdrawn (bool): 取下げ関連の書類をスキップするか。
+        ordinance_codes (Iterable[str]): 処理する府令コード。
+        form_codes (Iterable[str]): 処理する様式コード。
+    """
+
+    def __init__(self, skip_words: Iterable[str] = (), require_xbrl: bool = True, skip_withdrawn: bool = True,
+                 ordinance_codes: Iterable[str] = (), form_codes: Iterable[str] = ()):
+        words = sorted({word for word in skip_words if word}, key=len, reverse=True)
+        self._skip_pattern = re.compile("|".join(map(re.escape, words))) if words else None
+        self.require_xbrl = require_xbrl
+        self.skip_withdrawn = skip_withdrawn
+        self.ordinance_codes = frozenset(ordinance_codes)
+        self.form_codes = frozenset(form_codes)
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "DocumentFilter":
+        return cls(
+            skip_words=config['skip_company_words'],
+            require_xbrl=config['filter_require_xbrl'],
+            skip_withdrawn=config['filter_skip_withdrawn'],
+            ordinance_codes=config['filter_ordinance_codes'],
+            form_codes=config['filter_form_codes'],
+        )
+
+    def skip_reason(self, doc: Dict) -> Optional[str]:
+        """書類をスキップする理由を返す（処理する書類なら None）"""
+        if doc.get("fundCode") is not None:
+            return REASON_FUND
+        if self._skip_pattern is not None and self._skip_pattern.search(doc.get("企業名") or doc.get("filerName") or ""):
+            return REASON_SKIP_WORD
+        if self.require_xbrl and doc.get("xbrlFlag", "1") != "1":
+            return REASON_NO_XBRL
+        if self.skip_withdrawn and doc.get("withdrawalStatus", "0") != "0":
+            return REASON_WITHDRAWN
+        if self.ordinance_codes and "ordinanceCode" in doc and doc["ordinanceCode"] not in self.ordinance_codes:
+            return REASON_ORDINANCE
+        if self.form_codes and "formCode" in doc and doc["formCode"] not in self.form_codes:
+            return REASON_FORM
+        return None
+
+    def iter_targets(self, documents: Iterable[Dict], skipped: Dict[str, int]) -> Iterator[Dict]:
+        """
+        一覧を先頭から判定し、処理する書類を1件ずつ返す（一覧はストリームのまま読む）。
+
+        Args:
+            documents (Iterable[Dict]): 書類一覧（ジェネレーターでもよい）。
+            skipped (Dict[str, int]): スキップ理由ごとの件数を加算する辞書（読んだところまで）。
+
+        Yields:
+            Dict: 処理する書類。
+        """
+        for doc in documents:
+            reason = self.skip_reason(doc)
+            if reason is not None:
+                skipped[reason] = skipped.get(reason, 0) + 1
+                continue
+            yield doc
@@ -0,0 +1,195 @@
+"""
+Local index and compressed archive of EDINET documents.json list responses keyed by date
+"""
+import gzip
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class DocumentListIndex:
+    """
+    日付ごとの書類一覧APIレスポンスを保存する SQLite の索引。
+
+    レスポンスは gzip で圧縮し、日付と内容のハッシュで重複を除いて日付ごとの版として保存する。
+    同じ内容のレスポンスを再取得した場合は、新しい版を作らずにその版の確認日時（checked_at）を更新する。
+
+    日付の最新の版（確認日時が最も新しい版）を対象日より後に確認していれば「締まった日」の一覧として扱い、
+    以降はAPIに再リクエストせずこの索引から返す。当日・未来日の一覧は
+    まだ増える可能性があるため、常に再取得の対象とする。
+    load_archived() で過去の版を読み込み直せる（JSONファイルを開かずに再フィルタできる）。
+
+    Args:
+        db_path (Path): SQLite ファイルのパス。
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.db_path)
+        if not self._initialized:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS document_list_archive ("
+                " date TEXT NOT NULL,"
+                " content_hash TEXT NOT NULL,"
+                " fetched_at TEXT NOT NULL,"
+                " checked_at TEXT NOT NULL,"
+                " result_count INTEGER NOT NULL,"
+                " response BLOB NOT NULL,"
+                " PRIMARY KEY (date, content_hash))"
+            )
+            self._initialized = True
+        return connection
+
+    @staticmethod
+    def is_closed(target_date: str, fetched_at: str) -> bool:
+        """対象日が終わった後に取得したレスポンスなら True"""
+        return datetime.fromisoformat(fetched_at).date() > date.fromisoformat(target_date)
+
+    def get(self, target_date: str) -> Optional[Dict]:
+        """日付の最新の版が締まった日のレスポンスであれば返す。なければ None。"""
+        with self._lock:
+            connection = self._connect()
+            try:
+                row = connection.execute(
+                    "SELECT checked_at, response FROM document_list_archive WHERE date = ?"
+                    " ORDER BY checked_at DESC, rowid DESC LIMIT 1",
+                    (target_date,),
+                ).fetchone()
+            finally:
+                connection.close()
+        if row is None or not self.is_closed(target_date, row[0]):
+            return None
+        return _decode(row[1])
+
+    def archive(self, target_date: str, json_data: Dict, fetched_at: Optional[str] = None,
+                keep_versions: bool = True) -> bool:
+        """
+        レスポンスを日付ごとの版として保存する。同じ日付・同じ内容の版がすでにあれば、確認日時だけを更新する。
+
+        内容のハッシュは results（書類の一覧）から計算する（metadata の処理日時は含めない）。
+
+        Args:
+            target_date (str): 対象日（YYYY-MM-DD）。
+            json_data (Dict): 書類一覧APIのレスポンス。
+            fetched_at (Optional[str]): 取得日時（ISO形式）。省略時は現在時刻。
+            keep_versions (bool): False の場合は、その日付のほかの版を削除して最新の版だけを残す。
+
+        Returns:
+            bool: 新しい版として保存した場合は True。
+        """
+        fetched_at = fetched_at or datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    stored = _store(connection, target_date, json_data, fetched_at)
+                    if not keep_versions:
+                        connection.execute(
+                            "DELETE FROM document_list_archive WHERE date = ? AND content_hash != ?",
+                            (target_date, content_hash(json_data)),
+                        )
+                return stored
+            finally:
+                connection.close()
+
+    def archived_versions(self, target_date: Optional[str] = None) -> List[Tuple[str, str, str, int]]:
+        """保存済みの版の一覧（[(日付, ハッシュ, 取得日時, 件数), ...]、日付・取得日時の順）。日付を省略するとすべて"""
+        query = "SELECT date, content_hash, fetched_at, result_count FROM document_list_archive"
+        params: tuple = ()
+        if target_date is not None:
+            query += " WHERE date = ?"
+            params = (target_date,)
+        with self._lock:
+            connection = self._connect()
+            try:
+                return connection.execute(query + " ORDER BY date, fetched_at, rowid", params).fetchall()
+            finally:
+                connection.close()
+
+    def load_archived(self, target_date: str, content_hash: Optional[str] = None) -> Optional[Dict]:
+        """保存済みの版のレスポンスを返す（ハッシュを省略すると最後に確認した版）。なければ None"""
+        query = "SELECT response FROM document_list_archive WHERE date = ?"
+        params: tuple = (target_date,)
+        if content_hash is not None:
+            query += " AND content_hash = ?"
+            params += (content_hash,)
+        with self._lock:
+            connection = self._connect()
+            try:
+                row = connection.execute(query + " ORDER BY checked_at DESC, rowid DESC LIMIT 1", params).fetchone()
+            finally:
+                connection.close()
+        return None if row is None else _decode(row[0])
+
+    def import_files(self, paths: Iterable[Path]) -> int:
+        """
+        以前の形式のJSONファイル（edinet_documents_YYYY-MM-DD_YYYYmmdd_HHMMSS.json）を版として取り込む。
+
+        Returns:
+            int: 新しい版として保存したファイルの数。
+        """
+        imported = 0
+        for path in paths:
+            parts = Path(path).stem.split("_")
+            target_date = parts[2]
+            fetched_at = datetime.strptime("_".join(parts[3:5]), "%Y%m%d_%H%M%S").isoformat()
+            with open(path, encoding="utf-8") as f:
+                json_data = json.load(f)
+            imported += self.archive(target_date, json_data, fetched_at=fetched_at)
+        return imported
+
+
+def _store(connection: sqlite3.Connection, target_date: str, json_data: Dict, fetched_at: str) -> bool:
+    """版を保存する（同じ内容の版があれば確認日時を新しいほうにする）。新しい版なら True"""
+    digest = content_hash(json_data)
+    exists = connection.execute(
+        "SELECT 1 FROM document_list_archive WHERE date = ? AND content_hash = ?", (target_date, digest)
+    ).fetchone()
+    if exists is not None:
+        connection.execute(
+            "UPDATE document_list_archive SET checked_at = MAX(checked_at, ?) WHERE date = ? AND content_hash = ?",
+            (fetched_at, target_date, digest),
+        )
+        return False
+    connection.execute(
+        "INSERT INTO document_list_archive"
+        " (date, content_hash, fetched_at, result_count, response, checked_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (target_date, digest, fetched_at, len(json_data.get("results", [])), _encode(json_data), fetched_at),
+    )
+    return True
+
+
+def content_hash(json_data: Dict) -> str:
+    """書類一覧（results）の内容のハッシュ（SHA-256）"""
+    results = json.dumps(json_data.get("results", []), ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(results.encode("utf-8")).hexdigest()
+
+
+def _encode(json_data: Dict) -> bytes:
+    return gzip.compress(json.dumps(json_data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def _decode(response: bytes) -> Dict:
+    return json.loads(gzip.decompress(response))
+
+
+if __name__ == "__main__":
+    # 以前の形式の json/edinet_documents_*.json を索引に取り込み、保存済みの版を表示する
+    #   python -m module.document_index
+    from .config import config
+
+    index = DocumentListIndex(config['document_index_file'])
+    files = sorted(Path(config['json_folder']).glob("edinet_documents_*_*_*.json"))
+    print(f"{index.import_files(files)}/{len(files)}件のファイルを新しい版として取り込みました")
+    for version in index.archived_versions():
+        print(*version, sep="\t")
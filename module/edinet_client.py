@@ -0,0 +1,228 @@
+"""
+Shared HTTP client for the EDINET API (connection pool, timeouts, retries, rate limit)
+"""
+import random
+import tempfile
+import threading
+import time
+from typing import Any, BinaryIO, Callable, Optional, Tuple
+
+import requests
+
+from .config import config
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36",
+}
+
+# 再試行するHTTPステータス（レート制限とサーバー側の一時的なエラー）
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# ダウンロード時に1回で読み込むサイズ
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class TokenBucket:
+    """
+    スレッドセーフなトークンバケット。
+
+    rate 個/秒でトークンが補充され、最大 capacity 個まで貯まる。
+    しばらくリクエストがなかった後は capacity 件まで待たずに送れる。
+
+    Args:
+        rate (float): 1秒あたりの補充数。0以下なら制限しない。
+        capacity (float): バケットの容量（連続で送れる最大数）。
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """トークンを1つ取得できるまで待機する"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+
+class EdinetClient:
+    """
+    EDINET API へのすべてのリクエストで共有するクライアント。
+
+    - 接続プール付きの requests.Session（keep-alive で TCP/TLS ハンドシェイクを使い回す）
+    - 接続・読み込みのタイムアウト
+    - 429 / 5xx・接続エラー・タイムアウト時のジッター付き指数バックオフ（Retry-After を優先）
+    - 全スレッドで共有するトークンバケットによるレート制限
+
+    Args:
+        requests_per_second (float): 1秒あたりの最大リクエスト数。0以下なら制限しない。
+        burst (float): 連続で送れる最大リクエスト数。
+        pool_size (int): 同一ホストに保持する接続数（並列ワーカー数以上にする）。
+        connect_timeout (float): 接続タイムアウト（秒）。
+        read_timeout (float): 読み込みタイムアウト（秒）。
+        max_retries (int): 再試行の最大回数（ダウンロード途中の切断を含む）。0未満は0として扱う。
+        backoff_base (float): バックオフの基準秒数（base * 2^n を上限にランダムに待つ）。
+        backoff_max (float): バックオフの最大秒数。
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float = 2.0,
+        burst: float = 1.0,
+        pool_size: int = 4,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 60.0,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+    ):
+        self.limiter = TokenBucket(requests_per_second, burst)
+        self.timeout = (connect_timeout, read_timeout)
+        # 負の値でも1回はリクエストする
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @classmethod
+    def from_config(cls) -> "EdinetClient":
+        return cls(
+            requests_per_second=config['edinet_requests_per_second'],
+            burst=config['edinet_request_burst'],
+            # 書類一覧の並列取得とダウンロードワーカーが同時に使えるようにする
+            pool_size=config['max_download_workers'] + 2,
+            connect_timeout=config['edinet_connect_timeout'],
+            read_timeout=config['edinet_read_timeout'],
+            max_retries=config['edinet_max_retries'],
+            backoff_base=config['edinet_backoff_base'],
+            backoff_max=config['edinet_backoff_max'],
+        )
+
+    def get(self, url: str, params: Optional[dict] = None, **kwargs) -> requests.Response:
+        """
+        レート制限と再試行付きで GET する。
+
+        再試行しても 429 / 5xx が続いた場合は最後のレスポンスを返す
+        （ステータスの扱いは呼び出し側の raise_for_status などに任せる）。
+
+        Raises:
+            requests.exceptions.RequestException: 再試行しても接続できなかった場合。
+        """
+        return self._request(url, params, None, **kwargs)
+
+    def download(self, url: str, params: Optional[dict] = None, max_memory: int = 8 * 1024 * 1024) -> BinaryIO:
+        """
+        レスポンス本文をチャンク単位でストリーミングし、一時ファイルに書き出して返す。
+
+        max_memory バイトまではメモリ上に置き、それを超えるとディスクに書き出す
+        （SpooledTemporaryFile）。返すファイルは先頭にシーク済みで、そのまま
+        zipfile で開ける。呼び出し側で close すること。
+        転送途中で接続が切れた場合も、get と同じ再試行の回数の中で最初から取り直す。
+
+        Raises:
+            requests.exceptions.RequestException: HTTPエラー、または再試行しても取得できなかった場合。
+        """
+        def read_body(response: requests.Response) -> BinaryIO:
+            response.raise_for_status()
+            spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+            try:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    spool.write(chunk)
+            except BaseException:
+                spool.close()
+                raise
+            spool.seek(0)
+            return spool
+
+        return self._request(url, params, read_body, stream=True)
+
+    def _request(self, url: str, params: Optional[dict], read_body: Optional[Callable[[requests.Response], Any]], **kwargs):
+        """
+        get / download の共通処理。再試行はこの1か所だけで行う。
+
+        接続エラー・タイムアウト・429 / 5xx に加え、read_body で本文を読む途中の切断も
+        同じ回数（max_retries）の中で再試行する。read_body を渡さなければレスポンスを返す。
+        """
+        from .logger import logger
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt >= self.max_retries
+            self.limiter.acquire()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout, **kwargs)
+                if response.status_code in RETRY_STATUSES and not last_attempt:
+                    delay = self._retry_after(response) or self._backoff(attempt)
+                    logger.warning(f"⚠️ EDINETが {response.status_code} を返しました。{delay:.1f}秒後に再試行します（{attempt + 1}/{self.max_retries}）: {url}")
+                    response.close()
+                    time.sleep(delay)
+                    continue
+                if read_body is None:
+                    return response
+                with response:
+                    return read_body(response)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                if last_attempt:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"⚠️ EDINETへの接続に失敗したか、途中で切断されました。{delay:.1f}秒後に再試行します（{attempt + 1}/{self.max_retries}）: {e}")
+                time.sleep(delay)
+
+    def fetch_tail(self, url: str, params: Optional[dict] = None, size: int = 64 * 1024) -> Optional[Tuple[bytes, int]]:
+        """
+        Range リクエストでレスポンス本文の末尾 size バイトだけを取得する。
+
+        Returns:
+            Optional[Tuple[bytes, int]]: (末尾のバイト列, 全体のサイズ)。サーバーが Range に
+                対応していない（206 を返さない）場合は本文を読まずに None。
+        """
+        response = self.get(url, params=params, headers={"Range": f"bytes=-{size}"}, stream=True)
+        with response:
+            if response.status_code != 206:
+                return None
+            total = response.headers.get("Content-Range", "").rsplit("/", 1)[-1]
+            if not total.isdigit():
+                return None
+            return response.content, int(total)
+
+    def _backoff(self, attempt: int) -> float:
+        """フルジッター付きの指数バックオフ（0 〜 min(max, base * 2^attempt) の一様乱数）"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _retry_after(self, response: requests.Response) -> Optional[float]:
+        """Retry-After ヘッダー（秒数指定のみ対応）"""
+        try:
+            return min(self.backoff_max, float(response.headers["Retry-After"]))
+        except (KeyError, ValueError):
+            return None
+
+    def close(self):
+        self.session.close()
+
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+
+def shared_client() -> EdinetClient:
+    """プロセス内で共有する EdinetClient（初回呼び出し時に config から作成）"""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = EdinetClient.from_config()
+        return _shared_client
@@ -1,74 +1,30 @@
 import requests
-import json
-import os
-from datetime import datetime
-from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from itertools import islice
+
+from .config import config
+from .document_index import DocumentListIndex
+from .edinet_client import shared_client
+
+# 過去日の書類一覧レスポンスの索引（締まった日は再リクエストしない）
+document_index = DocumentListIndex(config['document_index_file'])
+
 
 # EDINET API から有価証券報告書一覧を取得
 def fetch_edinet_documents(yyyy_mm_dd="2024-03-10", EDINET_API_KEY="", save_json=True):
     from .logger import logger
-    
-    url = "https://disclosure.edinet-fsa.go.jp/api/v2/documents.json"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36",
-    }
-    params = {
-        "date": yyyy_mm_dd,
-        "type": 2,  # 有価証券報告書
-        "Subscription-Key": EDINET_API_KEY
-    }
-    
+
     try:
-        # リクエスト送信➡レスポンス取得
-        response = requests.get(url, headers=headers, params=params)
-        
-        if response.status_code == 403:
-            logger.error("❌ APIアクセスが禁止されています。認証情報を確認してください。")
+        json_data = _load_document_list(yyyy_mm_dd, EDINET_API_KEY, save_json)
+        if json_data is None:
             return []
-        
-        response.raise_for_status()  # HTTPエラーが発生した場合は例外を発生させる
-        json_data = response.json()
-        
-        # Save JSON response if requested
-        if save_json:
-            try:
-                json_dir = Path(__file__).parent.parent / 'json'
-                json_dir.mkdir(exist_ok=True)
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                json_filename = f"edinet_documents_{yyyy_mm_dd}_{timestamp}.json"
-                json_path = json_dir / json_filename
-                
-                with open(json_path, 'w', encoding='utf-8') as f:
-                    json.dump(json_data, f, ensure_ascii=False, indent=2)
-                logger.info(f"✅ JSON response saved to: {json_path}")
-            except Exception as e:
-                logger.exception("JSON保存中にエラーが発生しましたが、処理を続けます。")
-        
-        documents = []
-        
-        # json data を処理して documents に辞書として格納
-        for doc in json_data.get("results", []):
-            try:
-                if doc["docTypeCode"] == "120":  # 有価証券報告書のみ取得
-                    documents.append({
-                        "EDINETコード": doc["edinetCode"],
-                        "fundコード": doc["fundCode"],
-                        "企業名": doc["filerName"],
-                        "会計期間開始": doc["periodStart"],
-                        "会計期間終了": doc["periodEnd"],
-                        "書類提出日": doc["submitDateTime"],
-                        "書類ID": doc["docID"],
-                        "XBRLダウンロードURL": f"https://disclosure.edinet-fsa.go.jp/api/v2/documents/{doc['docID']}?type=1"
-                    })
-                    # docのキーと値もそのまま追加
-                    documents[-1].update(doc)
-            except Exception as e:
-                logger.exception(f"書類データ処理中にエラーが発生しました: {doc.get('filerName', 'Unknown')}")
-                continue  # エラーが発生した書類はスキップして続行
-        
+
+        documents = _parse_documents(json_data)
         logger.info(f"✅ {len(documents)}件の有価証券報告書を取得しました")
         return documents
-        
+
     except requests.exceptions.RequestException as e:
         logger.exception(f"EDINET API リクエスト中にネットワークエラーが発生しました: {yyyy_mm_dd}")
         return []
@@ -77,3 +33,149 @@ def fetch_edinet_documents(yyyy_mm_dd="2024-03-10", EDINET_API_KEY="", save_json
         return []
 
 
+# 期間内の書類一覧を並列に取得し、書類IDで重複を除いて日付順に返す
+def fetch_edinet_documents_range(start_date, end_date, EDINET_API_KEY="", save_json=True, max_workers=4):
+    """
+    start_date から end_date まで（両端を含む）の書類一覧を並列に取得する。
+
+    各日の一覧は共有の EdinetClient（接続プール・レート制限付き）で取得し、
+    締まった過去日はローカルの索引から読み込む。結果は日付順にストリームとして返すため、
+    呼び出し側は全期間の取得完了を待たずに処理を始められる。
+
+    先読みする日数は max_workers 日までで、1日分を返し始めるたびに次の日を取得する。
+    呼び出し側が途中で読むのをやめれば（close() / ループを抜ける）、まだ始まっていない日は取得しない。
+    各日の取得時間は "list" ステージとして計測する。
+
+    Yields:
+        Dict: 有価証券報告書1件分の辞書（fetch_edinet_documents と同じ形式）。
+    """
+    from .logger import logger
+    from .metrics import stage
+
+    def fetch_day(day):
+        with stage("list"):
+            return fetch_edinet_documents(day, EDINET_API_KEY, save_json=save_json)
+
+    first_day = date.fromisoformat(start_date)
+    last_day = date.fromisoformat(end_date)
+    dates = [(first_day + timedelta(days=offset)).isoformat() for offset in range((last_day - first_day).days + 1)]
+    logger.info(f"📅 {start_date} 〜 {end_date} の{len(dates)}日分の書類一覧を取得します")
+
+    seen_doc_ids = set()
+    max_workers = max(1, max_workers)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    remaining = iter(dates)
+    # 取得中・取得済みで、まだ返していない日（日付順）
+    daily_lists = deque(executor.submit(fetch_day, day) for day in islice(remaining, max_workers))
+    try:
+        while daily_lists:
+            documents = daily_lists.popleft().result()
+            for day in islice(remaining, 1):
+                daily_lists.append(executor.submit(fetch_day, day))
+            for doc in documents:
+                if doc["書類ID"] in seen_doc_ids:
+                    continue
+                seen_doc_ids.add(doc["書類ID"])
+                yield doc
+    finally:
+        # 途中で読むのをやめた場合は、まだ始まっていない日を取り消す
+        for future in daily_lists:
+            future.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 複数日の書類一覧を並列に取得して索引に保存しておく（GUIで複数日を選んだ場合など）
+def prefetch_document_lists(dates, EDINET_API_KEY="", max_workers=4):
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        list(executor.map(lambda day: fetch_edinet_documents(day, EDINET_API_KEY), dates))
+
+
+# 保存済みの書類一覧からオフラインで有価証券報告書の一覧を作る（APIにはリクエストしない）
+def load_archived_documents(yyyy_mm_dd, content_hash=None):
+    """
+    document_index に保存した版から、fetch_edinet_documents と同じ形式の一覧を返す。
+
+    DocumentFilter などで条件を変えて再フィルタする場合に使う。
+
+    Args:
+        yyyy_mm_dd (str): 書類一覧の日付。
+        content_hash (Optional[str]): 版のハッシュ。省略時は最後に取得した版。
+
+    Returns:
+        List[Dict]: 有価証券報告書の一覧。保存された版がなければ空のリスト。
+    """
+    json_data = document_index.load_archived(yyyy_mm_dd, content_hash)
+    return [] if json_data is None else _parse_documents(json_data)
+
+
+def _load_document_list(yyyy_mm_dd, EDINET_API_KEY, save_json=True):
+    """索引に締まった日のレスポンスがあればそれを、なければAPIから取得して返す"""
+    from .logger import logger
+
+    try:
+        json_data = document_index.get(yyyy_mm_dd)
+        if json_data is not None:
+            logger.info(f"♻️ 保存済みの書類一覧を使用します: {yyyy_mm_dd}")
+            return json_data
+    except Exception as e:
+        logger.exception(f"書類一覧の索引の読み込みに失敗しました。APIから取得します: {yyyy_mm_dd}")
+
+    params = {
+        "date": yyyy_mm_dd,
+        "type": 2,  # 有価証券報告書
+        "Subscription-Key": EDINET_API_KEY
+    }
+
+    # リクエスト送信➡レスポンス取得（429 / 5xx は共有クライアントが再試行する）
+    documents_url = f"{config['edinet_api_base_url']}/documents.json"
+    response = shared_client().get(documents_url, params=params)
+
+    if response.status_code == 403:
+        logger.error("❌ APIアクセスが禁止されています。認証情報を確認してください。")
+        return None
+
+    response.raise_for_status()  # HTTPエラーが発生した場合は例外を発生させる
+    json_data = response.json()
+
+    # レスポンスを日付ごとの版として圧縮して残す（同じ内容の版は保存しない）。
+    # 締まった日の索引も同じ版から引くため、save_json=False でも最新の版だけは保存する
+    try:
+        if document_index.archive(yyyy_mm_dd, json_data, keep_versions=save_json):
+            logger.info(f"🗜️ 書類一覧を保存しました: {yyyy_mm_dd} ({document_index.db_path})")
+        else:
+            logger.info(f"♻️ 同じ内容の書類一覧は保存済みです: {yyyy_mm_dd}")
+    except Exception as e:
+        logger.exception("書類一覧の保存中にエラーが発生しましたが、処理を続けます。")
+
+    return json_data
+
+
+def _parse_documents(json_data):
+    """書類一覧APIのレスポンスから有価証券報告書だけを辞書のリストにする"""
+    from .logger import logger
+
+    documents = []
+    base_url = config['edinet_api_base_url']
+
+    # json data を処理して documents に辞書として格納
+    for doc in json_data.get("results", []):
+        try:
+            if doc["docTypeCode"] == "120":  # 有価証券報告書のみ取得
+                documents.append({
+                    "EDINETコード": doc["edinetCode"],
+                    "fundコード": doc["fundCode"],
+                    "企業名": doc["filerName"],
+                    "会計期間開始": doc["periodStart"],
+                    "会計期間終了": doc["periodEnd"],
+                    "書類提出日": doc["submitDateTime"],
+                    "書類ID": doc["docID"],
+                    "XBRLダウンロードURL": f"{base_url}/documents/{doc['docID']}?type=1",
+                    "CSVダウンロードURL": f"{base_url}/documents/{doc['docID']}?type=5",
+                })
+                # docのキーと値もそのまま追加
+                documents[-1].update(doc)
+        except Exception as e:
+            logger.exception(f"書類データ処理中にエラーが発生しました: {doc.get('filerName', 'Unknown')}")
+            continue  # エラーが発生した書類はスキップして続行
+
+    return documents
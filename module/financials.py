@@ -0,0 +1,266 @@
+"""
+Financial data extraction and ratio calculation for a single filing
+"""
+from typing import TYPE_CHECKING, Dict, Optional, Union
+
+from .config import config
+from .logger import logger
+from .metrics import document, stage
+from .periods import CURRENT_PERIOD, extraction_periods
+from .pipeline import Fallback
+from .records import FilingRecord
+from .xbrl_archive import CsvMember, XbrlMember
+
+# pandas（CSV）と lxml（XBRL）は使う書類が来たときに読み込む
+# （解析ワーカーの起動や、片方の形式だけを処理する実行を軽くするため）
+if TYPE_CHECKING:
+    from .xbrl_reader import XbrlDocument
+
+
+def preload_parsers():
+    """
+    CSV・XBRLの解析モジュール（pandas・lxml）を読み込んでおく。
+
+    処理する書類が決まった時点で親プロセスで呼ぶと、fork で起動する解析ワーカーが
+    読み込み済みの状態を引き継ぐため、ワーカーごとに読み込み直さずに済む。
+    """
+    from . import xbrl_csv, xbrl_reader  # noqa: F401
+
+
+def extract_financial_data(xbrl_document: "XbrlDocument", company_name: str) -> Optional[Dict[str, Dict]]:
+    """
+    config['xbrl_extraction'] の各設定で、パース済みXBRLから財務データを抽出する。
+
+    fund形式で取得できなければ通常企業形式で抽出し、最後にキャッシュフローを追加する。
+    通常企業形式でも解析に失敗した場合は None を返す。
+    戻り値は 期間 -> 財務データ の辞書（当期は "CurrentYear"。前期以前は config['prior_periods'] 期まで）。
+    """
+    extraction_config = config['xbrl_extraction']
+    financial_data = {}
+
+    # Try fund-specific extraction first
+    try:
+        fund_balance_config = extraction_config['fund']['balance_sheet']
+        financial_data = _extract_block(xbrl_document, fund_balance_config)
+
+        fund_profit_config = extraction_config['fund']['profit_loss']
+        profit_loss = _extract_block(xbrl_document, fund_profit_config)
+        if profit_loss:
+            financial_data = _merge_periods(financial_data, profit_loss)
+        logger.info(f"✅ {company_name} fund形式でのXBRL解析が成功しました")
+    except Exception as e:
+        logger.exception(f"fund形式でのXBRL解析に失敗しました: {company_name}")
+        logger.info("通常企業形式での解析を試行します。")
+
+    # Try regular company extraction if fund extraction failed or didn't get enough data
+    if not financial_data or len(financial_data) == 0:
+        try:
+            regular_balance_config = extraction_config['regular_company']['balance_sheet']
+            financial_data = _extract_block(xbrl_document, regular_balance_config)
+
+            regular_profit_config = extraction_config['regular_company']['profit_loss']
+            profit_loss = _extract_block(xbrl_document, regular_profit_config)
+            if profit_loss:
+                financial_data = _merge_periods(financial_data, profit_loss)
+            logger.info(f"✅ {company_name} 通常企業形式でのXBRL解析が成功しました")
+        except Exception as e:
+            logger.exception(f"通常企業形式でのXBRL解析に失敗しました: {company_name}")
+            return None
+
+    # キャッシュフロー取得 ConsolidatedStatementOfCashFlowsTextBlock
+    try:
+        cash_flow_config = extraction_config['regular_company']['cash_flow']
+        cash_flow_data = _extract_block(xbrl_document, cash_flow_config)
+        if cash_flow_data:
+            financial_data = _merge_periods(financial_data, cash_flow_data)
+            logger.info(f"✅ {company_name} キャッシュフロー取得成功")
+    except Exception as e:
+        logger.exception(f"キャッシュフロー取得に失敗しました: {company_name}")
+        logger.info("キャッシュフローなしで処理を続けます。")
+
+    return financial_data
+
+
+def _extract_block(xbrl_document: "XbrlDocument", section: Dict) -> Dict[str, Dict]:
+    """1つのテキストブロックからの抽出（ブロックごとの処理時間を記録する）"""
+    from .xbrl_reader import extract_period_values_from_xbrl
+
+    with stage(f"extract_block:{section['target_block_name']}"):
+        return extract_period_values_from_xbrl(
+            xbrl_document, section['target_block_name'], section['search_words_list'], _periods()
+        )
+
+
+def _merge_periods(base: Dict[str, Dict], update: Dict[str, Dict]) -> Dict[str, Dict]:
+    """期間ごとの財務データを期間ごとに結合する（update の値を優先する）"""
+    merged = {period: dict(values) for period, values in base.items()}
+    for period, values in update.items():
+        merged[period] = {**merged.get(period, {}), **values}
+    return merged
+
+
+def _found(period_values: Dict[str, Dict]) -> Dict[str, Dict]:
+    """見つからなかった項目・期間を除く"""
+    found = {}
+    for period, values in period_values.items():
+        values = {word: value for word, value in values.items() if value is not None}
+        if values:
+            found[period] = values
+    return found
+
+
+def _periods() -> tuple:
+    """抽出する期間（当期と、config['prior_periods'] 期前まで）"""
+    return tuple(extraction_periods(config['prior_periods']))
+
+
+def extract_financial_data_from_csv(csv_member: CsvMember, company_name: str, filer_type: str = 'regular_company') -> Optional[Dict[str, Dict]]:
+    """
+    EDINETのCSV（type=5）から、config['xbrl_extraction'][filer_type] の element_ids に従って財務データを抽出する。
+
+    戻り値は 期間 -> 財務データ の辞書。当期の値が1つも取れなかった場合は None を返す。
+    """
+    from .xbrl_csv import extract_period_values_from_csv
+
+    try:
+        with stage("extract_csv"):
+            financial_data = extract_period_values_from_csv(
+                csv_member.data, _element_ids(filer_type), config['fact_context_priority'], _periods()
+            )
+    except Exception as e:
+        logger.exception(f"CSVからの抽出に失敗しました: {company_name}, {csv_member.name}")
+        return None
+
+    # 見つからなかった項目は含めない
+    financial_data = _found(financial_data)
+    if CURRENT_PERIOD not in financial_data:
+        return None
+    logger.info(f"✅ {company_name} CSVからの抽出が成功しました")
+    return financial_data
+
+
+def extract_financial_data_from_facts(xbrl_member: XbrlMember, company_name: str, filer_type: str = 'regular_company') -> Optional[Dict[str, Dict]]:
+    """
+    XBRLのタグ付きの値（要素ID・コンテキストID）から、config['xbrl_extraction'][filer_type] の element_ids に従って財務データを抽出する。
+
+    iterparse による1回の走査で索引を作るため、文書全体の木は作らない。前期以前の値も同じ索引から引く。
+    戻り値は 期間 -> 財務データ の辞書。当期の値が1つも取れなかった場合は None を返す。
+    """
+    from .xbrl_reader import build_fact_index, extract_values_from_facts
+
+    try:
+        element_ids = _element_ids(filer_type)
+        with stage("extract_facts"):
+            if config['xbrl_streaming']:
+                # 対象の要素だけを保持し、すべて揃った時点で読み込みを打ち切る
+                fact_index = build_fact_index(xbrl_member.source, element_ids, config['fact_context_priority'], _periods())
+            else:
+                fact_index = build_fact_index(xbrl_member.source)
+            financial_data = {
+                period: extract_values_from_facts(fact_index, element_ids, config['fact_context_priority'], period)
+                for period in _periods()
+            }
+    except Exception as e:
+        logger.exception(f"タグ付きの値からの抽出に失敗しました: {company_name}, {xbrl_member.name}")
+        return None
+
+    financial_data = _found(financial_data)
+    if CURRENT_PERIOD not in financial_data:
+        return None
+    logger.info(f"✅ {company_name} タグ付きの値からの抽出が成功しました")
+    return financial_data
+
+
+def _block_names() -> list:
+    """config['xbrl_extraction'] の全設定の target_block_name の一覧"""
+    return [
+        section['target_block_name']
+        for filer_type in ('fund', 'regular_company')
+        for section in config['xbrl_extraction'][filer_type].values()
+    ]
+
+
+def filer_type_of(doc: Dict) -> str:
+    """書類一覧のメタデータから config['xbrl_extraction'] の企業形式（fund / regular_company）を判定する"""
+    return 'fund' if doc.get('fundCode') else 'regular_company'
+
+
+def _element_ids(filer_type: str) -> Dict:
+    """config['xbrl_extraction'][filer_type] の全設定の element_ids を1つの辞書にまとめる"""
+    element_ids = {}
+    for section in config['xbrl_extraction'][filer_type].values():
+        element_ids.update(section.get('element_ids', {}))
+    return element_ids
+
+
+def analyze_filing(doc: Dict, member: Union[XbrlMember, CsvMember]) -> Union[FilingRecord, Fallback, None]:
+    """
+    1書類分のXBRLまたはCSV（ZIPから取り出したメンバー）を解析し、出力用の FilingRecord を返す。
+
+    CSVなら要素IDで、XBRLならまずタグ付きの値を要素IDで引き、
+    取れなかった場合のみテキストブロックのHTMLを解析する。
+    パイプラインの解析ステージとしてワーカープロセスで実行される。
+    解析に失敗した場合は None を返す。CSVから当期の値が取れなかった場合は Fallback を返し、
+    パイプラインがXBRLを取得し直して、もう一度この関数で解析する。
+    """
+    with document(doc['書類ID']), stage("analyze") as span:
+        try:
+            row = _analyze_filing(doc, member)
+        finally:
+            # 一時ファイルに展開したXBRLは解析が終われば不要（解析し直す場合は取得し直す）
+            if isinstance(member, XbrlMember):
+                member.discard()
+        if row is None or isinstance(row, Fallback):
+            span.fail()
+        return row
+
+
+def _analyze_filing(doc: Dict, member: Union[XbrlMember, CsvMember]) -> Union[FilingRecord, Fallback, None]:
+    company_name = doc['企業名']
+
+    if isinstance(member, CsvMember):
+        logger.info(f"📊 {company_name} のCSVを解析中...")
+        financial_data = extract_financial_data_from_csv(member, company_name, filer_type_of(doc))
+        if financial_data is None:
+            logger.info(f"{company_name} はCSVから当期の値が取れなかったため、XBRLから抽出します")
+            return Fallback("csv")
+        return _build_row(doc, financial_data, company_name)
+
+    logger.info(f"📊 {company_name} のXBRLを解析中...")
+    if config['use_fact_extraction']:
+        financial_data = extract_financial_data_from_facts(member, company_name, filer_type_of(doc))
+        if financial_data is not None:
+            return _build_row(doc, financial_data, company_name)
+        logger.info(f"{company_name} はタグ付きの値が取れなかったため、テキストブロックから抽出します")
+
+    # XBRL ファイルのパースは1書類につき1回だけ行い、以降の抽出はすべてこれを使う
+    # ストリーミングモードでは文書全体の木を作らず、必要なテキストブロックだけを保持する
+    from .xbrl_reader import XbrlDocument
+
+    try:
+        block_names = _block_names() if config['xbrl_streaming'] else None
+        with stage("parse_xbrl"):
+            xbrl_document = XbrlDocument(member.source, name=member.name, block_names=block_names)
+    except Exception as e:
+        logger.exception(f"XBRLファイルのパースに失敗しました: {company_name}")
+        logger.info(f"❌ {company_name} のXBRL解析に失敗しました。次の企業に進みます。")
+        return None
+
+    financial_data = extract_financial_data(xbrl_document, company_name)
+    if financial_data is None:
+        logger.info(f"❌ {company_name} のXBRL解析に失敗しました。次の企業に進みます。")
+        return None
+    return _build_row(doc, financial_data, company_name)
+
+
+def _build_row(doc: Dict, financial_data: Dict[str, Dict], company_name: str) -> FilingRecord:
+    """
+    書類情報と抽出した財務データ（期間 -> 財務データ）から FilingRecord を作る。
+
+    当期の値は出力の列に、前期以前の値は periods に入れる。
+    財務指標は全書類の抽出が終わった後に ratios.apply_ratios でまとめて計算する。
+    """
+    record = FilingRecord.from_row(doc, financial_data.get(CURRENT_PERIOD, {}))
+    record.periods = _found({period: values for period, values in financial_data.items() if period != CURRENT_PERIOD})
+    logger.info(f"✅ {company_name} の処理が完了しました")
+    return record
@@ -0,0 +1,100 @@
+"""
+Persistent per-docID processing ledger for resumable runs
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from .records import FilingRecord
+
+# 書類ごとの処理状態
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+class ProcessingLedger:
+    """
+    書類ID（docID）ごとの処理状態と抽出結果を記録する SQLite の台帳。
+
+    1社分の結果が出るたびに記録するため、途中で処理が止まっても
+    （ネットワーク障害・Googleのクォータ・Ctrl-C など）それまでの結果は失われない。
+    同じ日付を再実行すると、完了済みの書類は台帳の結果を使い、
+    失敗した書類だけを処理し直す。
+
+    Args:
+        db_path (Path): SQLite ファイルのパス。
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.db_path)
+        if not self._initialized:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS ledger ("
+                " doc_id TEXT PRIMARY KEY,"
+                " target_date TEXT,"
+                " company_name TEXT,"
+                " status TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 1,"
+                " row TEXT,"
+                " updated_at TEXT NOT NULL)"
+            )
+            self._initialized = True
+        return connection
+
+    def completed_rows(self, doc_ids: Iterable[str]) -> Dict[str, FilingRecord]:
+        """指定した書類IDのうち、処理済みのものの結果（書類ID -> FilingRecord）を返す"""
+        doc_ids = list(doc_ids)
+        rows = {}
+        with self._lock:
+            connection = self._connect()
+            try:
+                # SQLite のプレースホルダー数の上限を超えないよう分割して問い合わせる
+                for start in range(0, len(doc_ids), 500):
+                    chunk = doc_ids[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    for doc_id, row in connection.execute(
+                        f"SELECT doc_id, row FROM ledger WHERE status = ? AND doc_id IN ({placeholders})",
+                        (STATUS_DONE, *chunk),
+                    ):
+                        rows[doc_id] = FilingRecord.from_row(json.loads(row))
+            finally:
+                connection.close()
+        return rows
+
+    def record(self, doc: Dict, row: Optional[FilingRecord], target_date: Optional[str] = None):
+        """
+        1書類分の結果を記録する。row が None なら失敗として記録し、試行回数を数える。
+
+        Args:
+            doc (Dict): 書類一覧の1件（`書類ID` と `企業名` を使う）。
+            row (Optional[FilingRecord]): 出力する1行分の結果（出力する列と前期以前の値を保存する）。
+            target_date (Optional[str]): 処理対象の日付（記録用）。
+        """
+        status = STATUS_DONE if row else STATUS_FAILED
+        row_json = json.dumps(row.dump(), ensure_ascii=False, default=str) if row else None
+        updated_at = datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.execute(
+                        "INSERT INTO ledger (doc_id, target_date, company_name, status, row, updated_at)"
+                        " VALUES (?, ?, ?, ?, ?, ?)"
+                        " ON CONFLICT(doc_id) DO UPDATE SET"
+                        " target_date = excluded.target_date, company_name = excluded.company_name,"
+                        " status = excluded.status, attempts = attempts + 1,"
+                        " row = excluded.row, updated_at = excluded.updated_at",
+                        (doc["書類ID"], target_date, doc.get("企業名"), status, row_json, updated_at),
+                    )
+            finally:
+                connection.close()
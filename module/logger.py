@@ -1,85 +1,218 @@
+import atexit
 import logging
+import logging.handlers
 import time
 import threading
 import os
+import tempfile
 from pathlib import Path
 
-def setup_logger(log_file: str = None, max_lines: int = 10000, delete_lines: int = 2000):
-    # Default log file path if not provided
-    if log_file is None:
-        # Create log directory in parent directory (project root)
-        log_dir = Path(__file__).parent.parent / 'log'
-        log_dir.mkdir(exist_ok=True)
-        log_file = str(log_dir / 'logfile.log')
-    
+# ルートロガー。ハンドラーは setup_logger() を呼ぶまで設定しない
+# （インポートしただけではログフォルダの作成やログ出力の準備を行わない）
+logger = logging.getLogger()
+
+# setup_logger() で設定済みのログファイル（未設定なら None）
+_configured_log_file = None
+# ログファイルをトリミングするプロセスのPID（setup_logger() で設定する）
+_owner_pid = None
+_setup_lock = threading.Lock()
+
+# 行数を数える・ファイルを詰めるときに1回で読み込むサイズ
+_CHUNK_SIZE = 1024 * 1024
+
+def setup_logger(log_file: str = None, max_lines: int = None, delete_lines: int = None, use_queue: bool = None,
+                 owner_pid: int = None):
+    """
+    コンソールとファイルへのログ出力を設定する。
+
+    引数を省略した場合は config の log_file / max_log_lines / delete_log_lines / log_queue を使う。
+    何度呼んでも設定は1回だけ行う（2回目以降は何もせずロガーを返す）。
+
+    Args:
+        log_file (str): ログファイルのパス。
+        max_lines (int): ログファイルの最大行数。超えたら古い行から delete_lines 行を削除する。
+        delete_lines (int): 1回のトリミングで削除する行数。
+        use_queue (bool): True なら、ログの書き込みを専用スレッド（QueueListener）で行い、
+            ログを出力するスレッド・解析ワーカーはキューに入れるだけで処理に戻る。
+        owner_pid (int): ログファイルをトリミングするプロセスのPID。省略時はこのプロセス。
+            spawn / forkserver で起動する解析ワーカーには、プールの initializer で
+            log_owner_pid() の値を渡す（fork なら設定ごと引き継ぐため呼ばれない）。
+    """
+    global _configured_log_file, _owner_pid
+    with _setup_lock:
+        if _configured_log_file is not None:
+            return logger
+        from .config import config
+
+        log_file = str(log_file or config['log_file'])
+        max_lines = config['max_log_lines'] if max_lines is None else max_lines
+        delete_lines = config['delete_log_lines'] if delete_lines is None else delete_lines
+        use_queue = config['log_queue'] if use_queue is None else use_queue
+        owner_pid = os.getpid() if owner_pid is None else owner_pid
+        if owner_pid != os.getpid():
+            # 子プロセスはファイルに直接追記するだけにする（書き込み用スレッドもトリミングも親が行う）
+            use_queue = False
+        _configured_log_file = log_file
+        _owner_pid = owner_pid
+        return _setup_logger(log_file, max_lines, delete_lines, use_queue, owner_pid)
+
+def log_owner_pid() -> int:
+    """ログファイルをトリミングするプロセスのPID（setup_logger() の前ならこのプロセス）"""
+    return os.getpid() if _owner_pid is None else _owner_pid
+
+def _setup_logger(log_file: str, max_lines: int, delete_lines: int, use_queue: bool, owner_pid: int):
     # Ensure log directory exists
     log_path = Path(log_file)
     log_path.parent.mkdir(parents=True, exist_ok=True)
     # ロガーの設定
-    logger = logging.getLogger()
     logger.setLevel(logging.INFO)
 
     # コンソール出力用のハンドラーを設定
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
 
-    # ログファイル出力用のハンドラーを設定
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    # ログファイル出力用のハンドラーを設定（行数の上限を超えたら古い行を削除する）
+    file_handler = LineBoundedFileHandler(log_file, max_lines, delete_lines, owner_pid=owner_pid)
     file_handler.setLevel(logging.INFO)
 
     # フォーマッターを設定（ファイル名と行数を含む）
     formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s')
     console_handler.setFormatter(formatter)
     file_handler.setFormatter(formatter)
+    for handler in (console_handler, file_handler):
+        _hold_lock_across_fork(handler)
 
-    # ハンドラーをロガーに追加
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    if use_queue:
+        # 書き込みは QueueListener のスレッドだけが行う。
+        # fork で起動した解析ワーカーも同じキューに送るため、プロセス間で共有できるキューを使う
+        import multiprocessing
+
+        log_queue = multiprocessing.Queue(-1)
+        listener = logging.handlers.QueueListener(
+            log_queue, console_handler, file_handler, respect_handler_level=True
+        )
+        listener.start()
+        # 終了時にキューに残ったログを書き出す
+        atexit.register(listener.stop)
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    else:
+        # ハンドラーをロガーに追加
+        logger.addHandler(console_handler)
+        logger.addHandler(file_handler)
     logger.info("")
     logger.info("ログを開始します。")
     logger.info("")
 
-    # バックグラウンドスレッドでファイル監視を開始
-    monitor_thread = threading.Thread(target=monitor_log_file, args=(log_file, max_lines, delete_lines), daemon=True)
-    monitor_thread.start()
-
     return logger
 
-def monitor_log_file(log_file: str, max_lines: int, delete_lines: int):
+class LineBoundedFileHandler(logging.FileHandler):
     """
-    ログファイルを監視し、行数が指定した最大数を超えた場合に行を削除します。
-    バックグラウンドで実行されます。
+    行数に上限があるログファイルのハンドラー。
+
+    行数は起動時に1回だけ数え、以降は書き込んだ行数を加算していく。
+    上限（max_lines）を超えたら、ハンドラーのロック内で古い行から delete_lines 行を削除し、
+    残りを一時ファイルに書いて置き換える（書き込みとトリミングが競合しない）。
+
+    子プロセス（解析ワーカー）から書き込む場合は追記だけを行い、トリミングは
+    owner_pid のプロセス（省略時はハンドラーを作ったプロセス）に任せる。
+    トリミングでファイルが置き換えられたら、子プロセスは新しいファイルを開き直す。
     """
-    while True:
-        if check_file_lines(log_file, max_lines):
-            trim_file(log_file, delete_lines)
-        
-        time.sleep(5)  # 1秒ごとに監視を行う
 
-def check_file_lines(log_file: str, max_lines: int) -> bool:
-    try:
-        with open(log_file, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-        return len(lines) > max_lines
-    except FileNotFoundError:
-        return False
+    def __init__(self, filename: str, max_lines: int, delete_lines: int, encoding: str = 'utf-8',
+                 owner_pid: int = None):
+        super().__init__(filename, mode='a', encoding=encoding)
+        self.max_lines = max_lines
+        self.delete_lines = max(1, delete_lines)
+        self._owner_pid = os.getpid() if owner_pid is None else owner_pid
+        self._lines = _count_lines(self.baseFilename)
+
+    def emit(self, record):
+        try:
+            msg = self.format(record)
+            if os.getpid() != self._owner_pid:
+                self._reopen_if_replaced()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(msg + self.terminator)
+            self.flush()
+            self._lines += msg.count('\n') + 1
+            if self.max_lines > 0 and self._lines > self.max_lines and os.getpid() == self._owner_pid:
+                self._trim()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def _trim(self):
+        """古い行を削除して残りの行で置き換える（呼び出し側でハンドラーのロック済み）"""
+        self.close_stream()
+        # ほかのプロセスの追記分を含めて削除する位置を決める
+        drop = max(self.delete_lines, _count_lines(self.baseFilename) - self.max_lines)
+        path = Path(self.baseFilename)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        kept = 0
+        try:
+            with open(path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+                skipped = 0
+                for line in src:
+                    if skipped < drop:
+                        skipped += 1
+                        continue
+                    dst.write(line)
+                    kept += 1
+            os.replace(tmp_path, path)
+        except OSError:
+            # ほかのプロセスが開いていて置き換えられない場合（Windows）などは、
+            # delete_lines 行書き込んだあとにもう一度試す
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            kept = self.max_lines - self.delete_lines
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self._lines = kept
+        self.stream = self._open()
+
+    def close_stream(self):
+        if self.stream is not None:
+            self.stream.flush()
+            self.stream.close()
+            self.stream = None
 
-def trim_file(log_file: str, delete_lines: int):
+    def _reopen_if_replaced(self):
+        """ファイルが置き換えられていたら開き直す（子プロセスでの書き込み前に呼ぶ）"""
+        if self.stream is None:
+            return
+        try:
+            replaced = not os.path.samestat(os.fstat(self.stream.fileno()), os.stat(self.baseFilename))
+        except FileNotFoundError:
+            replaced = True
+        if replaced:
+            self.close_stream()
+
+def _hold_lock_across_fork(handler: logging.Handler):
+    """
+    fork の間はハンドラーのロックを取っておく。
+
+    ほかのスレッドがログを書き込んでいる途中で解析ワーカーを fork すると、
+    子プロセスはロックされたままのストリームのバッファーを引き継ぎ、最初のログ出力で止まる。
+    ロックを取ってから fork すれば、書き込みの途中の状態は引き継がれない。
+    """
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(
+            before=handler.acquire,
+            after_in_parent=handler.release,
+            after_in_child=handler.createLock,
+        )
+
+def _count_lines(path: str) -> int:
+    """ファイルの行数を、全体を読み込まずにチャンク単位で数える"""
     try:
-        with open(log_file, 'r+', encoding='utf-8') as file:
-            lines = file.readlines()
-            if len(lines) > delete_lines:
-                # 最初の2000行を削除
-                lines = lines[delete_lines:]
-                # ファイルを書き換え
-                file.seek(0)
-                file.truncate(0)
-                file.writelines(lines)
-                print(f"Removed the first {delete_lines} lines from the log file.")
-            else:
-                print("No lines to delete.")
+        with open(path, 'rb') as file:
+            return sum(chunk.count(b'\n') for chunk in iter(lambda: file.read(_CHUNK_SIZE), b''))
     except FileNotFoundError:
-        print("Log file does not exist.")
+        return 0
 
 def log_long_msg(msg: str):
     logger.info("")
@@ -87,10 +220,8 @@ def log_long_msg(msg: str):
     logger.info(f"{msg}")
     logger.info("##################################")
 
-log_file = str(Path(__file__).parent / 'log' / 'logfile.log')
-logger = setup_logger(log_file)
-
 if __name__ == "__main__":
+    setup_logger()
     logger.info("This is a log message!")
 
     # メインスレッドが終了しないようにするため、ここで待機
@@ -0,0 +1,293 @@
+"""
+Per-stage timings and counters for a run, exported as JSON and Prometheus textfile
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from . import profiling
+
+# 実行中の計測（プロセスごと）。start_run() で設定し、未設定なら計測しない
+_active = None
+_context = threading.local()
+
+# Prometheus のメトリクス名の接頭辞
+PROMETHEUS_PREFIX = "edinet"
+
+
+class _Span:
+    """stage() の中で、失敗の記録や転送バイト数の加算に使う"""
+
+    def __init__(self):
+        self.ok = True
+        self.bytes = 0
+
+    def fail(self):
+        self.ok = False
+
+    def add_bytes(self, size: int):
+        self.bytes += size
+
+
+class RunMetrics:
+    """
+    1回の実行のステージごとの処理時間・転送バイト数・失敗数とカウンター。
+
+    記録は (ステージ, 書類ID, 秒, 成否, バイト数) の組で保持し、集計は出力時に行う。
+    複数のスレッドから記録できる。解析ワーカー（別プロセス）の記録は
+    call_with_metrics() で親プロセスに返して merge() する。
+
+    Args:
+        target_date (Optional[str]): 処理対象の日付（出力用）。
+    """
+
+    def __init__(self, target_date: Optional[str] = None):
+        self.target_date = target_date
+        self.started_at = datetime.now()
+        self._started = time.perf_counter()
+        self.elapsed: Optional[float] = None
+        self._records: List[tuple] = []
+        self._counters: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def record(self, stage: str, seconds: float, doc_id: Optional[str] = None, ok: bool = True, size: int = 0):
+        with self._lock:
+            self._records.append((stage, doc_id, seconds, ok, size))
+
+    def add(self, name: str, value: float = 1, doc_id: Optional[str] = None):
+        with self._lock:
+            key = (name, doc_id)
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def export(self) -> Dict[str, list]:
+        """merge() に渡せる形（pickle できるリスト）で記録を返す"""
+        with self._lock:
+            return {"records": list(self._records), "counters": list(self._counters.items())}
+
+    def merge(self, exported: Dict[str, list]):
+        with self._lock:
+            self._records.extend(tuple(record) for record in exported["records"])
+            for (name, doc_id), value in exported["counters"]:
+                key = (name, doc_id)
+                self._counters[key] = self._counters.get(key, 0) + value
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self._started
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        ステージごとの集計（件数・失敗数・合計秒・p50/p95/最大ミリ秒・バイト数）、
+        カウンターの合計、書類IDごとの内訳を返す。
+        """
+        with self._lock:
+            records = list(self._records)
+            counters = dict(self._counters)
+
+        stages: Dict[str, Dict[str, Any]] = {}
+        durations: Dict[str, List[float]] = {}
+        documents: Dict[str, Dict[str, Any]] = {}
+        for stage, doc_id, seconds, ok, size in records:
+            durations.setdefault(stage, []).append(seconds)
+            stats = stages.setdefault(stage, {"count": 0, "failures": 0, "total_seconds": 0.0, "bytes": 0})
+            stats["count"] += 1
+            stats["failures"] += 0 if ok else 1
+            stats["total_seconds"] += seconds
+            stats["bytes"] += size
+            if doc_id is not None:
+                document = _document_entry(documents, doc_id)
+                document["seconds"][stage] = round(document["seconds"].get(stage, 0.0) + seconds, 6)
+                document["bytes"] += size
+                document["failures"] += 0 if ok else 1
+
+        for stage, stats in stages.items():
+            values = sorted(durations[stage])
+            stats["total_seconds"] = round(stats["total_seconds"], 6)
+            stats["p50_ms"] = round(percentile(values, 50) * 1000, 2)
+            stats["p95_ms"] = round(percentile(values, 95) * 1000, 2)
+            stats["max_ms"] = round(values[-1] * 1000, 2)
+
+        totals: Dict[str, float] = {}
+        for (name, doc_id), value in counters.items():
+            totals[name] = totals.get(name, 0) + value
+            if doc_id is not None:
+                _document_entry(documents, doc_id)["counters"][name] = value
+
+        return {
+            "target_date": self.target_date,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "elapsed_seconds": round(self.elapsed, 3) if self.elapsed is not None else None,
+            "stages": stages,
+            "counters": totals,
+            "documents": documents,
+        }
+
+    def write_json(self, path: Path) -> Path:
+        _write_atomic(Path(path), json.dumps(self.summary(), ensure_ascii=False, indent=2))
+        return Path(path)
+
+    def write_prometheus(self, path: Path) -> Path:
+        """
+        node_exporter の textfile collector 形式で書き出す（一時ファイル経由で置き換える）。
+        書類IDごとの内訳はラベルの数が増えすぎるため含めない。
+        """
+        summary = self.summary()
+        prefix = PROMETHEUS_PREFIX
+        lines = [
+            f"# HELP {prefix}_stage_duration_seconds Wall time of each pipeline stage.",
+            f"# TYPE {prefix}_stage_duration_seconds summary",
+        ]
+        for stage, stats in sorted(summary["stages"].items()):
+            label = f'stage="{_escape_label(stage)}"'
+            lines.append(f'{prefix}_stage_duration_seconds{{{label},quantile="0.5"}} {round(stats["p50_ms"] / 1000, 6)}')
+            lines.append(f'{prefix}_stage_duration_seconds{{{label},quantile="0.95"}} {round(stats["p95_ms"] / 1000, 6)}')
+            lines.append(f"{prefix}_stage_duration_seconds_sum{{{label}}} {stats['total_seconds']}")
+            lines.append(f"{prefix}_stage_duration_seconds_count{{{label}}} {stats['count']}")
+        for metric, key, help_text in (
+            ("stage_failures_total", "failures", "Failed executions of each pipeline stage."),
+            ("stage_bytes_total", "bytes", "Bytes transferred by each pipeline stage."),
+        ):
+            lines.append(f"# HELP {prefix}_{metric} {help_text}")
+            lines.append(f"# TYPE {prefix}_{metric} counter")
+            for stage, stats in sorted(summary["stages"].items()):
+                lines.append(f'{prefix}_{metric}{{stage="{_escape_label(stage)}"}} {stats[key]}')
+        for name, value in sorted(summary["counters"].items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        lines.append(f"# TYPE {prefix}_run_duration_seconds gauge")
+        lines.append(f"{prefix}_run_duration_seconds {summary['elapsed_seconds'] or 0}")
+        lines.append(f"# TYPE {prefix}_run_timestamp_seconds gauge")
+        lines.append(f"{prefix}_run_timestamp_seconds {self.started_at.timestamp():.0f}")
+        _write_atomic(Path(path), "\n".join(lines) + "\n")
+        return Path(path)
+
+
+def start_run(target_date: Optional[str] = None) -> RunMetrics:
+    """新しい計測を始め、このプロセスの計測先にする"""
+    global _active
+    _active = RunMetrics(target_date)
+    return _active
+
+
+def active() -> Optional[RunMetrics]:
+    """このプロセスで実行中の計測（fork で引き継いだ親プロセスの計測は使わない）"""
+    metrics = _active
+    if metrics is None or metrics._pid != os.getpid():
+        return None
+    return metrics
+
+
+@contextmanager
+def document(doc_id: Optional[str]):
+    """この中で記録するステージ・カウンターを書類IDに紐づける（スレッドごと）"""
+    previous = getattr(_context, "doc_id", None)
+    _context.doc_id = doc_id
+    try:
+        yield
+    finally:
+        _context.doc_id = previous
+
+
+@contextmanager
+def stage(name: str):
+    """
+    ブロックの処理時間をステージとして記録する。例外で抜けた場合は失敗として記録する。
+    プロファイラが有効なら、ブロックを cProfile・tracemalloc でも計測する（profiling.RunProfiler.span）。
+
+    Example:
+        with stage("download") as span:
+            archive = download(...)
+            span.add_bytes(size)
+    """
+    span = _Span()
+    metrics = active()
+    profiler = profiling.active()
+    doc_id = getattr(_context, "doc_id", None)
+    start = time.perf_counter()
+    try:
+        with profiler.span(name, doc_id) if profiler is not None else nullcontext():
+            yield span
+    except BaseException:
+        span.fail()
+        raise
+    finally:
+        if metrics is not None:
+            metrics.record(name, time.perf_counter() - start, doc_id, span.ok, span.bytes)
+
+
+def count(name: str, value: float = 1):
+    """カウンターを加算する（書類IDは document() の値）"""
+    metrics = active()
+    if metrics is not None:
+        metrics.add(name, value, getattr(_context, "doc_id", None))
+
+
+def call_with_metrics(function: Callable, *args, profile: Optional[Dict[str, Any]] = None):
+    """
+    解析ワーカーで function を実行し、（戻り値, その間の記録）を返す。
+
+    profile（RunProfiler.settings()）を渡すと、同じ設定でプロファイルした結果も記録の
+    "profile" に含める。親プロセスでは run_pipeline がこの記録を実行中の計測・プロファイラに merge する。
+    """
+    global _active
+    metrics = start_run()
+    profiler = profiling.start_profiling(**profile) if profile else None
+    try:
+        result = function(*args)
+    finally:
+        _active = None
+        profiling.stop_profiling()
+    exported = metrics.export()
+    if profiler is not None:
+        exported["profile"] = profiler.export()
+    return result, exported
+
+
+def save_run_metrics(metrics: RunMetrics, folder: Path, prometheus_file: Optional[Path] = None) -> Path:
+    """
+    計測結果を `{folder}/run_metrics_{対象日}_{時刻}.json` に保存し、
+    prometheus_file が指定されていれば textfile collector 形式でも書き出す。
+    """
+    metrics.finish()
+    timestamp = metrics.started_at.strftime("%Y%m%d_%H%M%S")
+    path = metrics.write_json(Path(folder) / f"run_metrics_{metrics.target_date}_{timestamp}.json")
+    if prometheus_file:
+        metrics.write_prometheus(prometheus_file)
+    return path
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """ソート済みの値の q パーセンタイル（線形補間）"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def _document_entry(documents: Dict[str, Dict[str, Any]], doc_id: str) -> Dict[str, Any]:
+    return documents.setdefault(doc_id, {"seconds": {}, "bytes": 0, "failures": 0, "counters": {}})
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_atomic(path: Path, text: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
@@ -0,0 +1,56 @@
+"""
+Reporting-period labels shared by the CSV, tagged-fact and text-block extractors
+"""
+import re
+from datetime import date, timedelta
+from typing import List, Optional
+
+# EDINETのコンテキストIDの期間の部分（CurrentYearInstant / Prior1YearDuration など）
+CURRENT_PERIOD = "CurrentYear"
+_PERIOD_PATTERN = re.compile(r"^(CurrentYear|Prior\d+Year)")
+
+
+def extraction_periods(prior_periods: int) -> List[str]:
+    """当期と、prior_periods 期前までの期間（例: ["CurrentYear", "Prior1Year"]）"""
+    return [CURRENT_PERIOD] + [f"Prior{offset}Year" for offset in range(1, max(0, prior_periods) + 1)]
+
+
+def period_of(context_id: str) -> Optional[str]:
+    """コンテキストIDの期間（CurrentYear / Prior1Year ...）。該当しなければ None"""
+    match = _PERIOD_PATTERN.match(context_id)
+    return match.group(1) if match else None
+
+
+def period_offset(period: str) -> int:
+    """当期からの期数（CurrentYear なら 0、Prior2Year なら 2）"""
+    if period == CURRENT_PERIOD:
+        return 0
+    return int(period[len("Prior"):-len("Year")])
+
+
+def period_contexts(context_priority: List[str], period: str) -> List[str]:
+    """当期のコンテキストIDの優先順を、指定した期間のコンテキストIDに置き換える"""
+    return [context_id.replace(CURRENT_PERIOD, period, 1) for context_id in context_priority]
+
+
+def period_end(current_end: Optional[str], period: str) -> Optional[str]:
+    """
+    当期末（YYYY-MM-DD）から、指定した期間の期末日を求める（1期=1年として月末をそろえる）。
+
+    決算期を変更した会社など、前期が1年でない場合は実際の期末日と異なる。
+    """
+    if not current_end:
+        return None
+    try:
+        end = date.fromisoformat(str(current_end)[:10])
+    except ValueError:
+        return None
+    offset = period_offset(period)
+    if offset == 0:
+        return end.isoformat()
+    # 月末の決算日は月末のまま（2024-02-29 の1期前は 2023-02-28）
+    year = end.year - offset
+    if (end + timedelta(days=1)).day == 1:
+        next_month = date(year + (end.month == 12), end.month % 12 + 1, 1)
+        return (next_month - timedelta(days=1)).isoformat()
+    return date(year, end.month, end.day).isoformat()
@@ -0,0 +1,161 @@
+"""
+Concurrent download -> parse pipeline for EDINET filings
+"""
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Deque, Iterable, List, NamedTuple, Optional, Tuple
+
+from .logger import log_owner_pid, logger, setup_logger
+from .metrics import active, call_with_metrics
+from .profiling import active as active_profiler
+
+# items の終わりを表す値（None は要素として渡せるため使わない）
+_END = object()
+
+
+class Fallback(NamedTuple):
+    """analyze の戻り値。fetch したデータでは解析できず、fallback で取得し直したデータで解析し直すことを表す"""
+    reason: str
+
+
+def run_pipeline(
+    items: Iterable[Any],
+    fetch: Callable[[Any], Any],
+    analyze: Callable[[Any, Any], Any],
+    max_fetch_workers: int = 4,
+    max_parse_workers: int = 0,
+    on_result: Optional[Callable[[Any, Optional[Any]], None]] = None,
+    fallback: Optional[Callable[[Any], Any]] = None,
+) -> List[Optional[Any]]:
+    """
+    ネットワーク処理（fetch）と解析処理（analyze）を段階的に並列実行する。
+
+    fetch はスレッドプールで、analyze はプロセスプールで実行する。
+    max_parse_workers が0の場合、analyze は fetch と同じスレッドで実行する。
+    処理中のデータ数は max_fetch_workers + max_parse_workers に制限されるため、
+    ダウンロードが解析より速くてもメモリ使用量は増え続けない。
+
+    items はジェネレーターでもよい。先読みするのは処理中のデータ数の2倍までで、
+    結果を回収するたびに次の要素を取り出すため、一覧の取得が終わる前に処理を始められる。
+
+    Args:
+        items (Iterable[Any]): 処理対象（書類の辞書など）。
+        fetch (Callable): item を受け取り、解析に渡すデータを返す。None なら解析しない。
+        analyze (Callable): (item, fetch の戻り値) を受け取り結果を返す。
+            プロセスプールで実行するため、モジュールのトップレベル関数であること。
+        max_fetch_workers (int): ネットワーク処理の同時実行数。
+        max_parse_workers (int): 解析プロセス数。
+        on_result (Callable, optional): (item, 結果) を受け取るコールバック。結果を回収するたびに
+            元の順序で呼ばれる（失敗した要素の結果は None）。途中経過の保存などに使う。
+        fallback (Callable, optional): analyze が Fallback を返した要素について item を受け取り、
+            代わりに解析するデータを返す（CSVが使えなかった書類のXBRLなど）。取得し直すのは1回だけで、
+            None を返した場合や fallback がない場合、その要素は失敗とする。
+
+    Returns:
+        List[Optional[Any]]: items と同じ順序の結果リスト。失敗した要素は None。
+    """
+    results: List[Optional[Any]] = []
+    max_fetch_workers = max(1, max_fetch_workers)
+    # spawn で起動したワーカーでも親プロセスと同じようにログを出力する（fork なら設定済み）
+    # ログファイルのトリミングはこのプロセスが行い、ワーカーは追記だけを行う
+    parse_pool = (
+        ProcessPoolExecutor(max_workers=max_parse_workers, initializer=partial(setup_logger, owner_pid=log_owner_pid()))
+        if max_parse_workers > 0 else None
+    )
+    in_flight = threading.BoundedSemaphore(max_fetch_workers + max(0, max_parse_workers))
+    # 解析ワーカーでの計測は結果と一緒に返してもらい、このプロセスの計測にまとめる
+    metrics = active() if parse_pool is not None else None
+    profiler = active_profiler() if metrics is not None else None
+    profile = profiler.settings() if profiler is not None else None
+
+    def fetch_stage(item, fetch=fetch):
+        in_flight.acquire()  # 解析が終わった時点で解放する
+        future = None
+        try:
+            payload = fetch(item)
+            if payload is None:
+                return None
+            if parse_pool is None:
+                return analyze(item, payload)
+            if metrics is not None:
+                future = parse_pool.submit(call_with_metrics, analyze, item, payload, profile=profile)
+            else:
+                future = parse_pool.submit(analyze, item, payload)
+            future.add_done_callback(lambda _: in_flight.release())
+            return future
+        finally:
+            if future is None:
+                in_flight.release()
+
+    fetch_pool = ThreadPoolExecutor(max_workers=max_fetch_workers)
+    # 投入済みで結果を回収していない (item, future)。先読みは処理中のデータ数の2倍まで
+    window = 2 * (max_fetch_workers + max(0, max_parse_workers))
+    submitted: Deque[Tuple[Any, Future]] = deque()
+    remaining = iter(items)
+
+    def collect(future: Future) -> Any:
+        result = future.result()
+        if isinstance(result, Future):
+            result = result.result()
+            if metrics is not None:
+                result, recorded = result
+                metrics.merge(recorded)
+                if profiler is not None and "profile" in recorded:
+                    profiler.merge(recorded["profile"])
+        return result
+
+    def submit_next() -> bool:
+        item = next(remaining, _END)
+        if item is _END:
+            return False
+        submitted.append((item, fetch_pool.submit(fetch_stage, item)))
+        return True
+
+    try:
+        while len(submitted) < window and submit_next():
+            pass
+
+        # 元の順序で結果を回収する
+        index = 0
+        while submitted:
+            item, future = submitted[0]
+            try:
+                result = collect(future)
+                if isinstance(result, Fallback):
+                    # 先頭の要素なので、取得し直したデータの解析が終わるまで待つ（順序は変わらない）
+                    result = None
+                    if fallback is not None:
+                        result = collect(fetch_pool.submit(fetch_stage, item, fallback))
+                        if isinstance(result, Fallback):
+                            result = None
+            except Exception as e:
+                result = None
+                logger.exception(f"パイプライン処理中にエラーが発生しました: {index + 1}件目")
+            submitted.popleft()
+            results.append(result)
+            if on_result is not None:
+                try:
+                    on_result(item, result)
+                except Exception as e:
+                    logger.exception(f"処理結果のコールバック中にエラーが発生しました: {index + 1}件目")
+            index += 1
+            submit_next()
+    except BaseException:
+        # Ctrl-C などで中断した場合は、まだ始まっていないダウンロード・解析を取り消して、待たずに抜ける
+        # （on_result に渡していない書類は台帳に記録されないため、再実行時に処理し直す）
+        for _, future in submitted:
+            future.cancel()
+            if future.done() and not future.cancelled() and future.exception() is None:
+                if isinstance(future.result(), Future):
+                    future.result().cancel()
+        fetch_pool.shutdown(wait=False, cancel_futures=True)
+        if parse_pool is not None:
+            parse_pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    fetch_pool.shutdown()
+    if parse_pool is not None:
+        parse_pool.shutdown()
+
+    return results
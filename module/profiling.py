@@ -0,0 +1,296 @@
+"""
+Optional per-stage cProfile / tracemalloc profiling of a run, sampled by company
+"""
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# 実行中のプロファイラ（プロセスごと）。start_profiling() で設定し、未設定ならプロファイルしない
+_active = None
+_context = threading.local()
+
+
+class _RawStats:
+    """pstats.Stats に渡すための、別プロセスから受け取った統計の入れ物"""
+
+    def __init__(self, stats: Dict):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class RunProfiler:
+    """
+    ステージ（metrics.stage）ごとに cProfile と tracemalloc で計測する。
+
+    スレッドの一番外側のステージだけを計測する（download などの内側のステージは
+    fetch の統計に含まれる）。書類IDのあるステージは、書類IDのハッシュで
+    sample_every 社に1社だけ計測するため、ダウンロードと解析は同じ会社が選ばれる。
+    一覧の取得や指標の計算など、書類IDのないステージは毎回計測する。
+
+    メモリは、計測するステージの間だけ tracemalloc を有効にし、ステージの前後の
+    スナップショットの差（ステージ内で確保されて残っている量）と、ピークの増加量を記録する。
+    ステージが並行して動いている場合は、ほかのスレッドの確保も含まれる。
+    tracemalloc は cProfile より負荷が大きいため、trace_memory=False で無効にできる。
+
+    解析ワーカー（別プロセス）の計測は、metrics.call_with_metrics() で親プロセスに返して merge() する。
+
+    Args:
+        sample_every (int): 何社に1社を計測するか（1 なら全社）。
+        top_n (int): レポートに載せる関数・メモリ確保箇所の数。
+        trace_memory (bool): tracemalloc でメモリ確保も計測するか。
+        target_date (Optional[str]): 処理対象の日付（出力用）。
+    """
+
+    def __init__(self, sample_every: int = 1, top_n: int = 20, trace_memory: bool = True,
+                 target_date: Optional[str] = None):
+        self.sample_every = max(1, int(sample_every))
+        self.top_n = top_n
+        self.trace_memory = trace_memory
+        self.target_date = target_date
+        self.started_at = datetime.now()
+        self._stats: Dict[str, Any] = {}
+        self._spans: Dict[str, int] = {}
+        self._seconds: Dict[str, float] = {}
+        self._allocations: Dict[str, Dict[tuple, List[int]]] = {}
+        self._peaks: Dict[str, int] = {}
+        self._skipped = 0
+        self._lock = threading.Lock()
+        self._tracing = 0
+        self._started_tracing = False
+        self._pid = os.getpid()
+
+    def settings(self) -> Dict[str, Any]:
+        """解析ワーカーで同じ設定のプロファイラを作るための引数"""
+        return {"sample_every": self.sample_every, "top_n": self.top_n, "trace_memory": self.trace_memory}
+
+    def sampled(self, doc_id: Optional[str]) -> bool:
+        return doc_id is None or zlib.crc32(doc_id.encode("utf-8")) % self.sample_every == 0
+
+    @contextmanager
+    def span(self, name: str, doc_id: Optional[str] = None):
+        """ステージを計測する（一番外側のステージで、対象の会社の場合だけ）"""
+        depth = getattr(_context, "depth", 0)
+        _context.depth = depth + 1
+        started = None
+        try:
+            if depth == 0 and self.sampled(doc_id):
+                started = self._start()
+            yield
+        finally:
+            _context.depth = depth
+            if started is not None:
+                self._stop(name, *started)
+
+    def _start(self):
+        import cProfile
+        import tracemalloc
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12 以降は、ほかのスレッドで計測中だと有効にできない
+            with self._lock:
+                self._skipped += 1
+            return None
+        if not self.trace_memory:
+            return profile, None, 0, time.perf_counter()
+        with self._lock:
+            if self._tracing == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            self._tracing += 1
+        before = tracemalloc.take_snapshot()
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        return profile, before, current, time.perf_counter()
+
+    def _stop(self, name: str, profile, before, current: int, started: float):
+        import cProfile
+        import pstats
+        import tracemalloc
+
+        profile.disable()
+        seconds = time.perf_counter() - started
+        profile.create_stats()
+        if before is None:
+            self._add(name, 1, seconds, profile.stats, [], 0)
+            return
+        peak = tracemalloc.get_traced_memory()[1] - current
+        after = tracemalloc.take_snapshot()
+        with self._lock:
+            self._tracing -= 1
+            if self._tracing == 0 and self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+        # プロファイラ自身（ほかのスレッドの集計を含む）の確保は除く
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, cProfile.__file__),
+            tracemalloc.Filter(False, pstats.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ]
+        allocations = [
+            (stat.traceback[0].filename, stat.traceback[0].lineno, stat.size_diff, stat.count_diff)
+            for stat in after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+            if stat.size_diff > 0
+        ]
+        self._add(name, 1, seconds, profile.stats, allocations, peak)
+
+    def _add(self, name: str, spans: int, seconds: float, stats: Dict, allocations: List[tuple], peak: int):
+        import pstats
+
+        with self._lock:
+            self._spans[name] = self._spans.get(name, 0) + spans
+            self._seconds[name] = self._seconds.get(name, 0.0) + seconds
+            if name in self._stats:
+                self._stats[name].add(_RawStats(stats))
+            else:
+                self._stats[name] = pstats.Stats(_RawStats(stats))
+            lines = self._allocations.setdefault(name, {})
+            for filename, lineno, size, blocks in allocations:
+                entry = lines.setdefault((filename, lineno), [0, 0])
+                entry[0] += size
+                entry[1] += blocks
+            self._peaks[name] = max(self._peaks.get(name, 0), peak)
+
+    def export(self) -> Dict[str, Any]:
+        """merge() に渡せる形（pickle できる辞書）で計測結果を返す"""
+        with self._lock:
+            return {
+                name: {
+                    "spans": self._spans[name],
+                    "seconds": self._seconds[name],
+                    "stats": self._stats[name].stats,
+                    "allocations": [(*line, size, blocks) for line, (size, blocks) in self._allocations[name].items()],
+                    "peak": self._peaks[name],
+                }
+                for name in self._spans
+            }
+
+    def merge(self, exported: Dict[str, Any]):
+        for name, stage in exported.items():
+            self._add(name, stage["spans"], stage["seconds"], stage["stats"], stage["allocations"], stage["peak"])
+
+    def write(self, folder: Path) -> Path:
+        """
+        `{folder}/profile_{対象日}_{時刻}/` に、ステージごとの `{ステージ}.pstats` と
+        レポート（`profile_report.md`: ステージごとの上位の関数・メモリ確保箇所）を保存する。
+
+        Returns:
+            Path: レポートのパス。
+        """
+        import io
+
+        timestamp = self.started_at.strftime("%Y%m%d_%H%M%S")
+        run_folder = Path(folder) / f"profile_{self.target_date}_{timestamp}"
+        run_folder.mkdir(parents=True, exist_ok=True)
+
+        with self._lock:
+            stages = sorted(self._spans, key=lambda name: self._seconds[name], reverse=True)
+            lines = [
+                f"# プロファイル: {self.target_date} ({self.started_at.isoformat(timespec='seconds')})",
+                "",
+                f"- 計測した会社: {self.sample_every}社に1社",
+                "- 計測したのはスレッドの一番外側のステージ（内側のステージは外側の統計に含まれる）",
+            ]
+            if not self.trace_memory:
+                lines.append("- メモリ確保は計測していない（PROFILE_MEMORY=false）")
+            if self._skipped:
+                lines.append(f"- ほかのプロファイラが有効だったため計測できなかったステージ: {self._skipped}回")
+            lines += [
+                "",
+                "| ステージ | 計測回数 | 合計秒 | ピーク増加 (KB) | 残った確保 (KB) |",
+                "|---|---:|---:|---:|---:|",
+            ]
+            for name in stages:
+                retained = sum(size for size, _ in self._allocations[name].values())
+                lines.append(
+                    f"| {name} | {self._spans[name]} | {self._seconds[name]:.3f} | "
+                    f"{self._peaks[name] / 1024:.1f} | {retained / 1024:.1f} |"
+                )
+
+            run_allocations: Dict[tuple, List[int]] = {}
+            for name in stages:
+                for line, (size, blocks) in self._allocations[name].items():
+                    entry = run_allocations.setdefault(line, [0, 0])
+                    entry[0] += size
+                    entry[1] += blocks
+            lines += ["", f"## メモリ確保の上位{self.top_n}箇所（全ステージ）", ""]
+            lines += _allocation_table(run_allocations, self.top_n)
+
+            for name in stages:
+                stats = self._stats[name]
+                stats.dump_stats(run_folder / f"{name}.pstats")
+                stream = io.StringIO()
+                stats.stream = stream
+                stats.sort_stats("cumulative").print_stats(self.top_n)
+                lines += [
+                    "",
+                    f"## {name}",
+                    "",
+                    f"`{name}.pstats`（`python -m pstats {name}.pstats` で詳しく見られる）",
+                    "",
+                    "```",
+                    stream.getvalue().strip("\n"),
+                    "```",
+                    "",
+                    f"メモリ確保の上位{self.top_n}箇所:",
+                    "",
+                ]
+                lines += _allocation_table(self._allocations[name], self.top_n)
+
+        path = run_folder / "profile_report.md"
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        return path
+
+
+def start_profiling(sample_every: int = 1, top_n: int = 20, trace_memory: bool = True,
+                    target_date: Optional[str] = None) -> RunProfiler:
+    """新しいプロファイラを作り、このプロセスのプロファイル先にする"""
+    global _active
+    _active = RunProfiler(sample_every, top_n, trace_memory, target_date)
+    return _active
+
+
+def stop_profiling():
+    global _active
+    _active = None
+
+
+def active() -> Optional[RunProfiler]:
+    """このプロセスで実行中のプロファイラ（fork で引き継いだ親プロセスのものは使わない）"""
+    profiler = _active
+    if profiler is None or profiler._pid != os.getpid():
+        return None
+    return profiler
+
+
+def _allocation_table(allocations: Dict[tuple, List[int]], top_n: int) -> List[str]:
+    top = sorted(allocations.items(), key=lambda item: item[1][0], reverse=True)[:top_n]
+    if not top:
+        return ["（記録なし）"]
+    lines = ["| 箇所 | サイズ (KB) | ブロック数 |", "|---|---:|---:|"]
+    for (filename, lineno), (size, blocks) in top:
+        lines.append(f"| `{_short_path(filename)}:{lineno}` | {size / 1024:.1f} | {blocks} |")
+    return lines
+
+
+def _short_path(filename: str) -> str:
+    """リポジトリ・site-packages・標準ライブラリからの相対パスにする"""
+    marker = "site-packages" + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    for base in (str(Path(__file__).resolve().parent.parent), os.path.dirname(os.__file__)):
+        if filename.startswith(base + os.sep):
+            return filename[len(base) + 1:]
+    return filename
+
@@ -0,0 +1,104 @@
+"""
+Declarative financial-ratio engine evaluated over the whole batch of filings
+"""
+from typing import Dict, List, Optional
+
+from .config import config
+from .records import FilingRecord
+
+# 値が計算できなかった場合も空欄（""）で出力する列（これまでの出力と同じ）。
+# 配当性向・EPS は1株当たりの値、株価収益率・配当利回りは株価が必要なため、現在は計算しない
+PLACEHOLDER_COLUMNS = ["配当性向", "EPS", "株価収益率", "営業利益率", "配当利回り", "自己資本比率",
+                       "売上高成長率", "営業利益成長率", "当期純利益成長率"]
+
+
+def apply_ratios(records: List[FilingRecord], formulas: Optional[List[Dict]] = None) -> Dict[str, int]:
+    """
+    config['financial_ratios'] の計算式で、すべての書類の財務指標をまとめて計算し、各 FilingRecord に設定する。
+
+    計算式ごとに、全書類の分子・分母の列を pandas の列演算で一度に計算する。
+    値がない・数値でない・分母が 0 の書類は欠損として扱い、例外は使わない。
+    同じ指標の計算式が複数ある場合は、後の計算式で計算できた値を優先する。
+
+    計算式の項目:
+        name (str): 結果を設定する列。
+        numerator (str): 分子の列。
+        denominator (str): 分母の列。
+        growth (str): numerator / denominator の代わりに指定すると、この列の前期比
+            （(当期 - 前期) / |前期|）を計算する。前期の値は同じ書類から抽出した periods を使う。
+        period (str): growth の比較対象の期間。省略時は "Prior1Year"。
+        scale (float): 結果に掛ける値（百分率なら 100）。省略時は 1。
+        round (int): 小数点以下の桁数。省略時は丸めない。
+        filer_types (List[str]): 適用する提出者の種類（fund / regular_company）。省略時はすべて。
+
+    Args:
+        records (List[FilingRecord]): 抽出済みの書類（その場で更新する）。
+        formulas (Optional[List[Dict]]): 計算式のリスト。省略時は config の設定。
+
+    Returns:
+        Dict[str, int]: 指標ごとの計算できた書類の数。
+    """
+    from .logger import logger
+
+    formulas = config['financial_ratios'] if formulas is None else formulas
+    if not records:
+        return {}
+    import numpy as np
+    import pandas as pd
+
+    inputs = sorted({
+        column for formula in formulas
+        for column in ((formula['growth'],) if 'growth' in formula else (formula['numerator'], formula['denominator']))
+    })
+    values = pd.DataFrame([record.values(inputs) for record in records], columns=inputs)
+    numbers = values.apply(pd.to_numeric, errors="coerce").astype("float64")
+    # 前期比の比較対象（期間, 列）-> 全書類の値
+    prior_inputs = sorted({(formula.get('period', 'Prior1Year'), formula['growth']) for formula in formulas if 'growth' in formula})
+    priors = {
+        (period, column): pd.to_numeric(
+            pd.Series([record.periods.get(period, {}).get(column) for record in records], dtype=object), errors="coerce"
+        ).astype("float64")
+        for period, column in prior_inputs
+    }
+    is_fund = pd.Series([record.get("fundコード") is not None for record in records])
+    filer_masks = {"fund": is_fund, "regular_company": ~is_fund}
+
+    results: Dict[str, pd.Series] = {}
+    for formula in formulas:
+        if 'growth' in formula:
+            numerator = numbers[formula['growth']]
+            denominator = priors[(formula.get('period', 'Prior1Year'), formula['growth'])]
+            numerator = numerator - denominator
+            denominator = denominator.abs()
+        else:
+            numerator = numbers[formula['numerator']]
+            denominator = numbers[formula['denominator']]
+        ratio = numerator / denominator.where(denominator != 0) * formula.get('scale', 1)
+        if formula.get('round') is not None:
+            ratio = ratio.round(formula['round'])
+        ratio = ratio.where(np.isfinite(ratio))
+        filer_types = formula.get('filer_types')
+        if filer_types:
+            applies = pd.Series(False, index=ratio.index)
+            for filer_type in filer_types:
+                applies |= filer_masks[filer_type]
+            ratio = ratio.where(applies)
+        previous = results.get(formula['name'])
+        results[formula['name']] = ratio if previous is None else ratio.combine_first(previous)
+
+    computed = {}
+    for name, ratio in results.items():
+        computed[name] = int(ratio.notna().sum())
+        for record, value in zip(records, ratio.tolist()):
+            if value == value:  # NaN でなければ設定する
+                record.set(name, value)
+    for record in records:
+        for column in PLACEHOLDER_COLUMNS:
+            if column not in record:
+                record.set(column, "")
+
+    logger.info(
+        "✅ 財務指標を計算しました: "
+        + ", ".join(f"{name} {count}/{len(records)}社" for name, count in computed.items())
+    )
+    return computed
@@ -0,0 +1,122 @@
+"""
+Compact per-filing output record
+"""
+from typing import Any, Dict, Iterable, List
+
+# 出力する列（スプレッドシート・ローカル出力の列順）と、FilingRecord の属性名
+COLUMN_ATTRIBUTES = {
+    "EDINETコード": "edinet_code",
+    "fundコード": "fund_code",
+    "会計期間開始": "period_start",
+    "会計期間終了": "period_end",
+    "書類提出日": "submitted_at",
+    "企業名": "company_name",
+    "書類ID": "doc_id",
+    "配当性向": "payout_ratio",
+    "EPS": "eps",
+    "株価収益率": "per",
+    "営業活動によるキャッシュ・フロー": "operating_cash_flow",
+    "売上高": "net_sales",
+    "営業利益": "operating_income",
+    "当期純利益": "net_income",
+    "営業利益率": "operating_margin",
+    "配当利回り": "dividend_yield",
+    "純資産合計": "net_assets",
+    "負債純資産合計": "total_liabilities_and_net_assets",
+    "自己資本比率": "equity_ratio",
+    "営業収益合計": "operating_revenue",
+    "当期純利益又は当期純損失": "net_income_or_loss",
+    "営業利益又は営業損失": "operating_income_or_loss",
+    "売上高成長率": "net_sales_growth",
+    "営業利益成長率": "operating_income_growth",
+    "当期純利益成長率": "net_income_growth",
+}
+OUTPUT_COLUMNS = list(COLUMN_ATTRIBUTES)
+
+# 行を突き合わせるキーの列
+KEY_COLUMN = "書類ID"
+
+# 前期以前の値を保存するときのキー（出力の列には含めない）
+PERIODS_KEY = "periods"
+
+
+class FilingRecord:
+    """
+    1書類分の出力行。
+
+    出力する列だけを `__slots__` の属性として持つ（書類一覧の生のレスポンスや
+    途中の計算結果は持たない）。値がない列は属性を設定せず、
+    to_row() には含めない（スプレッドシートでは "NA" になる）。
+
+    書類IDなどの列名（日本語）で get() / `in` / `[]` を使って読める。
+
+    periods には、同じ書類から抽出した前期以前の値（期間 -> 検索ワードと値）を持つ。
+    成長率の計算と時系列の保存に使い、出力の列には含めない。
+    """
+    __slots__ = tuple(COLUMN_ATTRIBUTES.values()) + ("periods",)
+
+    def __init__(self):
+        self.periods: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def from_row(cls, *rows: Dict[str, Any]) -> "FilingRecord":
+        """
+        行の辞書から出力する列だけを取り出して作る（後に渡した辞書の値を優先する）。
+
+        Example:
+            FilingRecord.from_row(doc, ratios, financial_data)
+        """
+        record = cls()
+        for row in rows:
+            for column, attribute in COLUMN_ATTRIBUTES.items():
+                if column in row:
+                    setattr(record, attribute, row[column])
+            if row.get(PERIODS_KEY):
+                record.periods = dict(row[PERIODS_KEY])
+        return record
+
+    def get(self, column: str, default: Any = None) -> Any:
+        attribute = COLUMN_ATTRIBUTES.get(column)
+        if attribute is None:
+            return default
+        return getattr(self, attribute, default)
+
+    def set(self, column: str, value: Any):
+        setattr(self, COLUMN_ATTRIBUTES[column], value)
+
+    def __contains__(self, column: str) -> bool:
+        attribute = COLUMN_ATTRIBUTES.get(column)
+        return attribute is not None and hasattr(self, attribute)
+
+    def __getitem__(self, column: str) -> Any:
+        if column not in self:
+            raise KeyError(column)
+        return self.get(column)
+
+    def values(self, columns: Iterable[str] = OUTPUT_COLUMNS, default: Any = None) -> List[Any]:
+        """columns の順の値のリスト（値がない列は default）"""
+        return [self.get(column, default) for column in columns]
+
+    def missing(self, columns: Iterable[str] = OUTPUT_COLUMNS) -> List[str]:
+        """columns のうち値がない列"""
+        return [column for column in columns if column not in self]
+
+    def to_row(self) -> Dict[str, Any]:
+        """値がある列だけの辞書（列名 -> 値）にする"""
+        return {column: self.get(column) for column in OUTPUT_COLUMNS if column in self}
+
+    def dump(self) -> Dict[str, Any]:
+        """to_row() に前期以前の値を加えた辞書（台帳への保存用。from_row で復元できる）"""
+        row = self.to_row()
+        if self.periods:
+            row[PERIODS_KEY] = self.periods
+        return row
+
+    def __repr__(self) -> str:
+        return f"FilingRecord({self.get(KEY_COLUMN)!r}, {self.get('企業名')!r})"
+
+
+def as_records(rows: Iterable[Any]) -> List[FilingRecord]:
+    """行の辞書・FilingRecord が混ざったリストを FilingRecord のリストにそろえる"""
+    return [row if isinstance(row, FilingRecord) else FilingRecord.from_row(row) for row in rows]
+
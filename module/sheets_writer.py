@@ -0,0 +1,218 @@
+"""
+Batched, diff-based writer for the Google Sheets output
+"""
+import math
+import numbers
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+from .logger import logger
+from .records import KEY_COLUMN, OUTPUT_COLUMNS, FilingRecord, as_records
+
+# スプレッドシートに書き込む列（FilingRecord の出力列）
+SHEET_COLUMNS = OUTPUT_COLUMNS
+
+# これまでの書き込みと同じ書式（すべての列を文字列として表示）
+TEXT_FORMAT = {"numberFormat": {"type": "NUMBER", "pattern": "@"}}
+
+
+def rows_for_sheet(data: List[FilingRecord], headers: List[str]) -> List[List[Any]]:
+    """FilingRecord（または行の辞書）を headers の順の値のリストにする（値がない列は "NA"）"""
+    rows = []
+    for record in as_records(data):
+        missing = record.missing(headers)
+        if missing:
+            logger.warning(f"{record.get('企業名', 'Unknown')}: {', '.join(missing)}に有効なデータがありません")
+        rows.append(record.values(headers, default="NA"))
+    return rows
+
+
+def write_rows(spreadsheet, sheet_name: str, data: List[FilingRecord], headers: List[str] = SHEET_COLUMNS,
+               diff: bool = True, chunk_rows: int = 2000) -> Dict[str, int]:
+    """
+    シートにヘッダー・データ・書式をまとめて書き込む。
+
+    シートの作成・サイズ変更・書式設定・値の書き込みは1回の batch_update に
+    まとめて送る（行数が chunk_rows を超える場合だけ複数回に分割する）。
+    diff が True で既存シートのヘッダーが同じなら、書類IDで既存の行と突き合わせ、
+    新しい行は末尾に追加し、値が変わった行だけを上書きする。変更がなければ何も書き込まない。
+    diff が False、またはヘッダーが異なる場合はシート全体を書き直す。
+
+    Args:
+        spreadsheet (gspread.Spreadsheet): 書き込み先のスプレッドシート。
+        sheet_name (str): シート名（なければ作成する）。
+        data (List[FilingRecord]): 1行1社の結果のリスト。
+        headers (List[str]): 書き込む列。
+        diff (bool): 既存の行との差分だけを書き込むか。
+        chunk_rows (int): 1回の batch_update で書き込む最大行数。
+
+    Returns:
+        Dict[str, int]: 追加・更新・変更なしの行数と、送信した batch_update の回数。
+    """
+    rows = rows_for_sheet(data, headers)
+    num_cols = max(len(headers) + 1, 10)
+
+    # シートの有無・ID・サイズはメタデータ1回の取得で調べる
+    metadata = spreadsheet.fetch_sheet_metadata()
+    sheets = {sheet["properties"]["title"]: sheet["properties"] for sheet in metadata.get("sheets", [])}
+    properties = sheets.get(sheet_name)
+
+    setup_requests = []
+    if properties is None:
+        used_ids = {props["sheetId"] for props in sheets.values()}
+        sheet_id = _new_sheet_id(used_ids)
+        row_count = max(len(rows) + 2, 100)
+        setup_requests.append({"addSheet": {"properties": {
+            "sheetId": sheet_id, "title": sheet_name,
+            "gridProperties": {"rowCount": row_count, "columnCount": num_cols},
+        }}})
+        logger.info(f"✅ シート '{sheet_name}' を新規作成します（{row_count}行 × {num_cols}列）")
+        existing = None
+    else:
+        sheet_id = properties["sheetId"]
+        row_count = properties["gridProperties"]["rowCount"]
+        logger.info(f"✅ 既存シート '{sheet_name}' を使用します")
+        existing = _read_existing(spreadsheet, sheet_name, num_cols) if diff else None
+
+    key_index = headers.index(KEY_COLUMN)
+    stats = {"appended": 0, "updated": 0, "unchanged": 0, "requests": 0}
+
+    if existing and [str(value) for value in existing[0][:len(headers)]] == headers:
+        # 書類IDで既存の行と突き合わせ、追加・変更された行だけを書き込む
+        row_of_key = {
+            str(row[key_index]): index
+            for index, row in enumerate(existing[1:], start=1)
+            if len(row) > key_index and row[key_index] != ""
+        }
+        writes: List[Tuple[int, List[List[Any]]]] = []
+        appended = []
+        for row in rows:
+            index = row_of_key.get(str(row[key_index]))
+            if index is None:
+                appended.append(row)
+            elif _normalized(existing[index], len(headers)) != _normalized(row, len(headers)):
+                writes.append((index, [row]))
+                stats["updated"] += 1
+            else:
+                stats["unchanged"] += 1
+        if appended:
+            writes.append((len(existing), appended))
+            stats["appended"] = len(appended)
+
+        if not writes:
+            logger.info(f"✅ シート '{sheet_name}' に変更はありません（{stats['unchanged']}行）")
+            return stats
+        clear = False
+        needed_rows = len(existing) + len(appended)
+    else:
+        # シート全体を書き直す（ヘッダー + 全行）
+        writes = [(0, [headers] + rows)]
+        stats["appended"] = len(rows)
+        clear = properties is not None
+        needed_rows = max(len(rows) + 2, 100)
+
+    if properties is not None:
+        grid = {"rowCount": max(row_count, needed_rows), "columnCount": max(properties["gridProperties"]["columnCount"], num_cols)}
+        if grid != {"rowCount": row_count, "columnCount": properties["gridProperties"]["columnCount"]}:
+            setup_requests.append({"updateSheetProperties": {
+                "properties": {"sheetId": sheet_id, "gridProperties": grid},
+                "fields": "gridProperties.rowCount,gridProperties.columnCount",
+            }})
+    if clear:
+        # fields を指定して rows を渡さない updateCells は、範囲内の値を消去する
+        setup_requests.append({"updateCells": {"range": {"sheetId": sheet_id}, "fields": "userEnteredValue"}})
+    setup_requests.append({"repeatCell": {
+        "range": {"sheetId": sheet_id, "startColumnIndex": 0, "endColumnIndex": len(headers) + 1},
+        "cell": {"userEnteredFormat": TEXT_FORMAT},
+        "fields": "userEnteredFormat.numberFormat",
+    }})
+
+    for batch in _batches(sheet_id, writes, chunk_rows, setup_requests):
+        spreadsheet.batch_update({"requests": batch})
+        stats["requests"] += 1
+
+    logger.info(
+        f"✅ シート '{sheet_name}' に書き込みました（追加: {stats['appended']}行, 更新: {stats['updated']}行, "
+        f"変更なし: {stats['unchanged']}行, リクエスト: {stats['requests']}回）"
+    )
+    return stats
+
+
+def _read_existing(spreadsheet, sheet_name: str, num_cols: int) -> List[List[Any]]:
+    """既存シートの値を1回のリクエストで読み込む（書式を適用しない生の値）"""
+    end_column = col_number_to_letter(num_cols)
+    response = spreadsheet.values_get(
+        a1_range(sheet_name, f"A:{end_column}"), params={"valueRenderOption": "UNFORMATTED_VALUE"}
+    )
+    return response.get("values", [])
+
+
+def a1_range(sheet_name: str, cells: str) -> str:
+    """シート名付きのA1表記の範囲（シート名の ' は '' にエスケープする）"""
+    quoted = sheet_name.replace("'", "''")
+    return f"'{quoted}'!{cells}"
+
+
+def _batches(sheet_id: int, writes: List[Tuple[int, List[List[Any]]]], chunk_rows: int, setup_requests: List[Dict]):
+    """書き込みを chunk_rows 行ごとの batch_update に分ける（最初のバッチにシートの準備を含める）"""
+    chunk_rows = max(1, chunk_rows)
+    batch = list(setup_requests)
+    batch_rows = 0
+    for start_row, rows in writes:
+        for offset in range(0, len(rows), chunk_rows):
+            chunk = rows[offset:offset + chunk_rows]
+            if batch_rows and batch_rows + len(chunk) > chunk_rows:
+                yield batch
+                batch, batch_rows = [], 0
+            batch.append({"updateCells": {
+                "start": {"sheetId": sheet_id, "rowIndex": start_row + offset, "columnIndex": 0},
+                "rows": [{"values": [_cell(value) for value in row]} for row in chunk],
+                "fields": "userEnteredValue",
+            }})
+            batch_rows += len(chunk)
+    if batch:
+        yield batch
+
+
+def _cell(value: Any) -> Dict:
+    """値を CellData にする（数値は数値、それ以外は文字列として書き込む）"""
+    if value is None or value == "":
+        return {}
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, numbers.Integral):
+        return {"userEnteredValue": {"numberValue": int(value)}}
+    if isinstance(value, numbers.Real) and math.isfinite(value):
+        return {"userEnteredValue": {"numberValue": float(value)}}
+    return {"userEnteredValue": {"stringValue": str(value)}}
+
+
+def _normalized(row: List[Any], width: int) -> List[Optional[Any]]:
+    """シートから読んだ行と書き込む行を比較できる形にそろえる"""
+    values = []
+    for value in list(row[:width]) + [""] * (width - len(row)):
+        if value is None:
+            value = ""
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            values.append(str(value))
+            continue
+        values.append(round(number, 9) if math.isfinite(number) else str(number))
+    return values
+
+
+def _new_sheet_id(used_ids) -> int:
+    while True:
+        sheet_id = random.randint(1, 2**31 - 1)
+        if sheet_id not in used_ids:
+            return sheet_id
+
+
+# 列番号をアルファベットに変換する関数
+def col_number_to_letter(col_num):
+    col_letter = ""
+    while col_num > 0:
+        col_num, remainder = divmod(col_num - 1, 26)
+        col_letter = chr(remainder + 65) + col_letter
+    return col_letter
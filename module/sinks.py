@@ -0,0 +1,238 @@
+"""
+Output sinks for extracted filings: Google Sheets and local Parquet / CSV / SQLite
+"""
+import os
+import sqlite3
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .metrics import stage
+from .records import as_records
+from .sheets_writer import KEY_COLUMN, SHEET_COLUMNS
+
+# 書類の識別情報の列（文字列のまま保存する）。それ以降の列は数値として保存する
+ID_COLUMNS = SHEET_COLUMNS[:SHEET_COLUMNS.index(KEY_COLUMN) + 1]
+METRIC_COLUMNS = SHEET_COLUMNS[len(ID_COLUMNS):]
+PARTITION_COLUMN = "date"
+
+
+class OutputSink:
+    """
+    処理結果の出力先の基底クラス。
+
+    write には1回の実行の結果（1行1社の辞書のリスト）と、実行対象の日付を渡す。
+    """
+    name = "sink"
+
+    def write(self, rows: List[Dict], partition: str):
+        raise NotImplementedError
+
+
+class SheetsSink(OutputSink):
+    """
+    Googleスプレッドシートへの出力。
+
+    認証とシート名の決定は呼び出し側の関数（write_to_spreadsheet）に任せる。
+    """
+    name = "sheets"
+
+    def __init__(self, write: Callable[[List[Dict]], None]):
+        self._write = write
+
+    def write(self, rows: List[Dict], partition: str):
+        self._write(rows)
+
+
+class _LocalSink(OutputSink):
+    """書類の提出日ごとのパーティションに追記するローカル出力の共通処理"""
+
+    def write(self, rows: List[Dict], partition: str):
+        from .logger import logger
+
+        for date, frame in _partitioned_frames(rows, partition):
+            self.write_partition(date, frame)
+            logger.info(f"✅ {self.name}: {date} の{len(frame)}行を書き込みました")
+
+    def write_partition(self, date: str, frame):
+        raise NotImplementedError
+
+
+class _FileSink(_LocalSink):
+    """
+    1パーティション1ファイルの出力（`{folder}/date=YYYY-MM-DD/filings.{suffix}`）。
+
+    既存のファイルがあれば読み込んで結合し、書類IDが同じ行は新しい方で置き換えて
+    原子的に書き直す（同じ日付を再実行しても行は重複しない）。
+    日付はフォルダ名で表すため、ファイルには date 列を含めない
+    （pandas.read_parquet などでフォルダごと読むと列として復元される）。
+    """
+    suffix = ""
+
+    def __init__(self, folder: Path):
+        self.folder = Path(folder)
+
+    def path_for(self, date: str) -> Path:
+        return self.folder / f"{PARTITION_COLUMN}={date}" / f"filings.{self.suffix}"
+
+    def write_partition(self, date: str, frame):
+        import pandas as pd
+
+        path = self.path_for(date)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            frame = pd.concat([self.read(path), frame], ignore_index=True)
+            frame = frame.drop_duplicates(subset=KEY_COLUMN, keep="last")
+        frame = frame.drop(columns=PARTITION_COLUMN, errors="ignore")
+
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        os.close(fd)
+        try:
+            self.save(frame, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def read(self, path: Path):
+        raise NotImplementedError
+
+    def save(self, frame, path: str):
+        raise NotImplementedError
+
+
+class ParquetSink(_FileSink):
+    """Parquet（pyarrow）への出力。pandas.read_parquet でパーティションごと読み込める"""
+    name = "parquet"
+    suffix = "parquet"
+
+    def __init__(self, folder: Path):
+        super().__init__(folder)
+        import pyarrow  # noqa: F401  # 未インストールなら作成時に分かるようにする
+
+    def read(self, path: Path):
+        import pandas as pd
+        return pd.read_parquet(path)
+
+    def save(self, frame, path: str):
+        frame.to_parquet(path, index=False)
+
+
+class CsvSink(_FileSink):
+    """CSV（UTF-8 BOM付き、Excelでそのまま開ける）への出力"""
+    name = "csv"
+    suffix = "csv"
+
+    def read(self, path: Path):
+        import pandas as pd
+        return _typed(pd.read_csv(path, dtype={column: str for column in ID_COLUMNS}, encoding="utf-8-sig"))
+
+    def save(self, frame, path: str):
+        frame.to_csv(path, index=False, encoding="utf-8-sig")
+
+
+class SQLiteSink(_LocalSink):
+    """
+    SQLite への出力。`filings` テーブルに書類IDを主キーとして保存し、
+    同じ書類IDは上書きする。
+    """
+    name = "sqlite"
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+
+    def write_partition(self, date: str, frame):
+        columns = [PARTITION_COLUMN] + SHEET_COLUMNS
+        quoted = ", ".join(f'"{column}"' for column in columns)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.db_path)
+        try:
+            with connection:
+                column_defs = ", ".join(
+                    f'"{column}" {"REAL" if column in METRIC_COLUMNS else "TEXT"}'
+                    + (" PRIMARY KEY" if column == KEY_COLUMN else "")
+                    for column in columns
+                )
+                connection.execute(f"CREATE TABLE IF NOT EXISTS filings ({column_defs})")
+                connection.execute(f'CREATE INDEX IF NOT EXISTS filings_date ON filings ("{PARTITION_COLUMN}")')
+                # NaN は NULL として保存する
+                records = frame[columns].astype(object).where(frame[columns].notna(), None).itertuples(index=False, name=None)
+                connection.executemany(
+                    f"INSERT OR REPLACE INTO filings ({quoted}) VALUES ({', '.join('?' * len(columns))})",
+                    records,
+                )
+        finally:
+            connection.close()
+
+
+def _typed(frame):
+    """識別情報の列は文字列、指標の列は数値（変換できない値は欠損）にそろえる"""
+    import pandas as pd
+
+    for column in [PARTITION_COLUMN] + SHEET_COLUMNS:
+        if column not in frame.columns:
+            frame[column] = None
+    frame = frame[[PARTITION_COLUMN] + SHEET_COLUMNS].copy()
+    for column in METRIC_COLUMNS:
+        frame[column] = pd.to_numeric(frame[column], errors="coerce").astype("float64")
+    for column in [PARTITION_COLUMN] + ID_COLUMNS:
+        frame[column] = frame[column].astype("string")
+    return frame
+
+
+def _partitioned_frames(rows: List[Dict], default_partition: str):
+    """行を書類の提出日（`書類提出日` の日付部分）ごとの DataFrame に分ける"""
+    import pandas as pd
+
+    records = as_records(rows)
+    frame = pd.DataFrame([record.values(SHEET_COLUMNS) for record in records], columns=SHEET_COLUMNS)
+    frame[PARTITION_COLUMN] = [
+        str(record.get("書類提出日") or default_partition)[:10] for record in records
+    ]
+    frame = _typed(frame)
+    for date, partition in frame.groupby(PARTITION_COLUMN, sort=True):
+        yield date, partition.reset_index(drop=True)
+
+
+def build_sinks(names: Iterable[str], output_folder: Path, write_sheets: Optional[Callable] = None) -> List[OutputSink]:
+    """
+    設定された名前（sheets / parquet / csv / sqlite）から出力先を作る。
+
+    依存パッケージがないなどで作れない出力先はログに残してスキップする。
+    """
+    from .logger import logger
+
+    factories = {
+        "sheets": lambda: SheetsSink(write_sheets),
+        "parquet": lambda: ParquetSink(Path(output_folder) / "parquet"),
+        "csv": lambda: CsvSink(Path(output_folder) / "csv"),
+        "sqlite": lambda: SQLiteSink(Path(output_folder) / "filings.sqlite3"),
+    }
+    sinks = []
+    for name in names:
+        factory = factories.get(name)
+        if factory is None or (name == "sheets" and write_sheets is None):
+            logger.warning(f"⚠️ 不明な出力先のためスキップします: {name}")
+            continue
+        try:
+            sinks.append(factory())
+        except Exception as e:
+            logger.exception(f"出力先 {name} を利用できないためスキップします")
+    return sinks
+
+
+def write_to_sinks(sinks: List[OutputSink], rows: List[Dict], partition: str) -> Dict[str, bool]:
+    """すべての出力先に書き込む。1つが失敗しても残りには書き込む"""
+    from .logger import logger
+
+    results = {}
+    for sink in sinks:
+        try:
+            with stage(f"write_{sink.name}"):
+                sink.write(rows, partition)
+            results[sink.name] = True
+        except Exception as e:
+            logger.exception(f"出力先 {sink.name} への書き込み中にエラーが発生しました")
+            results[sink.name] = False
+    return results
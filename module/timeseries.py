@@ -0,0 +1,251 @@
+"""
+Per-company history of extracted values, keyed by EDINETコード, docID and period end
+"""
+import numbers
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from .config import config
+from .periods import CURRENT_PERIOD, period_end, period_offset
+from .records import KEY_COLUMN, OUTPUT_COLUMNS, FilingRecord
+
+# 時系列に保存する列（書類の識別情報より後の数値の列）
+SERIES_COLUMNS = OUTPUT_COLUMNS[OUTPUT_COLUMNS.index(KEY_COLUMN) + 1:]
+
+
+class TimeSeriesStore:
+    """
+    会社（EDINETコード）・期末日・項目ごとの値を保存する SQLite の時系列。
+
+    1つの書類から当期と前期以前の値を保存するため、前年の書類をダウンロードしなくても
+    前期との比較ができる。同じ会社・期末日・項目の値が複数の書類にある場合は、
+    提出日が新しい書類の値（訂正・組替え後の値）で置き換える。
+
+    前期以前の期末日は、当期末から1年ずつさかのぼった日とする（periods.period_end）。
+
+    金額はどの抽出経路でも円に換算済みの値を保存し、項目ごとの単位（JPY / % など）を unit 列に持つ。
+
+    書類ごとの情報（企業名・期間・提出日）は filings テーブルに書類IDごとに保存する。
+    会社の推移（history）と、ある期末日の全社の値（cross_section）はインデックスで引く。
+
+    Args:
+        db_path (Path): SQLite ファイルのパス。
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.db_path)
+        if not self._initialized:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS series ("
+                " edinet_code TEXT NOT NULL,"
+                " period_end TEXT NOT NULL,"
+                " metric TEXT NOT NULL,"
+                " value REAL,"
+                " doc_id TEXT NOT NULL,"
+                " period TEXT NOT NULL,"
+                " submitted_at TEXT,"
+                " unit TEXT NOT NULL,"
+                " PRIMARY KEY (edinet_code, period_end, metric))"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS filings ("
+                " doc_id TEXT PRIMARY KEY,"
+                " edinet_code TEXT NOT NULL,"
+                " company_name TEXT,"
+                " period_start TEXT,"
+                " period_end TEXT,"
+                " submitted_at TEXT)"
+            )
+            # 期末日の全社の値（cross_section）と、会社の書類の一覧を引くためのインデックス
+            connection.execute("CREATE INDEX IF NOT EXISTS series_metric_period ON series (metric, period_end)")
+            connection.execute("CREATE INDEX IF NOT EXISTS filings_company ON filings (edinet_code, period_end)")
+            self._initialized = True
+        return connection
+
+    def record(self, records: Iterable[FilingRecord]) -> int:
+        """
+        書類ごとの当期（出力の数値の列）と前期以前（periods）の値を保存する。
+
+        Returns:
+            int: 保存した値の数。
+        """
+        records = list(records)
+        points = [point for record in records for point in _points(record)]
+        if not points:
+            return 0
+        filings = [_filing(record) for record in records if record.get("EDINETコード") and record.get(KEY_COLUMN)]
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO filings (doc_id, edinet_code, company_name, period_start, period_end, submitted_at)"
+                        " VALUES (?, ?, ?, ?, ?, ?)",
+                        filings,
+                    )
+                    connection.executemany(
+                        "INSERT INTO series (edinet_code, period_end, metric, value, doc_id, period, submitted_at, unit)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                        " ON CONFLICT(edinet_code, period_end, metric) DO UPDATE SET"
+                        " value = excluded.value, doc_id = excluded.doc_id,"
+                        " period = excluded.period, submitted_at = excluded.submitted_at, unit = excluded.unit"
+                        " WHERE COALESCE(excluded.submitted_at, '') >= COALESCE(series.submitted_at, '')",
+                        points,
+                    )
+            finally:
+                connection.close()
+        return len(points)
+
+    def series(self, edinet_code: str, metric: str) -> List[Tuple[str, float]]:
+        """会社の1項目の値を期末日の古い順に返す（[(期末日, 値), ...]）"""
+        return self._query(
+            "SELECT period_end, value FROM series WHERE edinet_code = ? AND metric = ? ORDER BY period_end",
+            (edinet_code, metric),
+        )
+
+    def history(self, edinet_code: str, metrics: Optional[Iterable[str]] = None):
+        """
+        会社の値の推移を返す。
+
+        Args:
+            edinet_code (str): EDINETコード。
+            metrics (Optional[Iterable[str]]): 返す項目（列名）。省略時は保存されているすべての項目。
+
+        Returns:
+            pandas.DataFrame: 期末日（古い順）を行、項目を列にした表。
+                項目ごとの単位は `attrs["単位"]`（項目 -> JPY / % など）。
+        """
+        import pandas as pd
+
+        query = "SELECT period_end, metric, value FROM series WHERE edinet_code = ?"
+        params = [edinet_code]
+        if metrics is not None:
+            metrics = list(metrics)
+            query += f" AND metric IN ({','.join('?' * len(metrics))})"
+            params += metrics
+        rows = self._query(query, params)
+        frame = pd.DataFrame(rows, columns=["期末日", "項目", "値"])
+        table = frame.pivot(index="期末日", columns="項目", values="値").sort_index()
+        table.columns.name = None
+        # 項目は出力の列の順にそろえる
+        columns = metrics if metrics is not None else [column for column in SERIES_COLUMNS if column in table.columns]
+        table = table.reindex(columns=[column for column in columns if column in table.columns])
+        table.attrs["単位"] = {column: unit_of(column) for column in table.columns}
+        return table
+
+    def cross_section(self, metric: str, period_end: str):
+        """
+        ある期末日の全社の値を返す（値の大きい順）。
+
+        Args:
+            metric (str): 項目（列名。例: "自己資本比率"）。
+            period_end (str): 期末日（YYYY-MM-DD）。
+
+        Returns:
+            pandas.DataFrame: EDINETコード・企業名・値・単位・書類ID の表。
+        """
+        import pandas as pd
+
+        rows = self._query(
+            "SELECT series.edinet_code, filings.company_name, series.value, series.unit, series.doc_id"
+            " FROM series LEFT JOIN filings ON filings.doc_id = series.doc_id"
+            " WHERE series.metric = ? AND series.period_end = ?"
+            " ORDER BY series.value DESC",
+            (metric, period_end),
+        )
+        return pd.DataFrame(rows, columns=["EDINETコード", "企業名", "値", "単位", "書類ID"])
+
+    def filings(self, edinet_code: str) -> List[Tuple[str, str, str, str, str]]:
+        """会社の保存済みの書類を期末日の古い順に返す（[(書類ID, 企業名, 期間開始, 期末日, 提出日), ...]）"""
+        return self._query(
+            "SELECT doc_id, company_name, period_start, period_end, submitted_at FROM filings"
+            " WHERE edinet_code = ? ORDER BY period_end, submitted_at",
+            (edinet_code,),
+        )
+
+    def _query(self, query: str, params: Iterable) -> list:
+        with self._lock:
+            connection = self._connect()
+            try:
+                return connection.execute(query, tuple(params)).fetchall()
+            finally:
+                connection.close()
+
+
+def _filing(record: FilingRecord) -> tuple:
+    """FilingRecord を filings テーブルの行（書類ID, EDINETコード, 企業名, 期間開始, 期末日, 提出日）にする"""
+    return (
+        record.get(KEY_COLUMN), record.get("EDINETコード"), record.get("企業名"),
+        record.get("会計期間開始"), record.get("会計期間終了"), record.get("書類提出日"),
+    )
+
+
+def unit_of(metric: str) -> str:
+    """
+    項目の単位。config['financial_ratios'] の指標は倍率 100 なら "%"、それ以外は "ratio"。
+    そのほかの項目は抽出時に円に換算した金額（"JPY"）。
+    """
+    for formula in config['financial_ratios']:
+        if formula['name'] == metric:
+            return "%" if formula.get('scale', 1) == 100 else "ratio"
+    return "JPY"
+
+
+def _points(record: FilingRecord) -> List[tuple]:
+    """FilingRecord を (EDINETコード, 期末日, 項目, 値, 書類ID, 期間, 提出日, 単位) の行にする"""
+    edinet_code = record.get("EDINETコード")
+    current_end = record.get("会計期間終了")
+    if not edinet_code or not current_end:
+        return []
+    doc_id = record.get(KEY_COLUMN)
+    submitted_at = record.get("書類提出日")
+
+    periods = {CURRENT_PERIOD: {column: record.get(column) for column in SERIES_COLUMNS}}
+    periods.update(record.periods)
+    points = []
+    for period, values in sorted(periods.items(), key=lambda item: period_offset(item[0])):
+        end = period_end(current_end, period)
+        if end is None:
+            continue
+        for metric, value in values.items():
+            if isinstance(value, numbers.Real) and not isinstance(value, bool) and value == value:
+                points.append((edinet_code, end, metric, float(value), doc_id, period, submitted_at, unit_of(metric)))
+    return points
+
+
+if __name__ == "__main__":
+    # 例: python -m module.timeseries history E02144 --metrics 自己資本比率 売上高
+    #     python -m module.timeseries cross-section 自己資本比率 2024-03-31 --top 20
+    import argparse
+
+    from .config import config
+
+    parser = argparse.ArgumentParser(description="保存済みの時系列を表示する")
+    parser.add_argument("--db", type=Path, default=config['timeseries_file'], help="時系列の SQLite ファイル")
+    commands = parser.add_subparsers(dest="command", required=True)
+    history_parser = commands.add_parser("history", help="会社の値の推移")
+    history_parser.add_argument("edinet_code")
+    history_parser.add_argument("--metrics", nargs="+", help="表示する項目（省略時はすべて）")
+    cross_parser = commands.add_parser("cross-section", help="ある期末日の全社の値")
+    cross_parser.add_argument("metric")
+    cross_parser.add_argument("period_end")
+    cross_parser.add_argument("--top", type=int, help="上位の件数")
+    args = parser.parse_args()
+
+    store = TimeSeriesStore(args.db)
+    if args.command == "history":
+        table = store.history(args.edinet_code, args.metrics)
+    else:
+        table = store.cross_section(args.metric, args.period_end)
+        if args.top:
+            table = table.head(args.top)
+    print(table.to_string() if len(table) else "該当する値がありません")
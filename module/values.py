@@ -0,0 +1,36 @@
+"""
+Number and unit normalization shared by the CSV, tagged-fact and text-block extractors
+"""
+import re
+from typing import Optional, Union
+
+# テキストブロックの表の単位の表記と、円に換算する倍率
+UNIT_MULTIPLIERS = {"円": 1, "千円": 1_000, "百万円": 1_000_000, "十億円": 1_000_000_000}
+_UNIT_CAPTION = re.compile(r"単位\s*[:：]\s*(" + "|".join(sorted(UNIT_MULTIPLIERS, key=len, reverse=True)) + ")")
+
+
+def to_number(text) -> Optional[Union[int, float]]:
+    """
+    CSV・タグ付きの値の文字列を数値にする（整数は int、小数は float のまま）。
+
+    数値でなければ None。
+    """
+    if text is None:
+        return None
+    text = str(text).strip()
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def unit_multiplier(text: Optional[str]) -> Optional[int]:
+    """「（単位：百万円）」のような単位の表記から、円に換算する倍率を返す。表記がなければ None"""
+    if not text:
+        return None
+    match = _UNIT_CAPTION.search(text)
+    return UNIT_MULTIPLIERS[match.group(1)] if match else None
@@ -0,0 +1,200 @@
+"""
+In-memory access to EDINET filing archives (documents/{docID}?type=1 and type=5)
+"""
+import io
+import os
+import shutil
+import struct
+import tempfile
+import zipfile
+from typing import Iterable, List, NamedTuple, Optional, Union
+
+# 財務諸表本体のインスタンス文書が格納されるフォルダ
+PUBLIC_DOC_PREFIX = "XBRL/PublicDoc/"
+# CSV形式（type=5）のアーカイブで、XBRLの各要素を表形式にしたファイルが格納されるフォルダ
+CSV_PREFIX = "XBRL_TO_CSV/"
+
+
+class XbrlMember(NamedTuple):
+    """
+    ZIPから取り出したXBRLインスタンス文書。
+
+    中身はメモリ上（data）か、展開した一時ファイル（path）のどちらか一方に持つ。
+    一時ファイルの場合、解析ワーカーにはパスだけを渡し、ワーカーが自分で開いて読む。
+    """
+    name: str
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+
+    @property
+    def source(self) -> Union[bytes, str]:
+        """XbrlDocument / build_fact_index に渡す値（一時ファイルのパス、またはメモリ上の中身）"""
+        return self.path if self.path is not None else self.data
+
+    def discard(self) -> None:
+        """一時ファイルに展開した場合は削除する（メモリ上の場合は何もしない）"""
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class CsvMember(NamedTuple):
+    """CSV形式のアーカイブから取り出した本文のCSV（メンバー名と中身）"""
+    name: str
+    data: bytes
+
+
+def find_member(zip_file: zipfile.ZipFile, codes: Iterable[Optional[str]], prefix: str, suffix: str) -> Optional[str]:
+    """
+    ZIPのセントラルディレクトリだけを見て、対象のメンバー名を探す。
+
+    codes は優先順に試し、prefix 配下でファイル名にコードを含み suffix で終わる
+    最初のメンバーを返す（例: fundコード -> EDINETコード）。
+    監査報告書（jpaud-）は対象外とする。
+    """
+    return match_member(zip_file.namelist(), codes, prefix, suffix)
+
+
+def match_member(names: Iterable[str], codes: Iterable[Optional[str]], prefix: str, suffix: str) -> Optional[str]:
+    """メンバー名の一覧から find_member と同じ規則で対象を選ぶ"""
+    candidates = [
+        name for name in names
+        if name.startswith(prefix) and name.endswith(suffix)
+        and not name.rsplit("/", 1)[-1].startswith("jpaud")
+    ]
+    for code in codes:
+        if not code:
+            continue
+        for name in candidates:
+            if code in name.rsplit("/", 1)[-1]:
+                return name
+    return None
+
+
+def find_xbrl_member(zip_file: zipfile.ZipFile, codes: Iterable[Optional[str]]) -> Optional[str]:
+    """XBRL/PublicDoc 配下の対象 .xbrl のメンバー名を探す"""
+    return find_member(zip_file, codes, PUBLIC_DOC_PREFIX, ".xbrl")
+
+
+def match_xbrl_member(names: Iterable[str], codes: Iterable[Optional[str]]) -> Optional[str]:
+    return match_member(names, codes, PUBLIC_DOC_PREFIX, ".xbrl")
+
+
+def match_csv_member(names: Iterable[str], codes: Iterable[Optional[str]]) -> Optional[str]:
+    return match_member(names, codes, CSV_PREFIX, ".csv")
+
+
+def read_xbrl_member(archive: Union[bytes, io.IOBase], codes: Iterable[Optional[str]],
+                     spool_max_bytes: Optional[int] = None) -> Optional[XbrlMember]:
+    """
+    アーカイブを展開せずに、対象の .xbrl メンバーだけを取り出す。
+
+    展開後のサイズが spool_max_bytes を超えるメンバーはメモリに読み込まず、
+    チャンク単位で一時ファイルに書き出してそのパスを返す（削除は XbrlMember.discard）。
+
+    Args:
+        archive (bytes | file-like): ZIPの中身、またはシーク可能なファイルオブジェクト。
+        codes (Iterable[str]): ファイル名の検索に使うコード（優先順）。
+        spool_max_bytes (int, optional): メモリに読み込む上限。None なら常にメモリに読み込む。
+
+    Returns:
+        Optional[XbrlMember]: 見つかったメンバー。該当なしの場合は None。
+
+    Raises:
+        zipfile.BadZipFile: ZIPとして読み込めない場合。
+    """
+    if isinstance(archive, (bytes, bytearray)):
+        archive = io.BytesIO(archive)
+
+    with zipfile.ZipFile(archive) as zip_file:
+        member_name = find_xbrl_member(zip_file, codes)
+        if member_name is None:
+            return None
+        if spool_max_bytes is None or zip_file.getinfo(member_name).file_size <= spool_max_bytes:
+            return XbrlMember(member_name, zip_file.read(member_name))
+        return XbrlMember(member_name, path=_spool_member(zip_file, member_name))
+
+
+def _spool_member(zip_file: zipfile.ZipFile, member_name: str) -> str:
+    """メンバーを一時ファイルに展開してパスを返す（失敗した場合は一時ファイルを残さない）"""
+    fd, path = tempfile.mkstemp(prefix="edinet_", suffix=".xbrl")
+    try:
+        with os.fdopen(fd, "wb") as out, zip_file.open(member_name) as member:
+            shutil.copyfileobj(member, out)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
+def read_csv_member(archive: Union[bytes, io.IOBase], codes: Iterable[Optional[str]]) -> Optional[CsvMember]:
+    """
+    CSV形式のアーカイブから、本文（XBRL_TO_CSV 配下）の対象CSVだけをメモリに読み込む。
+
+    Raises:
+        zipfile.BadZipFile: ZIPとして読み込めない場合。
+    """
+    if isinstance(archive, (bytes, bytearray)):
+        archive = io.BytesIO(archive)
+
+    with zipfile.ZipFile(archive) as zip_file:
+        member_name = find_member(zip_file, codes, CSV_PREFIX, ".csv")
+        if member_name is None:
+            return None
+        return CsvMember(member_name, zip_file.read(member_name))
+
+
+# Range リクエストで先に取得するアーカイブ末尾のサイズ（EDINETのZIPのセントラルディレクトリは通常数KB）
+CENTRAL_DIRECTORY_PROBE_BYTES = 64 * 1024
+
+# End of central directory レコード（固定長22バイト + コメント）
+_EOCD_SIGNATURE = b"PK\x05\x06"
+_EOCD_FORMAT = "<4s4H2LH"
+# セントラルディレクトリのファイルヘッダー（固定長46バイト + 名前・拡張・コメント）
+_CENTRAL_HEADER_SIGNATURE = b"PK\x01\x02"
+_CENTRAL_HEADER_FORMAT = "<4s6H3L5H2L"
+_UTF8_FLAG = 0x800
+
+
+def member_names_from_tail(tail: bytes, archive_size: int) -> Optional[List[str]]:
+    """
+    ZIPの末尾だけから、セントラルディレクトリに載っているメンバー名の一覧を読む。
+
+    アーカイブ全体をダウンロードする前に、HTTPの Range リクエストで取得した
+    末尾の数十KBだけで対象ファイルの有無を判定するために使う。
+
+    Args:
+        tail (bytes): アーカイブの末尾。
+        archive_size (int): アーカイブ全体のサイズ（Content-Range の total）。
+
+    Returns:
+        Optional[List[str]]: メンバー名の一覧。セントラルディレクトリ全体が tail に
+            含まれていない場合や ZIP64 の場合など、判定できなければ None。
+    """
+    eocd_position = tail.rfind(_EOCD_SIGNATURE)
+    if eocd_position < 0 or len(tail) - eocd_position < struct.calcsize(_EOCD_FORMAT):
+        return None
+    (_, _, _, _, entry_count, directory_size, directory_offset, _) = struct.unpack_from(
+        _EOCD_FORMAT, tail, eocd_position
+    )
+    if directory_offset == 0xFFFFFFFF or entry_count == 0xFFFF:
+        return None  # ZIP64
+
+    start = directory_offset - (archive_size - len(tail))
+    if start < 0 or start + directory_size > eocd_position:
+        return None
+
+    names = []
+    header_size = struct.calcsize(_CENTRAL_HEADER_FORMAT)
+    position = start
+    for _ in range(entry_count):
+        header = struct.unpack_from(_CENTRAL_HEADER_FORMAT, tail, position)
+        if header[0] != _CENTRAL_HEADER_SIGNATURE:
+            return None
+        flags, name_length, extra_length, comment_length = header[3], header[10], header[11], header[12]
+        raw_name = tail[position + header_size: position + header_size + name_length]
+        names.append(raw_name.decode("utf-8" if flags & _UTF8_FLAG else "cp437"))
+        position += header_size + name_length + extra_length + comment_length
+    return names
@@ -0,0 +1,96 @@
+"""
+Fact extraction from EDINET's pre-tabulated CSV output (documents/{docID}?type=5)
+"""
+import io
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from .logger import logger
+from .periods import CURRENT_PERIOD, period_contexts
+from .values import to_number
+
+# EDINETのCSVの列名
+ELEMENT_ID_COLUMN = "要素ID"
+CONTEXT_ID_COLUMN = "コンテキストID"
+VALUE_COLUMN = "値"
+
+
+def read_fact_table(csv_data: bytes) -> pd.DataFrame:
+    """EDINETのCSV（UTF-16・タブ区切り）を 要素ID / コンテキストID / 値 の表として読み込む"""
+    return pd.read_csv(
+        io.BytesIO(csv_data),
+        sep="\t",
+        encoding="utf-16",
+        dtype=str,
+        usecols=[ELEMENT_ID_COLUMN, CONTEXT_ID_COLUMN, VALUE_COLUMN],
+    )
+
+
+def extract_period_values_from_csv(csv_data: bytes, element_ids: Dict[str, List[str]], context_priority: List[str],
+                                   periods: List[str]) -> Dict[str, Dict[str, Optional[int | float]]]:
+    """
+    EDINETのCSVを1回だけ読み込み、当期と前期以前の各期間の値を抽出する。
+
+    期間ごとのコンテキストIDは context_priority（当期のコンテキストID）の
+    `CurrentYear` を期間（`Prior1Year` など）に置き換えたものを使う。
+
+    Args:
+        csv_data (bytes): XBRL_TO_CSV 配下の本文CSVの中身。
+        element_ids (Dict[str, List[str]]): 検索ワード -> 要素ID（優先順）。
+        context_priority (List[str]): 当期のコンテキストID（優先順）。
+        periods (List[str]): 抽出する期間（例: ["CurrentYear", "Prior1Year"]）。
+
+    Returns:
+        Dict[str, Dict[str, Optional[int | float]]]: 期間 -> 検索ワードと値（円単位）の辞書。
+    """
+    facts = read_fact_table(csv_data)
+    values = {
+        period: _best_values(facts, element_ids, period_contexts(context_priority, period))
+        for period in periods
+    }
+    if all(value is None for value in values.get(CURRENT_PERIOD, {}).values()):
+        logger.warning("❌ CSVに該当する要素が見つかりませんでした")
+    else:
+        logger.info(f"✅ CSVから抽出完了: {values}")
+    return values
+
+
+def _best_values(facts: pd.DataFrame, element_ids: Dict[str, List[str]], context_priority: List[str]) -> Dict[str, Optional[int | float]]:
+    """
+    検索ワードごとに、要素ID・コンテキストIDの優先順で最初に数値が取れる値を選ぶ。
+
+    要素IDとコンテキストIDの優先順位を表にして結合し、全ワードを1回の
+    ベクトル演算で解決する（行ごとのループや文字列マッチングは行わない）。
+    値はタグ付きの値と同じ変換（values.to_number）で、整数は int、小数は float にする。
+    """
+    extracted_values = {word: None for word in element_ids}
+
+    # 検索ワード・要素ID・優先順位の対応表
+    targets = pd.DataFrame(
+        [
+            (word, element_id, rank)
+            for word, ids in element_ids.items()
+            for rank, element_id in enumerate(ids)
+        ],
+        columns=["word", ELEMENT_ID_COLUMN, "element_rank"],
+    )
+    context_rank = {context_id: rank for rank, context_id in enumerate(context_priority)}
+
+    facts = facts[facts[CONTEXT_ID_COLUMN].isin(context_rank.keys())]
+    matched = targets.merge(facts, on=ELEMENT_ID_COLUMN, how="inner")
+    matched["value"] = pd.to_numeric(matched[VALUE_COLUMN], errors="coerce")
+    matched = matched.dropna(subset=["value"])
+    if matched.empty:
+        return extracted_values
+
+    matched["context_rank"] = matched[CONTEXT_ID_COLUMN].map(context_rank)
+    best = (
+        matched.sort_values(["word", "element_rank", "context_rank"])
+        .drop_duplicates(subset="word")
+        .set_index("word")[VALUE_COLUMN]
+    )
+
+    for word, value in best.items():
+        extracted_values[word] = to_number(value)
+    return extracted_values
@@ -1,17 +1,163 @@
+import io
 import re
 import os
+from functools import lru_cache
 from lxml import etree, html
 try:
     from .logger import *
+    from .periods import CURRENT_PERIOD, period_contexts, period_of, period_offset
+    from .values import to_number, unit_multiplier
 except ImportError:
     from logger import *
+    from periods import CURRENT_PERIOD, period_contexts, period_of, period_offset
+    from values import to_number, unit_multiplier
 
-def extract_values_from_xbrl(xbrl_file:str, target_block_name:str, search_words_list:list[str]):
+XSI_NIL = "{http://www.w3.org/2001/XMLSchema-instance}nil"
+
+
+class XbrlDocument:
+    """
+    1回だけパースしたXBRLインスタンス文書。
+
+    要素のローカル名 -> 要素 の索引は初回検索時に1度だけ構築し、
+    テキストブロック内のHTMLも初回アクセス時にパースしてキャッシュする。
+    同じ書類に対する複数の抽出設定は、すべてこのオブジェクトを共有する。
+
+    block_names を渡すとストリーミングモードになり、文書全体の木は作らずに
+    iterparse で指定ブロックのテキストだけを保持する（すべて見つかった時点で読み込みを打ち切る）。
+    この場合 root は None で、find_block を呼ぶと RuntimeError になる（block_html を使う）。
+
+    Args:
+        xbrl_file (str | bytes): XBRLファイルのパス、またはメモリ上のXBRLの中身。
+        name (str): bytes を渡した場合にログへ表示する名前（ZIPのメンバー名など）。
+        block_names (Iterable[str]): ストリーミングモードで保持するテキストブロック名。
+    """
+
+    def __init__(self, xbrl_file, name: str = None, block_names=None):
+        if isinstance(xbrl_file, (bytes, bytearray)):
+            self.path = name or "<memory>"
+        else:
+            self.path = os.path.abspath(xbrl_file)
+        self._elements = None
+        self._html_cache = {}
+
+        if block_names is not None:
+            self.root = None
+            self._texts = read_text_blocks(xbrl_file, block_names)
+        elif isinstance(xbrl_file, (bytes, bytearray)):
+            self.root = etree.parse(io.BytesIO(xbrl_file)).getroot()
+        else:
+            self.root = etree.parse(self.path).getroot()
+
+    def _build_index(self) -> dict:
+        elements = {}
+        for element in self.root.iter():
+            tag = element.tag
+            if not isinstance(tag, str):  # コメント・処理命令は対象外
+                continue
+            # 文書順で最初に現れた要素を採用（root.find(".//{*}name") と同じ結果）
+            elements.setdefault(tag.rsplit("}", 1)[-1], element)
+        return elements
+
+    def find_block(self, block_name: str):
+        """ローカル名でテキストブロック要素を取得する。見つからなければ None。"""
+        if self.root is None:
+            raise RuntimeError(f"ストリーミングモードでは要素の木を作らないため find_block は使えません。block_html を使ってください: {self.path}")
+        if self._elements is None:
+            self._elements = self._build_index()
+        return self._elements.get(block_name)
+
+    def block_html(self, block_name: str):
+        """テキストブロックの中身をHTMLとしてパースした結果を返す（キャッシュ付き）。"""
+        if block_name in self._html_cache:
+            return self._html_cache[block_name]
+
+        if self.root is None:
+            text = self._texts.get(block_name)
+        else:
+            block = self.find_block(block_name)
+            text = block.text if block is not None else None
+        block_html = html.fromstring(text) if text else None
+        self._html_cache[block_name] = block_html
+        return block_html
+
+
+# 数値の正規化に使う正規表現（毎回コンパイルしないようモジュールで1度だけ作る）
+_LEADING_NON_ASCII = re.compile(r"^[^\x00-\x7F]+")
+_NON_NUMERIC = re.compile(r"[^\d-]")
+
+
+def parse_cell_value(cell: str):
+    """表のセルの文字列を整数にする（「△」は負数）。数字がなければ None。"""
+    extracted_value = _LEADING_NON_ASCII.sub("", cell)
+    extracted_value = _NON_NUMERIC.sub("", extracted_value)
+    if "△" in cell:
+        extracted_value = "-" + extracted_value
+    return int(extracted_value) if extracted_value else None
+
+
+class RowMatcher:
+    """
+    search_words_list から1度だけ作る、表の行の分類器。
+
+    全検索ワードの選択（alternation）を1つの正規表現にまとめ、どのワードも
+    含まない行（大半の行）は1回の検索で読み飛ばす。候補になった行だけ、
+    検索ワードの順に「完全一致 -> 部分一致」の規則で値を取るワードを決める。
+
+    Args:
+        search_words (Tuple[str, ...]): 検索ワード（優先順）。
+    """
+
+    def __init__(self, search_words: tuple):
+        self.search_words = search_words
+        words = sorted(set(search_words), key=len, reverse=True)
+        self._any_word = re.compile("|".join(map(re.escape, words))) if words else None
+
+    def match(self, cells: list[str], pending: set):
+        """
+        行のセルから、値を取るべき検索ワードを返す。
+
+        Args:
+            cells (List[str]): 行のセルの文字列（最後のセルが値）。
+            pending (Set[str]): まだ値が取れていない検索ワード。
+
+        Returns:
+            Optional[Tuple[str, bool]]: (検索ワード, 完全一致かどうか)。該当なしは None。
+        """
+        # ラベルとなるセル（最後のセル以外）が必要
+        if self._any_word is None or len(cells) < 2:
+            return None
+        label_cells = cells[:-1]
+        if self._any_word.search("\n".join(label_cells)) is None:
+            return None
+
+        for word in self.search_words:
+            if word not in pending:
+                continue
+            # 完全一致（最初の一致が値のセルならこのワードは対象外）
+            if word in cells:
+                if cells.index(word) + 1 >= len(cells):
+                    continue
+                return word, True
+            # 部分一致
+            if any(word in cell for cell in label_cells):
+                return word, False
+        return None
+
+
+@lru_cache(maxsize=64)
+def compile_row_matcher(search_words: tuple) -> RowMatcher:
+    """同じ検索ワードの組み合わせには同じ RowMatcher を使い回す"""
+    return RowMatcher(search_words)
+
+
+def extract_values_from_xbrl(xbrl_file, target_block_name:str, search_words_list:list[str]):
     """
     XBRL ファイルから指定のブロック内の検索ワードに該当する値を抽出する。
 
     Args:
-        xbrl_file (str): XBRLファイルのパス。
+        xbrl_file (str | XbrlDocument): XBRLファイルのパス、またはパース済みの XbrlDocument。
+            同じ書類から複数ブロックを抽出する場合は XbrlDocument を渡すとパースが1回で済む。
         target_block_name (str): 抽出対象のブロック名。
             - "StatementOfIncomeAndRetainedEarningsTextBlock"  # 損益計算書
             - "BalanceSheetTextBlock"  # 貸借対照表
@@ -21,31 +167,52 @@ def extract_values_from_xbrl(xbrl_file:str, target_block_name:str, search_words_
             - ["純資産合計", "負債純資産合計"]
 
     Returns:
-        Dict[str, str]: 検索ワードとそれに対応する抽出値の辞書。
+        Dict[str, Optional[int]]: 検索ワードとそれに対応する抽出値（円単位）の辞書。
 
     Example:
         extract_values_from_xbrl("sample.xbrl", "BalanceSheetTextBlock", ["純資産合計", "負債純資産合計"])
-        -> {"純資産合計": "100億円", "負債純資産合計": "500億円"}
+        -> {"純資産合計": 10000000000, "負債純資産合計": 50000000000}
     """
-    try:
-        # XBRLファイルを解析
-        xbrl_file = os.path.abspath(xbrl_file)
-        tree = etree.parse(xbrl_file)
-        root = tree.getroot()
+    return extract_period_values_from_xbrl(xbrl_file, target_block_name, search_words_list).get(CURRENT_PERIOD, {})
+
+
+def extract_period_values_from_xbrl(xbrl_file, target_block_name: str, search_words_list: list[str],
+                                    periods: tuple = (CURRENT_PERIOD,)) -> dict:
+    """
+    extract_values_from_xbrl と同じ走査で、当期と前期以前の列の値も抽出する。
+
+    有価証券報告書の財務諸表は「前事業年度 | 当事業年度」のように右端が当期の列で、
+    その左に前期以前の列が並ぶ。ラベルのセルより右にある列を、右から順に
+    CurrentYear, Prior1Year, ... として読む（注記番号「※」の列は値として扱わない）。
+
+    値は表の単位の表記（「（単位：百万円）」など）で円に換算し、CSV・タグ付きの値と同じ単位にそろえる。
+    表の中に表記がなければ表より前の最後の表記を使い、どちらもなければ円単位とみなす。
 
-        # 名前空間を取得
-        ns = root.nsmap
+    Args:
+        xbrl_file (str | XbrlDocument): XBRLファイルのパス、またはパース済みの XbrlDocument。
+        target_block_name (str): 抽出対象のブロック名。
+        search_words_list (List[str]): 抽出したいキーワードのリスト。
+        periods (Tuple[str, ...]): 抽出する期間（例: ("CurrentYear", "Prior1Year")）。
+
+    Returns:
+        Dict[str, Dict[str, Optional[int]]]: 期間 -> 検索ワードと値（円単位）の辞書。
+            ブロックや表が見つからなければ空の辞書。
+    """
+    try:
+        # XBRLファイルを解析（パース済みならそのまま使う）
+        if isinstance(xbrl_file, XbrlDocument):
+            document = xbrl_file
+        else:
+            document = XbrlDocument(xbrl_file)
+        xbrl_file = document.path
 
-        # 指定したテキストブロックを取得
-        target_block = root.find(f".//{{*}}{target_block_name}", namespaces=ns)
+        # 指定したテキストブロックをHTMLとして取得
+        target_html = document.block_html(target_block_name)
 
-        if target_block is None or not target_block.text:
+        if target_html is None:
             logger.warning(f"❌ {target_block_name} が見つかりませんでした: {xbrl_file}")
             return {}
 
-        # HTMLとして解析
-        target_html = html.fromstring(target_block.text)
-
         # 表のデータを取得
         tables = target_html.findall(".//table")
 
@@ -55,55 +222,46 @@ def extract_values_from_xbrl(xbrl_file:str, target_block_name:str, search_words_
 
         logger.info(f"✅ {len(tables)} 個の表が見つかりました: {target_block_name}")
 
-        # 結果を格納する辞書
-        extracted_values = {word: None for word in search_words_list}
+        # 結果を格納する辞書（期間ごと）
+        period_values = {period: {word: None for word in search_words_list} for period in periods}
+        extracted_values = period_values.setdefault(CURRENT_PERIOD, {word: None for word in search_words_list})
+        prior_periods = [(period, period_offset(period)) for period in periods if period != CURRENT_PERIOD]
+        matcher = compile_row_matcher(tuple(search_words_list))
+        pending = set(search_words_list)
+        units = _table_units(target_html, tables)
 
-        # すべての表を解析
+        # すべての表を解析（全ワードの値が取れた時点で打ち切る）
         for table_idx, table in enumerate(tables):
+            if not pending:
+                break
             try:
+                unit = units[table_idx]
                 rows = table.findall(".//tr")
                 for row_idx, row in enumerate(rows):
+                    if not pending:
+                        break
                     try:
                         cells = [cell.text_content().strip() for cell in row.findall(".//td")] + \
                                 [cell.text_content().strip() for cell in row.findall(".//th")]
-                        logger.debug(f"Table {table_idx}, Row {row_idx}: {cells}")  # デバッグ用
+                        logger.debug("Table %s, Row %s: %s", table_idx, row_idx, cells)  # デバッグ用
 
-                        if not cells:
+                        # 1行につき、値を取るべきワードは最大1つ
+                        match = matcher.match(cells, pending)
+                        if match is None:
                             continue
-
-                        # すべてのワードについて処理
-                        for word in search_words_list:
-                            if extracted_values[word] is not None:
-                                continue
-
-                            # 完全一致しない場合はスキップ
-                            if word in cells:
-                                index = cells.index(word)
-                                if index + 1 >= len(cells):
-                                    continue
-                                extracted_value = re.sub(r"^[^\x00-\x7F]+", "", cells[-1])
-                                extracted_value = re.sub(r"[^\d-]", "", extracted_value)
-                                if "△" in cells[-1]:
-                                    extracted_value = "-" + extracted_value
-                                extracted_values[word] = int(extracted_value) if extracted_value else None
-                                logger.info(f"✅ 完全一致で抽出: {word} = {extracted_values[word]}")
-                                break  # このrowで見つかったので次のrowへ
-
-                            # 部分一致
-                            found = False
-                            for i, cell in enumerate(cells):
-                                if word not in cell or i + 1 >= len(cells):
-                                    continue
-                                extracted_value = re.sub(r"^[^\x00-\x7F]+", "", cells[-1])
-                                extracted_value = re.sub(r"[^\d-]", "", extracted_value)
-                                if "△" in cells[-1]:
-                                    extracted_value = "-" + extracted_value
-                                extracted_values[word] = int(extracted_value) if extracted_value else None
-                                logger.info(f"✅ 部分一致で抽出: {word} = {extracted_values[word]}")
-                                found = True
-                                break
-                            if found:
-                                break  # このrowで見つかったので次のrowへ
+                        word, exact = match
+                        extracted_values[word] = _in_yen(parse_cell_value(cells[-1]), unit)
+                        if extracted_values[word] is not None:
+                            pending.discard(word)
+                        if prior_periods:
+                            label_index = _label_index(cells, word, exact)
+                            for period, offset in prior_periods:
+                                position = len(cells) - 1 - offset
+                                if position > label_index and "※" not in cells[position]:
+                                    value = _in_yen(parse_cell_value(cells[position]), unit)
+                                    if value is not None:
+                                        period_values[period][word] = value
+                        logger.info(f"✅ {'完全一致' if exact else '部分一致'}で抽出: {word} = {extracted_values[word]}")
 
                     except Exception as e:
                         logger.exception(f"行解析中にエラー: Table {table_idx}, Row {row_idx}")
@@ -113,7 +271,7 @@ def extract_values_from_xbrl(xbrl_file:str, target_block_name:str, search_words_
                 continue
 
         logger.info(f"✅ 抽出完了: {target_block_name} -> {extracted_values}")
-        return extracted_values
+        return period_values
         
     except etree.XMLSyntaxError as e:
         logger.exception(f"XBRL XMLパースエラー: {xbrl_file}")
@@ -123,6 +281,180 @@ def extract_values_from_xbrl(xbrl_file:str, target_block_name:str, search_words_
         return {}
 
 
+def _table_units(block_html, tables) -> list:
+    """
+    各表の値を円に換算する倍率。表の中の単位の表記、なければ表より前の最後の表記を使う。
+    どちらもなければ 1（円単位）。
+    """
+    positions = {id(table): index for index, table in enumerate(tables)}
+    units = [1] * len(tables)
+    current = None
+    for element in block_html.iter():
+        if not isinstance(element.tag, str):
+            continue
+        index = positions.get(id(element))
+        if index is not None:
+            current = unit_multiplier(element.text_content()) or current
+            units[index] = current or 1
+        elif element.tag != "table":
+            current = unit_multiplier(element.text) or unit_multiplier(element.tail) or current
+    return units
+
+
+def _in_yen(value, unit: int):
+    return None if value is None else value * unit
+
+
+def _label_index(cells: list[str], word: str, exact: bool) -> int:
+    """行のセルのうち、検索ワードのラベルのセルの位置"""
+    if exact:
+        return cells.index(word)
+    return next(index for index, cell in enumerate(cells[:-1]) if word in cell)
+
+
+def _iterparse_clearing(xbrl_file):
+    """
+    iterparse で要素を1つずつ返し、呼び出し側が読み終えた要素は順に破棄する。
+
+    文書全体の木を保持しないため、書類の大きさに関係なくメモリ使用量はほぼ一定。
+    呼び出し側がループを抜ければ、残りの読み込みも行わない。
+    """
+    if isinstance(xbrl_file, (bytes, bytearray)):
+        xbrl_file = io.BytesIO(xbrl_file)
+
+    for _, element in etree.iterparse(xbrl_file, events=("end",)):
+        if isinstance(element.tag, str):  # コメント・処理命令は対象外
+            yield element
+
+        # 読み終えた要素と、それより前の兄弟要素を破棄してメモリを解放する
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+
+def read_text_blocks(xbrl_file, block_names) -> dict:
+    """
+    指定したテキストブロックの中身だけをストリーミングで読み込む。
+
+    同名のブロックは文書順で最初のものを採用し、すべて見つかった時点で読み込みを打ち切る。
+
+    Returns:
+        Dict[str, str]: ブロック名 -> テキスト（HTML文字列）。見つからなかったブロックは含まない。
+    """
+    pending = set(block_names)
+    texts = {}
+    for element in _iterparse_clearing(xbrl_file):
+        local_name = element.tag.rsplit("}", 1)[-1]
+        if local_name in pending:
+            texts[local_name] = element.text
+            pending.discard(local_name)
+            if not pending:
+                break
+    return texts
+
+
+def build_fact_index(xbrl_file, element_ids: dict = None, context_priority: list[str] = None,
+                     periods: tuple = (CURRENT_PERIOD,)) -> dict:
+    """
+    XBRLインスタンス文書を iterparse で1回だけ走査し、タグ付きの値の索引を作る。
+
+    文書全体の木は作らず、読み終えた要素から順に破棄するため、
+    巨大なテキストブロックを含む書類でもメモリ使用量は小さいまま。
+
+    element_ids と context_priority を渡すと、対象の要素だけを索引に入れ、
+    すべての検索ワードで最優先の値（第一候補の要素IDの、同じ期間種別で最優先の
+    コンテキスト）が見つかった時点で読み込みを打ち切る。打ち切った場合も
+    extract_values_from_facts の結果は全体を読んだ場合と変わらない。
+    periods に前期以前を含めると、その期間の最優先の値も揃うまで読み込む。
+
+    Args:
+        xbrl_file (str | bytes): XBRLファイルのパス、またはメモリ上のXBRLの中身。
+        element_ids (Dict[str, List[str]]): 検索ワード -> 要素ID（優先順）。
+        context_priority (List[str]): 当期の採用するコンテキストID（優先順）。
+        periods (Tuple[str, ...]): 打ち切りの判定で値が揃うのを待つ期間。
+
+    Returns:
+        Dict[Tuple[str, str], str]: (要素ID, コンテキストID) -> 値 の辞書。
+            要素IDは "jppfs_cor:NetSales" のように接頭辞付き。
+    """
+    wanted = None
+    pending = {}
+    if element_ids is not None and context_priority:
+        wanted = {element_id for ids in element_ids.values() for element_id in ids}
+        # (第一候補の要素ID, 期間) -> その要素を待っている検索ワード
+        for word, ids in element_ids.items():
+            if ids:
+                for period in periods:
+                    pending.setdefault((ids[0], period), set()).add(word)
+
+    facts = {}
+    for element in _iterparse_clearing(xbrl_file):
+        context_ref = element.get("contextRef")
+        if context_ref is None or element.get(XSI_NIL) == "true":
+            continue
+        local_name = element.tag.rsplit("}", 1)[-1]
+        # テキストブロック（HTML）は値ではないので索引に含めない
+        if local_name.endswith("TextBlock"):
+            continue
+        element_id = f"{element.prefix}:{local_name}" if element.prefix else local_name
+        if wanted is not None and element_id not in wanted:
+            continue
+        facts.setdefault((element_id, context_ref), element.text)
+
+        key = (element_id, period_of(context_ref))
+        if key in pending and to_number(element.text) is not None:
+            best_context = _best_context(context_ref, period_contexts(context_priority, key[1]))
+            if best_context is not None and to_number(facts.get((element_id, best_context))) is not None:
+                del pending[key]
+                if not pending:
+                    break
+    return facts
+
+
+def _best_context(context_id: str, context_priority: list[str]):
+    """context_id と同じ期間種別（時点 / 期間）で最優先のコンテキストIDを返す"""
+    period_type = "Instant" if "Instant" in context_id else "Duration"
+    for candidate in context_priority:
+        if period_type in candidate:
+            return candidate
+    return None
+
+
+def extract_values_from_facts(fact_index: dict, element_ids: dict, context_priority: list[str],
+                              period: str = CURRENT_PERIOD) -> dict:
+    """
+    build_fact_index の索引から、検索ワードごとに指定した要素IDの値を取り出す。
+
+    period に前期以前（"Prior1Year" など）を渡すと、context_priority の
+    `CurrentYear` をその期間に置き換えたコンテキストIDで引く。
+
+    ラベルの部分一致は行わないため「営業利益」が「営業利益率」に一致するような誤抽出は起きない。
+
+    Args:
+        fact_index (dict): build_fact_index の戻り値。
+        element_ids (Dict[str, List[str]]): 検索ワード -> 要素ID（優先順）。
+        context_priority (List[str]): 当期の採用するコンテキストID（優先順）。
+        period (str): 取り出す期間。
+
+    Returns:
+        Dict[str, Optional[int | float]]: 検索ワードと値の辞書。見つからなければ None。
+    """
+    context_priority = period_contexts(context_priority, period)
+    extracted_values = {}
+    for word, ids in element_ids.items():
+        extracted_values[word] = None
+        for element_id in ids:
+            for context_id in context_priority:
+                value = to_number(fact_index.get((element_id, context_id)))
+                if value is not None:
+                    extracted_values[word] = value
+                    break
+            if extracted_values[word] is not None:
+                break
+    logger.info(f"✅ タグ付きの値から抽出完了（{period}）: {extracted_values}")
+    return extracted_values
+
+
 if __name__ == "__main__":
     # XBRLファイルのパス
     dir = os.path.dirname(os.path.abspath(__file__))
@@ -131,8 +463,10 @@ if __name__ == "__main__":
     search_words = ["発行株式数", "売上高", "当期純利益又は当期純損失", "期末剰余金又は期末欠損金"]
     # 抽出対象のテキストブロック名
     block_name = "StatementOfIncomeAndRetainedEarningsTextBlock"  # 例: 損益計算書
+    # XBRLを1回だけパースし、以降の抽出はすべてこれを使う
+    xbrl_document = XbrlDocument(xbrl_path)
     # XBRLからデータを取得
-    extracted_data = extract_values_from_xbrl(xbrl_path, block_name, search_words)    
+    extracted_data = extract_values_from_xbrl(xbrl_document, block_name, search_words)    
     # 結果を表示
     print(f"✅ {block_name} からの抽出結果:")
     print(extracted_data)
@@ -140,14 +474,14 @@ if __name__ == "__main__":
     log_long_msg("次👇")
     search_words = ["純資産合計","負債純資産合計"]
     block_name = "BalanceSheetTextBlock"
-    extracted_data = extract_values_from_xbrl(xbrl_path, block_name, search_words)    
+    extracted_data = extract_values_from_xbrl(xbrl_document, block_name, search_words)    
     print(f"✅ {block_name} からの抽出結果:")
     print(extracted_data)
 
     log_long_msg("次👇")
     search_words = ["当中間会計期間末株式数","配当金の総額","1株当たり配当額",]
     block_name = "NotesFinancialInformationOfInvestmentTrustManagementCompanyEtcTextBlock"
-    extracted_data = extract_values_from_xbrl(xbrl_path, block_name, search_words)    
+    extracted_data = extract_values_from_xbrl(xbrl_document, block_name, search_words)    
     print(f"✅ {block_name} からの抽出結果:")
     print(extracted_data)
 
@@ -0,0 +1,45 @@
+"""
+Shared fixtures built from the synthetic corpus in bench/corpus.py
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.corpus import make_document_list
+from module.fetch_edinet_documents import _parse_documents
+
+
+@pytest.fixture
+def isolated_run(tmp_path, monkeypatch):
+    """edinet_processer._run の出力先・台帳・時系列を一時フォルダにして、モジュールを返す"""
+    import edinet_processer as processer
+    from module.config import config
+    from module.ledger import ProcessingLedger
+    from module.timeseries import TimeSeriesStore
+
+    for key in ("json_folder", "md_folder", "output_folder", "metrics_folder"):
+        monkeypatch.setitem(config, key, tmp_path / key)
+        (tmp_path / key).mkdir()
+    monkeypatch.setitem(config, "output_sinks", [])
+    monkeypatch.setitem(config, "metrics_enabled", False)
+    monkeypatch.setitem(config, "resume_runs", True)
+    monkeypatch.setitem(config, "max_parse_workers", 0)
+    monkeypatch.setattr(processer, "ledger", ProcessingLedger(tmp_path / "ledger.sqlite3"))
+    monkeypatch.setattr(processer, "timeseries", TimeSeriesStore(tmp_path / "timeseries.sqlite3"))
+    monkeypatch.setattr(processer, "preload_parsers", lambda: None)
+    return processer
+
+
+@pytest.fixture
+def document_list():
+    """書類一覧APIのレスポンス（10件、ファンドなし）"""
+    return make_document_list("2024-06-27", docs=10, fund_ratio=0.0, seed=1)
+
+
+@pytest.fixture
+def documents(document_list):
+    """fetch_edinet_documents と同じ形式の書類の辞書"""
+    return _parse_documents(document_list)
@@ -0,0 +1,101 @@
+"""
+Disk LRU cache of filing archives: eviction order, integrity checks and files that cannot be removed yet
+"""
+from pathlib import Path
+
+from module.archive_cache import ArchiveCache
+
+def _archive(marker: bytes) -> bytes:
+    return marker * 100
+
+
+def _cached_ids(folder: Path):
+    return sorted(path.name.split("-", 1)[0] for path in folder.glob("*.zip"))
+
+
+def _read(cache: ArchiveCache, doc_id: str):
+    archive = cache.get(doc_id)
+    if archive is None:
+        return None
+    with archive:
+        return archive.read()
+
+
+def test_least_recently_used_archive_is_evicted_first(tmp_path):
+    cache = ArchiveCache(tmp_path, max_bytes=250)
+    cache.put("S1", _archive(b"1"))
+    cache.put("S2", _archive(b"2"))
+
+    assert _read(cache, "S1") == _archive(b"1")
+    cache.put("S3", _archive(b"3"))
+
+    assert _cached_ids(tmp_path) == ["S1", "S3"]
+    assert _read(cache, "S2") is None
+    assert _read(cache, "S3") == _archive(b"3")
+
+
+def test_eviction_order_survives_a_restart(tmp_path):
+    cache = ArchiveCache(tmp_path, max_bytes=250)
+    cache.put("S1", _archive(b"1"))
+    cache.put("S2", _archive(b"2"))
+    _read(cache, "S1")
+
+    reopened = ArchiveCache(tmp_path, max_bytes=250)
+    reopened.put("S3", _archive(b"3"))
+
+    assert _cached_ids(tmp_path) == ["S1", "S3"]
+
+
+def test_corrupt_archive_is_discarded_and_not_counted(tmp_path):
+    cache = ArchiveCache(tmp_path, max_bytes=300)
+    cache.put("S1", _archive(b"1"))
+    cache.put("S2", _archive(b"2"))
+    path = next(tmp_path.glob("S1-*.zip"))
+    path.write_bytes(_archive(b"x"))
+
+    assert _read(cache, "S1") is None
+    assert not path.exists()
+
+    # 破棄した分は合計サイズから除かれ、上限内の2件は削除されずに残る
+    cache.put("S3", _archive(b"3"))
+    cache.put("S4", _archive(b"4"))
+    assert _cached_ids(tmp_path) == ["S2", "S3", "S4"]
+
+
+def test_putting_the_same_content_keeps_the_open_file(tmp_path):
+    cache = ArchiveCache(tmp_path, max_bytes=1000)
+    cache.put("S1", _archive(b"1"))
+
+    with cache.get("S1") as archive:
+        cache.put("S1", _archive(b"1"))
+        assert archive.read() == _archive(b"1")
+
+    assert len(list(tmp_path.glob("S1-*.zip"))) == 1
+    assert _read(cache, "S1") == _archive(b"1")
+
+
+def test_file_that_cannot_be_removed_is_removed_on_a_later_put(tmp_path, monkeypatch):
+    cache = ArchiveCache(tmp_path, max_bytes=250)
+    cache.put("S1", _archive(b"1"))
+    cache.put("S2", _archive(b"2"))
+    locked = next(tmp_path.glob("S1-*.zip"))
+    unlink = Path.unlink
+
+    def unlink_unless_locked(path, *args, **kwargs):
+        # Windows でほかのスレッドが開いているファイルの削除と同じ失敗
+        if path == locked:
+            raise PermissionError(13, "The process cannot access the file", str(path))
+        return unlink(path, *args, **kwargs)
+
+    monkeypatch.setattr(Path, "unlink", unlink_unless_locked)
+    cache.put("S3", _archive(b"3"))
+
+    # 削除できなかったS1は索引から外れるが、ほかのエントリは巻き込まれない
+    assert _cached_ids(tmp_path) == ["S1", "S2", "S3"]
+    assert _read(cache, "S1") is None
+
+    monkeypatch.setattr(Path, "unlink", unlink)
+    cache.put("S4", _archive(b"4"))
+
+    assert not locked.exists()
+    assert _cached_ids(tmp_path) == ["S3", "S4"]
@@ -0,0 +1,79 @@
+"""
+Metadata prefilter applied to the document list before any download
+"""
+from itertools import islice
+
+import pytest
+
+from bench.corpus import make_document_list
+from module.document_filter import (REASON_FORM, REASON_FUND, REASON_NO_XBRL, REASON_ORDINANCE, REASON_SKIP_WORD,
+                                    REASON_WITHDRAWN, DocumentFilter)
+from module.fetch_edinet_documents import _parse_documents
+
+TARGET = {"企業名": "ベンチマーク工業株式会社", "fundCode": None, "xbrlFlag": "1", "withdrawalStatus": "0",
+          "ordinanceCode": "010", "formCode": "030000"}
+
+
+def _filter(**kwargs):
+    options = {"skip_words": ["投資法人", "(株)"], "ordinance_codes": ["010"], "form_codes": ["030000"]}
+    options.update(kwargs)
+    return DocumentFilter(**options)
+
+
+@pytest.mark.parametrize("changes, reason", [
+    ({}, None),
+    ({"fundCode": "G00001"}, REASON_FUND),
+    ({"企業名": "日本ビル投資法人"}, REASON_SKIP_WORD),
+    ({"企業名": "サンプル(株)"}, REASON_SKIP_WORD),
+    ({"企業名": "サンプル株式会社"}, None),
+    ({"xbrlFlag": "0"}, REASON_NO_XBRL),
+    ({"withdrawalStatus": "1"}, REASON_WITHDRAWN),
+    ({"ordinanceCode": "030"}, REASON_ORDINANCE),
+    ({"formCode": "043000"}, REASON_FORM),
+    ({"fundCode": "G00001", "企業名": "日本ビル投資法人", "xbrlFlag": "0"}, REASON_FUND),
+    ({"企業名": "日本ビル投資法人", "withdrawalStatus": "1"}, REASON_SKIP_WORD),
+])
+def test_skip_reason_is_the_first_matching_rule(changes, reason):
+    assert _filter().skip_reason({**TARGET, **changes}) == reason
+
+
+def test_disabled_rules_and_missing_keys_do_not_skip():
+    doc = {**TARGET, "xbrlFlag": "0", "withdrawalStatus": "1", "ordinanceCode": "030", "formCode": "043000"}
+
+    assert DocumentFilter(require_xbrl=False, skip_withdrawn=False).skip_reason(doc) is None
+    assert _filter().skip_reason({"企業名": "古いレスポンス株式会社"}) is None
+    assert DocumentFilter(skip_words=["", None]).skip_reason(TARGET) is None
+
+
+def test_filer_name_is_used_when_the_company_name_is_missing():
+    doc = {key: value for key, value in TARGET.items() if key != "企業名"}
+
+    assert _filter().skip_reason({**doc, "filerName": "日本ビル投資法人"}) == REASON_SKIP_WORD
+
+
+def test_targets_are_read_lazily_and_skips_counted_up_to_the_limit():
+    docs = [{**TARGET, "企業名": f"会社{index}", "xbrlFlag": "0" if index % 2 else "1"} for index in range(10)]
+    read = []
+
+    def listed():
+        for doc in docs:
+            read.append(doc["企業名"])
+            yield doc
+
+    skipped = {}
+    targets = list(islice(_filter().iter_targets(listed(), skipped), 2))
+
+    assert [doc["企業名"] for doc in targets] == ["会社0", "会社2"]
+    assert read == ["会社0", "会社1", "会社2"]
+    assert skipped == {REASON_NO_XBRL: 1}
+
+
+def test_corpus_funds_are_the_only_skipped_documents():
+    documents = _parse_documents(make_document_list("2024-06-27", docs=50, fund_ratio=0.2, seed=3))
+    skipped = {}
+
+    targets = list(DocumentFilter().iter_targets(documents, skipped))
+
+    assert len(targets) + skipped.get(REASON_FUND, 0) == len(documents)
+    assert set(skipped) == {REASON_FUND}
+    assert all(doc["fundCode"] is None for doc in targets)
@@ -0,0 +1,58 @@
+"""
+Compressed, de-duplicated document list versions and the closed-day lookup
+"""
+import json
+
+from bench.corpus import make_document_list
+from module.document_index import DocumentListIndex, content_hash
+
+
+def test_identical_content_is_stored_once(tmp_path, document_list):
+    index = DocumentListIndex(tmp_path / "document_lists.sqlite3")
+    refetched = dict(document_list, metadata=dict(document_list["metadata"], processDateTime="2024-06-28 10:00"))
+
+    assert index.archive("2024-06-27", document_list, fetched_at="2024-06-27T12:00:00") is True
+    assert index.archive("2024-06-27", refetched, fetched_at="2024-06-28T09:00:00") is False
+
+    versions = index.archived_versions("2024-06-27")
+    assert versions == [("2024-06-27", content_hash(document_list), "2024-06-27T12:00:00", 10)]
+
+
+def test_closed_day_uses_the_latest_confirmed_version(tmp_path, document_list):
+    index = DocumentListIndex(tmp_path / "document_lists.sqlite3")
+
+    index.archive("2024-06-27", document_list, fetched_at="2024-06-27T12:00:00")
+    assert index.get("2024-06-27") is None  # 当日に取得した一覧はまだ増える可能性がある
+
+    index.archive("2024-06-27", document_list, fetched_at="2024-06-28T09:00:00")
+    assert index.get("2024-06-27") == document_list
+
+    # 締まった後に内容が変わった場合は、新しい版を返す
+    changed = make_document_list("2024-06-27", docs=11, fund_ratio=0.0, seed=1)
+    assert index.archive("2024-06-27", changed, fetched_at="2024-06-29T09:00:00") is True
+    assert index.get("2024-06-27") == changed
+    assert len(index.archived_versions("2024-06-27")) == 2
+
+
+def test_load_archived_by_hash_and_keep_versions(tmp_path, document_list):
+    index = DocumentListIndex(tmp_path / "document_lists.sqlite3")
+    changed = make_document_list("2024-06-27", docs=11, fund_ratio=0.0, seed=1)
+    index.archive("2024-06-27", document_list, fetched_at="2024-06-27T12:00:00")
+    index.archive("2024-06-27", changed, fetched_at="2024-06-28T12:00:00")
+
+    assert index.load_archived("2024-06-27") == changed
+    assert index.load_archived("2024-06-27", content_hash(document_list)) == document_list
+    assert index.load_archived("2024-06-26") is None
+
+    index.archive("2024-06-27", document_list, fetched_at="2024-06-29T12:00:00", keep_versions=False)
+    assert [version[1] for version in index.archived_versions()] == [content_hash(document_list)]
+
+
+def test_import_files(tmp_path, document_list):
+    index = DocumentListIndex(tmp_path / "document_lists.sqlite3")
+    path = tmp_path / "edinet_documents_2024-06-27_20240628_090000.json"
+    path.write_text(json.dumps(document_list, ensure_ascii=False), encoding="utf-8")
+
+    assert index.import_files([path, path]) == 1
+    assert index.archived_versions() == [("2024-06-27", content_hash(document_list), "2024-06-28T09:00:00", 10)]
+    assert index.get("2024-06-27") == document_list
@@ -0,0 +1,151 @@
+"""
+Shared EDINET client: one retry budget for requests and downloads, and the token bucket
+"""
+import io
+
+import pytest
+import requests
+
+from module import edinet_client
+from module.edinet_client import EdinetClient, TokenBucket
+
+
+class BrokenBody(io.RawIOBase):
+    """読み込みの途中で接続が切れる本文"""
+
+    def read(self, size=-1):
+        raise requests.exceptions.ChunkedEncodingError("connection broken")
+
+
+def _response(status_code, body=b""):
+    response = requests.Response()
+    response.status_code = status_code
+    response.raw = body if isinstance(body, io.IOBase) else io.BytesIO(body)
+    response.url = "https://example.com/doc"
+    return response
+
+
+class ScriptedSession:
+    """session.get の結果を順に返す（例外なら送出する）"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def get(self, url, **kwargs):
+        outcome = self.outcomes[min(self.calls, len(self.outcomes) - 1)]
+        self.calls += 1
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome() if callable(outcome) else outcome
+
+
+def _client(session, max_retries=3):
+    client = EdinetClient(requests_per_second=0, max_retries=max_retries, backoff_base=0)
+    client.session = session
+    return client
+
+
+def test_get_retries_retryable_statuses_then_returns_the_response():
+    session = ScriptedSession(lambda: _response(503), lambda: _response(200, b"ok"))
+
+    response = _client(session).get("https://example.com/doc")
+
+    assert response.status_code == 200
+    assert session.calls == 2
+
+
+def test_get_returns_the_last_response_when_retries_run_out():
+    session = ScriptedSession(lambda: _response(429))
+
+    response = _client(session, max_retries=2).get("https://example.com/doc")
+
+    assert response.status_code == 429
+    assert session.calls == 3
+
+
+def test_download_retries_a_broken_body_from_the_start():
+    session = ScriptedSession(lambda: _response(200, BrokenBody()), lambda: _response(200, b"PK\x05\x06"))
+
+    with _client(session).download("https://example.com/doc") as archive:
+        assert archive.read() == b"PK\x05\x06"
+    assert session.calls == 2
+
+
+def test_download_shares_one_retry_budget_between_connecting_and_reading():
+    session = ScriptedSession(
+        requests.exceptions.ConnectionError("refused"), lambda: _response(200, BrokenBody()),
+        requests.exceptions.Timeout("timed out"), lambda: _response(200, BrokenBody()),
+        lambda: _response(200, BrokenBody()),
+    )
+
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        _client(session, max_retries=3).download("https://example.com/doc")
+    assert session.calls == 4
+
+
+def test_download_raises_http_errors_after_the_retries():
+    session = ScriptedSession(lambda: _response(500))
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        _client(session, max_retries=2).download("https://example.com/doc")
+    assert session.calls == 3
+
+
+def test_negative_max_retries_still_sends_one_request():
+    session = ScriptedSession(lambda: _response(503))
+
+    response = _client(session, max_retries=-1).get("https://example.com/doc")
+
+    assert response.status_code == 503
+    assert session.calls == 1
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """time.monotonic / time.sleep を、sleep した分だけ進む時計に置き換える"""
+    now = [100.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(edinet_client.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(edinet_client.time, "sleep", sleep)
+    return now, sleeps
+
+
+def test_token_bucket_allows_a_burst_then_paces_requests(clock):
+    now, sleeps = clock
+    bucket = TokenBucket(rate=4, capacity=2)
+
+    for _ in range(4):
+        bucket.acquire()
+
+    assert sleeps == [pytest.approx(0.25), pytest.approx(0.25)]
+    assert now[0] == pytest.approx(100.5)
+
+
+def test_token_bucket_refills_while_idle_up_to_its_capacity(clock):
+    now, sleeps = clock
+    bucket = TokenBucket(rate=4, capacity=2)
+    bucket.acquire()
+    bucket.acquire()
+
+    now[0] += 60
+    bucket.acquire()
+    bucket.acquire()
+    bucket.acquire()
+
+    assert sleeps == [pytest.approx(0.25)]
+
+
+def test_token_bucket_without_rate_never_waits(clock):
+    _, sleeps = clock
+    bucket = TokenBucket(rate=0)
+
+    for _ in range(100):
+        bucket.acquire()
+
+    assert sleeps == []
@@ -0,0 +1,77 @@
+"""
+Lazy, bounded date-range listing of EDINET documents
+"""
+import threading
+import time
+from itertools import islice
+
+import pytest
+
+import module.fetch_edinet_documents as fetch_module
+from bench.corpus import make_document_list
+from module.document_index import DocumentListIndex
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, json_data):
+        self._json_data = json_data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._json_data
+
+
+class FakeClient:
+    """documents.json への要求を数える EdinetClient の代わり"""
+
+    def __init__(self, docs_per_day=5):
+        self.docs_per_day = docs_per_day
+        self.dates = []
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, **kwargs):
+        with self._lock:
+            self.dates.append(params["date"])
+        time.sleep(0.01)
+        return FakeResponse(make_document_list(params["date"], docs=self.docs_per_day, fund_ratio=0.0))
+
+
+@pytest.fixture
+def list_client(tmp_path, monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(fetch_module, "shared_client", lambda: client)
+    monkeypatch.setattr(fetch_module, "document_index", DocumentListIndex(tmp_path / "document_lists.sqlite3"))
+    return client
+
+
+def test_range_yields_every_day_in_order(list_client):
+    documents = list(fetch_module.fetch_edinet_documents_range("2024-06-01", "2024-06-03", max_workers=2))
+
+    assert sorted(list_client.dates) == ["2024-06-01", "2024-06-02", "2024-06-03"]
+    assert [doc["書類ID"][:7] for doc in documents] == ["S240601"] * 5 + ["S240602"] * 5 + ["S240603"] * 5
+
+
+def test_range_fetches_only_a_bounded_window_ahead(list_client):
+    stream = fetch_module.fetch_edinet_documents_range("2024-06-01", "2024-06-30", max_workers=2)
+
+    taken = list(islice(stream, 2))
+    stream.close()
+    time.sleep(0.1)  # 取り消されなかった取得があれば、ここで要求が増える
+
+    assert len(taken) == 2
+    assert len(list_client.dates) <= 3
+
+
+def test_run_stops_listing_once_the_limit_is_reached(isolated_run, list_client, monkeypatch):
+    processer = isolated_run
+    monkeypatch.setitem(processer.config, "max_download_workers", 2)
+    monkeypatch.setattr(processer, "fetch_xbrl", lambda doc: None)
+
+    processer._run(3, "2024-06-01", "2024-06-30", metrics=None)
+    time.sleep(0.1)
+
+    assert len(list_client.dates) <= 3
@@ -0,0 +1,65 @@
+"""
+Resuming a run from the per-docID processing ledger
+"""
+from module.ledger import ProcessingLedger
+from module.records import FilingRecord
+
+
+def test_completed_rows_returns_only_done_documents(tmp_path, documents):
+    ledger = ProcessingLedger(tmp_path / "ledger.sqlite3")
+    done, failed, retried = documents[:3]
+    ledger.record(done, FilingRecord.from_row(done, {"売上高": 100}))
+    ledger.record(failed, None)
+    ledger.record(retried, None)
+    ledger.record(retried, FilingRecord.from_row(retried, {"売上高": 200}))
+
+    rows = ledger.completed_rows(doc["書類ID"] for doc in documents)
+
+    assert rows.keys() == {done["書類ID"], retried["書類ID"]}
+    assert rows[retried["書類ID"]].get("売上高") == 200
+
+
+def test_periods_survive_the_ledger(tmp_path, documents):
+    ledger = ProcessingLedger(tmp_path / "ledger.sqlite3")
+    record = FilingRecord.from_row(documents[0], {"売上高": 100})
+    record.periods = {"Prior1Year": {"売上高": 90}}
+    ledger.record(documents[0], record)
+
+    restored = ledger.completed_rows([documents[0]["書類ID"]])[documents[0]["書類ID"]]
+
+    assert restored.periods == {"Prior1Year": {"売上高": 90}}
+
+
+def test_resume_skips_completed_documents(isolated_run, documents, monkeypatch):
+    processer = isolated_run
+    ledger = processer.ledger
+    completed, failed = documents[:2], documents[2:4]
+    for doc in completed:
+        ledger.record(doc, FilingRecord.from_row(doc, {"売上高": 100, "営業利益": 10}))
+    for doc in failed:
+        ledger.record(doc, None)
+
+    fetched = []
+    lookups = []
+
+    def fetch_xbrl(doc):
+        fetched.append(doc["書類ID"])
+        return None  # ダウンロードに失敗した扱い（台帳には失敗として記録される）
+
+    def completed_rows(doc_ids):
+        doc_ids = list(doc_ids)
+        lookups.append(doc_ids)
+        return ProcessingLedger.completed_rows(ledger, doc_ids)
+
+    monkeypatch.setattr(processer, "fetch_edinet_documents", lambda date, key: list(documents))
+    monkeypatch.setattr(processer, "fetch_xbrl", fetch_xbrl)
+    monkeypatch.setattr(ledger, "completed_rows", completed_rows)
+
+    final_data = processer._run(len(documents), "2024-06-27", None, metrics=None)
+
+    assert fetched == [doc["書類ID"] for doc in documents[2:]]
+    assert lookups == [[doc["書類ID"] for doc in documents]]
+    assert [row.get("書類ID") for row in final_data] == [doc["書類ID"] for doc in completed]
+    assert final_data[0].get("営業利益率") == 10.0
+    assert ProcessingLedger.completed_rows(ledger, [doc["書類ID"] for doc in documents]).keys() == \
+        {doc["書類ID"] for doc in completed}
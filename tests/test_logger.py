@@ -0,0 +1,57 @@
+"""
+Log file ownership between the main process and parse workers
+"""
+import json
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# setup_logger はプロセスごとに1回しか設定しないため、別プロセスで確かめる
+SCRIPT = textwrap.dedent("""
+    import json
+    import multiprocessing
+    import os
+    import sys
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+
+    from module.logger import LineBoundedFileHandler, log_owner_pid, logger, setup_logger
+
+
+    def describe():
+        handlers = [handler for handler in logger.handlers if isinstance(handler, LineBoundedFileHandler)]
+        return {
+            "pid": os.getpid(),
+            "owner_pid": handlers[0]._owner_pid,
+            "env": {key: value for key, value in os.environ.items() if key.startswith("EDINET_LOG")},
+        }
+
+
+    if __name__ == "__main__":
+        setup_logger(log_file=sys.argv[1], use_queue=False)
+        context = multiprocessing.get_context("spawn")
+        initializer = partial(setup_logger, log_file=sys.argv[1], owner_pid=log_owner_pid())
+        with ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=initializer) as pool:
+            worker = pool.submit(describe).result()
+        print(json.dumps({"main": describe(), "worker": worker}))
+""")
+
+
+def test_spawned_worker_leaves_trimming_to_the_main_process(tmp_path):
+    script = tmp_path / "owner.py"
+    script.write_text(SCRIPT, encoding="utf-8")
+
+    completed = subprocess.run(
+        [sys.executable, str(script), str(tmp_path / "log.txt")],
+        cwd=ROOT, env={"PYTHONPATH": str(ROOT), "PATH": ""}, capture_output=True, text=True, timeout=60,
+    )
+    assert completed.returncode == 0, completed.stderr
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    assert result["main"]["owner_pid"] == result["main"]["pid"]
+    assert result["worker"]["owner_pid"] == result["main"]["pid"] != result["worker"]["pid"]
+    # 環境変数で伝えないため、ワーカーから起動したプロセスに古いPIDが漏れない
+    assert result["main"]["env"] == {} and result["worker"]["env"] == {}
@@ -0,0 +1,43 @@
+"""
+Period labels and period ends for prior-period values
+"""
+import pytest
+
+from module.periods import extraction_periods, period_contexts, period_end, period_of, period_offset
+
+
+def test_extraction_periods():
+    assert extraction_periods(0) == ["CurrentYear"]
+    assert extraction_periods(2) == ["CurrentYear", "Prior1Year", "Prior2Year"]
+
+
+@pytest.mark.parametrize("context_id, period", [
+    ("CurrentYearInstant", "CurrentYear"),
+    ("Prior1YearDuration_NonConsolidatedMember", "Prior1Year"),
+    ("Prior12YearInstant", "Prior12Year"),
+    ("FilingDateInstant", None),
+])
+def test_period_of(context_id, period):
+    assert period_of(context_id) == period
+
+
+def test_period_offset_and_contexts():
+    assert period_offset("CurrentYear") == 0
+    assert period_offset("Prior3Year") == 3
+    assert period_contexts(["CurrentYearInstant", "CurrentYearDuration"], "Prior1Year") == \
+        ["Prior1YearInstant", "Prior1YearDuration"]
+
+
+@pytest.mark.parametrize("current_end, period, expected", [
+    ("2024-03-31", "CurrentYear", "2024-03-31"),
+    ("2024-03-31", "Prior1Year", "2023-03-31"),
+    ("2024-02-29", "Prior1Year", "2023-02-28"),
+    ("2023-02-28", "Prior1Year", "2022-02-28"),
+    ("2025-02-28", "Prior1Year", "2024-02-29"),
+    ("2024-12-20", "Prior2Year", "2022-12-20"),
+    ("2024-03-31 00:00", "Prior1Year", "2023-03-31"),
+    (None, "Prior1Year", None),
+    ("不明", "Prior1Year", None),
+])
+def test_period_end(current_end, period, expected):
+    assert period_end(current_end, period) == expected
@@ -0,0 +1,61 @@
+"""
+Download -> parse pipeline and the XBRL fallback for unusable CSV
+"""
+from bench.corpus import make_csv_archive, make_xbrl
+from module.financials import analyze_filing
+from module.pipeline import Fallback, run_pipeline
+from module.xbrl_archive import CsvMember, XbrlMember, read_csv_member
+
+
+def _analyze(item, payload):
+    if payload == "csv":
+        return Fallback("csv")
+    return f"{item}:{payload}"
+
+
+def test_fallback_payload_is_analyzed_in_place_of_the_first():
+    fetched_again = []
+
+    def fallback(item):
+        fetched_again.append(item)
+        return None if item == "c" else "xbrl"
+
+    results = run_pipeline(
+        ["a", "b", "c"], fetch=lambda item: "xbrl" if item == "a" else "csv", analyze=_analyze, fallback=fallback,
+    )
+
+    assert results == ["a:xbrl", "b:xbrl", None]
+    assert fetched_again == ["b", "c"]
+
+
+def test_fallback_result_without_fallback_fails_the_item():
+    recorded = []
+
+    results = run_pipeline(["a"], fetch=lambda item: "csv", analyze=_analyze,
+                           on_result=lambda item, result: recorded.append((item, result)))
+
+    assert results == [None]
+    assert recorded == [("a", None)]
+
+
+def _csv_without_facts(doc):
+    """要素は載っているが当期の値がないCSV（前期の行だけを残す）"""
+    member = read_csv_member(make_csv_archive(doc), [doc["EDINETコード"]])
+    lines = member.data.decode("utf-16").split("\n")
+    kept = [line for line in lines if "CurrentYear" not in line]
+    return CsvMember(member.name, "\n".join(kept).encode("utf-16"))
+
+
+def test_csv_without_current_values_falls_back_to_xbrl(documents):
+    doc = documents[0]
+    csv_member = _csv_without_facts(doc)
+    xbrl_member = XbrlMember("XBRL/PublicDoc/filing.xbrl", make_xbrl(doc, xbrl_bytes=20_000))
+
+    assert isinstance(analyze_filing(doc, csv_member), Fallback)
+
+    results = run_pipeline([doc], fetch=lambda doc: csv_member, analyze=analyze_filing,
+                           fallback=lambda doc: xbrl_member)
+
+    assert results[0] is not None
+    assert results[0].get("書類ID") == doc["書類ID"]
+    assert results[0].get("売上高") not in (None, "")
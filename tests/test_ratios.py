@@ -0,0 +1,84 @@
+"""
+Declarative ratios compared with the former per-filing formulas
+"""
+import pytest
+
+from module.ratios import apply_ratios
+from module.records import FilingRecord
+
+
+def legacy_ratios(financial_data):
+    """apply_ratios 導入前の calculate_financial_ratios（通常企業の営業利益率と自己資本比率）"""
+    ratios = {"営業利益率": "", "自己資本比率": ""}
+    for name, numerator, denominator in (("営業利益率", "営業利益", "売上高"),
+                                         ("自己資本比率", "純資産合計", "負債純資産合計")):
+        try:
+            if financial_data.get(numerator) is not None and financial_data.get(denominator) is not None:
+                ratios[name] = round(float(financial_data[numerator]) / float(financial_data[denominator]) * 100, 2)
+        except Exception:
+            pass
+    return ratios
+
+
+FILINGS = [
+    {"売上高": 822_376_000_000, "営業利益": 51_000_000_000, "純資産合計": 300, "負債純資産合計": 900},
+    {"売上高": 1_000, "営業利益": -250, "純資産合計": -10, "負債純資産合計": 40},
+    {"売上高": 3, "営業利益": 1, "純資産合計": 2, "負債純資産合計": 3},
+    {"売上高": None, "営業利益": 10, "純資産合計": 5, "負債純資産合計": None},
+    {"売上高": 0, "営業利益": 10, "純資産合計": 5, "負債純資産合計": 0},
+    {"営業利益": 10},
+    {},
+]
+
+
+def test_declarative_ratios_equal_legacy_formulas():
+    records = [FilingRecord.from_row({"書類ID": f"S{index}"}, filing) for index, filing in enumerate(FILINGS)]
+
+    apply_ratios(records)
+
+    for record, filing in zip(records, FILINGS):
+        for name, expected in legacy_ratios(filing).items():
+            if expected == "":
+                assert record.get(name) == ""
+            else:
+                assert record.get(name) == pytest.approx(expected)
+
+
+def test_growth_uses_prior_period_of_the_same_filing():
+    record = FilingRecord.from_row({"書類ID": "S1", "売上高": 120})
+    record.periods = {"Prior1Year": {"売上高": -100}}
+
+    apply_ratios([record], formulas=[{"name": "売上高成長率", "growth": "売上高", "scale": 100, "round": 2}])
+
+    assert record.get("売上高成長率") == 220.0
+
+
+def test_filer_types_limit_a_formula_to_matching_filers():
+    company = FilingRecord.from_row({"書類ID": "S1", "営業利益": 10, "売上高": 100})
+    fund = FilingRecord.from_row({"書類ID": "S2", "fundコード": "G00001", "営業利益": 10, "売上高": 100})
+    formulas = [
+        {"name": "営業利益率", "numerator": "営業利益", "denominator": "売上高", "scale": 100,
+         "filer_types": ["regular_company"]},
+        {"name": "自己資本比率", "numerator": "営業利益", "denominator": "売上高", "filer_types": ["fund"]},
+    ]
+
+    computed = apply_ratios([company, fund], formulas=formulas)
+
+    assert computed == {"営業利益率": 1, "自己資本比率": 1}
+    assert (company.get("営業利益率"), fund.get("営業利益率")) == (10.0, "")
+    assert (company.get("自己資本比率"), fund.get("自己資本比率")) == ("", 0.1)
+
+
+def test_later_formula_wins_only_where_it_applies():
+    company = FilingRecord.from_row({"書類ID": "S1", "営業利益": 10, "売上高": 100, "純資産合計": 1, "負債純資産合計": 4})
+    fund = FilingRecord.from_row({"書類ID": "S2", "fundコード": "G00001", "営業利益": 10, "売上高": 100,
+                                  "純資産合計": 1, "負債純資産合計": 4})
+    formulas = [
+        {"name": "営業利益率", "numerator": "純資産合計", "denominator": "負債純資産合計", "scale": 100},
+        {"name": "営業利益率", "numerator": "営業利益", "denominator": "売上高", "scale": 100,
+         "filer_types": ["regular_company"]},
+    ]
+
+    apply_ratios([company, fund], formulas=formulas)
+
+    assert (company.get("営業利益率"), fund.get("営業利益率")) == (10.0, 25.0)
@@ -0,0 +1,140 @@
+"""
+Diff-based Google Sheets writer against an in-memory spreadsheet
+"""
+from module.records import FilingRecord
+from module.sheets_writer import SHEET_COLUMNS, a1_range, write_rows
+
+
+class FakeSpreadsheet:
+    """fetch_sheet_metadata / values_get / batch_update だけを持つ、メモリ上のスプレッドシート"""
+
+    def __init__(self):
+        self.sheets = {}  # title -> {"properties": ..., "cells": {(row, col): value}}
+        self.ranges = []
+        self.batches = []
+
+    def fetch_sheet_metadata(self):
+        return {"sheets": [{"properties": sheet["properties"]} for sheet in self.sheets.values()]}
+
+    def values_get(self, range_name, params=None):
+        self.ranges.append(range_name)
+        title = range_name.rsplit("!", 1)[0][1:-1].replace("''", "'")
+        return {"values": self.values(title)}
+
+    def values(self, title):
+        cells = self.sheets[title]["cells"]
+        if not cells:
+            return []
+        rows = []
+        for row in range(max(r for r, _ in cells) + 1):
+            values = [cells.get((row, col), "") for col in range(max(c for _, c in cells) + 1)]
+            while values and values[-1] == "":
+                values.pop()
+            rows.append(values)
+        return rows
+
+    def batch_update(self, body):
+        self.batches.append(body["requests"])
+        for request in body["requests"]:
+            if "addSheet" in request:
+                properties = request["addSheet"]["properties"]
+                self.sheets[properties["title"]] = {"properties": properties, "cells": {}}
+            elif "updateCells" in request:
+                self._update_cells(request["updateCells"])
+
+    def _sheet(self, sheet_id):
+        return next(sheet for sheet in self.sheets.values() if sheet["properties"]["sheetId"] == sheet_id)
+
+    def _update_cells(self, update):
+        if "rows" not in update:
+            self._sheet(update["range"]["sheetId"])["cells"].clear()
+            return
+        start = update["start"]
+        cells = self._sheet(start["sheetId"])["cells"]
+        for row_offset, row in enumerate(update["rows"]):
+            for col, cell in enumerate(row["values"]):
+                value = next(iter(cell.get("userEnteredValue", {"": ""}).values()))
+                cells[(start["rowIndex"] + row_offset, start["columnIndex"] + col)] = value
+
+
+def _records(count, **changes):
+    records = []
+    for index in range(count):
+        row = {"書類ID": f"S{index}", "企業名": f"会社{index}", "売上高": 1000 + index, "営業利益率": 1.25}
+        row.update(changes.get(f"S{index}", {}))
+        records.append(FilingRecord.from_row(row))
+    return records
+
+
+def _written_rows(spreadsheet):
+    return sum(len(request["updateCells"]["rows"]) for batch in spreadsheet.batches
+               for request in batch if "rows" in request.get("updateCells", {}))
+
+
+def test_new_sheet_is_written_in_one_request():
+    spreadsheet = FakeSpreadsheet()
+
+    stats = write_rows(spreadsheet, "決算", _records(3))
+
+    assert stats == {"appended": 3, "updated": 0, "unchanged": 0, "requests": 1}
+    values = spreadsheet.values("決算")
+    assert values[0] == SHEET_COLUMNS
+    assert [row[SHEET_COLUMNS.index("書類ID")] for row in values[1:]] == ["S0", "S1", "S2"]
+
+
+def test_unchanged_rows_are_not_written_again():
+    spreadsheet = FakeSpreadsheet()
+    write_rows(spreadsheet, "決算", _records(3))
+    spreadsheet.batches.clear()
+
+    stats = write_rows(spreadsheet, "決算", _records(3))
+
+    assert stats == {"appended": 0, "updated": 0, "unchanged": 3, "requests": 0}
+    assert spreadsheet.batches == []
+
+
+def test_only_changed_and_new_rows_are_written():
+    spreadsheet = FakeSpreadsheet()
+    write_rows(spreadsheet, "決算", _records(3))
+    spreadsheet.batches.clear()
+
+    stats = write_rows(spreadsheet, "決算", _records(4, S1={"売上高": 5}))
+
+    assert stats == {"appended": 1, "updated": 1, "unchanged": 2, "requests": 1}
+    assert _written_rows(spreadsheet) == 2
+    values = spreadsheet.values("決算")
+    assert len(values) == 5
+    assert values[2][SHEET_COLUMNS.index("売上高")] == 5
+    assert values[4][SHEET_COLUMNS.index("書類ID")] == "S3"
+
+
+def test_changed_headers_rewrite_the_whole_sheet():
+    spreadsheet = FakeSpreadsheet()
+    write_rows(spreadsheet, "決算", _records(3), headers=["書類ID", "企業名"])
+    spreadsheet.batches.clear()
+
+    stats = write_rows(spreadsheet, "決算", _records(2))
+
+    assert stats["appended"] == 2 and stats["updated"] == 0
+    assert spreadsheet.values("決算")[0] == SHEET_COLUMNS
+    assert len(spreadsheet.values("決算")) == 3
+
+
+def test_large_writes_are_split_into_chunks():
+    spreadsheet = FakeSpreadsheet()
+
+    stats = write_rows(spreadsheet, "決算", _records(7), chunk_rows=3)
+
+    assert stats["requests"] == 3
+    assert len(spreadsheet.values("決算")) == 8
+
+
+def test_sheet_names_with_quotes_are_escaped_in_ranges():
+    spreadsheet = FakeSpreadsheet()
+    write_rows(spreadsheet, "O'Brien's", _records(2))
+
+    stats = write_rows(spreadsheet, "O'Brien's", _records(2))
+
+    assert len(spreadsheet.ranges) == 1 and spreadsheet.ranges[0].startswith("'O''Brien''s'!A:")
+    assert stats["unchanged"] == 2
+    assert a1_range("決算'25", "A1:B2") == "'決算''25'!A1:B2"
@@ -0,0 +1,95 @@
+"""
+Local output sinks: date partitions, de-duplication by 書類ID and column types
+"""
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from module.records import FilingRecord
+from module.sinks import CsvSink, OutputSink, ParquetSink, SQLiteSink, build_sinks, write_to_sinks
+
+
+def _rows(*filings):
+    return [
+        FilingRecord.from_row({"書類ID": doc_id, "EDINETコード": "E00001", "企業名": "会社", "書類提出日": submitted,
+                               "売上高": sales, "営業利益率": "NA"})
+        for doc_id, submitted, sales in filings
+    ]
+
+
+def test_csv_sink_partitions_by_submission_date_and_replaces_rerun_rows(tmp_path):
+    sink = CsvSink(tmp_path)
+
+    sink.write(_rows(("S1", "2024-06-27 09:00", 100), ("S2", "2024-06-28 09:00", 200)), "2024-06-27")
+    sink.write(_rows(("S1", "2024-06-27 09:00", 150), ("S3", "2024-06-27 10:00", 300)), "2024-06-27")
+
+    frame = sink.read(sink.path_for("2024-06-27"))
+    assert list(frame["書類ID"]) == ["S1", "S3"]
+    assert list(frame["売上高"]) == [150.0, 300.0]
+    assert frame["営業利益率"].isna().all()
+    assert list(sink.read(sink.path_for("2024-06-28"))["書類ID"]) == ["S2"]
+
+
+def test_csv_sink_keeps_identifiers_as_text(tmp_path):
+    sink = CsvSink(tmp_path)
+    row = FilingRecord.from_row({"書類ID": "S1", "EDINETコード": "E00001", "fundコード": "00123", "書類提出日": "2024-06-27"})
+
+    sink.write([row], "2024-06-27")
+
+    assert sink.read(sink.path_for("2024-06-27"))["fundコード"].tolist() == ["00123"]
+
+
+def test_rows_without_submission_date_use_the_run_partition(tmp_path):
+    sink = CsvSink(tmp_path)
+
+    sink.write(_rows(("S1", None, 1)), "2024-07-01")
+
+    assert sink.path_for("2024-07-01").exists()
+
+
+def test_parquet_sink_round_trips_a_partition(tmp_path):
+    pytest.importorskip("pyarrow")
+    sink = ParquetSink(tmp_path)
+
+    sink.write(_rows(("S1", "2024-06-27", 100), ("S2", "2024-06-27", 200)), "2024-06-27")
+    sink.write(_rows(("S2", "2024-06-27", 250)), "2024-06-27")
+
+    frame = pd.read_parquet(tmp_path)
+    assert sorted(zip(frame["書類ID"], frame["売上高"])) == [("S1", 100.0), ("S2", 250.0)]
+    assert frame["date"].astype(str).unique().tolist() == ["2024-06-27"]
+
+
+def test_sqlite_sink_upserts_by_document_id(tmp_path):
+    db_path = tmp_path / "filings.sqlite3"
+    sink = SQLiteSink(db_path)
+
+    sink.write(_rows(("S1", "2024-06-27", 100), ("S2", "2024-06-28", 200)), "2024-06-27")
+    sink.write(_rows(("S1", "2024-06-27", 150)), "2024-06-27")
+
+    with sqlite3.connect(db_path) as connection:
+        rows = connection.execute('SELECT date, "書類ID", "売上高", "営業利益率" FROM filings ORDER BY "書類ID"').fetchall()
+    assert rows == [("2024-06-27", "S1", 150.0, None), ("2024-06-28", "S2", 200.0, None)]
+
+
+class FailingSink(OutputSink):
+    name = "failing"
+
+    def write(self, rows, partition):
+        raise OSError("disk full")
+
+
+def test_one_failing_sink_does_not_stop_the_others(tmp_path):
+    sink = CsvSink(tmp_path)
+
+    results = write_to_sinks([FailingSink(), sink], _rows(("S1", "2024-06-27", 1)), "2024-06-27")
+
+    assert results == {"failing": False, "csv": True}
+    assert sink.path_for("2024-06-27").exists()
+
+
+def test_unknown_sinks_and_sheets_without_a_writer_are_skipped(tmp_path):
+    sinks = build_sinks(["csv", "bogus", "sheets", "sqlite"], tmp_path)
+
+    assert [sink.name for sink in sinks] == ["csv", "sqlite"]
+    assert [sink.name for sink in build_sinks(["sheets"], tmp_path, write_sheets=lambda rows: None)] == ["sheets"]
@@ -0,0 +1,62 @@
+"""
+Per-company history store
+"""
+import sqlite3
+
+from module.records import FilingRecord
+from module.timeseries import TimeSeriesStore, unit_of
+
+
+def _filing(doc_id, submitted_at, **values):
+    return FilingRecord.from_row({
+        "EDINETコード": "E00001", "企業名": "テスト工業株式会社", "書類ID": doc_id,
+        "会計期間開始": "2023-04-01", "会計期間終了": "2024-03-31", "書類提出日": submitted_at,
+    }, values)
+
+
+def test_record_stores_current_and_prior_periods_with_units(tmp_path):
+    store = TimeSeriesStore(tmp_path / "timeseries.sqlite3")
+    record = _filing("S1", "2024-06-27", 売上高=1_000_000, 自己資本比率=40.5)
+    record.periods = {"Prior1Year": {"売上高": 900_000}}
+
+    assert store.record([record]) == 3
+
+    history = store.history("E00001")
+    assert history.index.tolist() == ["2023-03-31", "2024-03-31"]
+    assert history["売上高"].tolist() == [900_000.0, 1_000_000.0]
+    assert history["自己資本比率"].tolist()[1] == 40.5
+    assert history.attrs["単位"] == {"売上高": "JPY", "自己資本比率": "%"}
+    units = sqlite3.connect(tmp_path / "timeseries.sqlite3").execute(
+        "SELECT DISTINCT metric, unit FROM series").fetchall()
+    assert set(units) == {("売上高", "JPY"), ("自己資本比率", "%")}
+
+
+def test_newer_filing_replaces_older_values(tmp_path):
+    store = TimeSeriesStore(tmp_path / "timeseries.sqlite3")
+    original = _filing("S1", "2024-06-27", 売上高=1_000)
+    amended = _filing("S2", "2024-09-30", 売上高=1_100)
+
+    store.record([amended])
+    store.record([original])  # 提出日が古い書類では置き換えない
+
+    assert store.series("E00001", "売上高") == [("2024-03-31", 1_100.0)]
+    assert [filing[0] for filing in store.filings("E00001")] == ["S1", "S2"]
+
+
+def test_cross_section_orders_companies_by_value(tmp_path):
+    store = TimeSeriesStore(tmp_path / "timeseries.sqlite3")
+    low = _filing("S1", "2024-06-27", 自己資本比率=20.0)
+    high = FilingRecord.from_row({"EDINETコード": "E00002", "企業名": "別の会社", "書類ID": "S2",
+                                  "会計期間終了": "2024-03-31", "書類提出日": "2024-06-27", "自己資本比率": 60.0})
+    store.record([low, high])
+
+    table = store.cross_section("自己資本比率", "2024-03-31")
+
+    assert table["EDINETコード"].tolist() == ["E00002", "E00001"]
+    assert table["単位"].tolist() == ["%", "%"]
+    assert table["企業名"].tolist() == ["別の会社", "テスト工業株式会社"]
+
+
+def test_unit_of():
+    assert unit_of("売上高") == "JPY"
+    assert unit_of("自己資本比率") == "%"
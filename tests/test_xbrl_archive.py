@@ -0,0 +1,102 @@
+"""
+Reading the target member out of EDINET archives without extracting them
+"""
+import io
+import os
+import zipfile
+
+from bench.corpus import make_csv_archive, make_xbrl_archive
+from module.financials import analyze_filing
+from module.xbrl_archive import (CENTRAL_DIRECTORY_PROBE_BYTES, find_xbrl_member, match_csv_member,
+                                 match_xbrl_member, member_names_from_tail, read_xbrl_member)
+
+
+def _archive(doc):
+    return make_xbrl_archive(doc, archive_bytes=100_000, xbrl_bytes=50_000)
+
+
+def test_large_xbrl_is_spooled_to_a_file_the_worker_opens(documents):
+    doc = documents[0]
+    codes = [doc["fundCode"], doc["EDINETコード"]]
+    in_memory = read_xbrl_member(_archive(doc), codes)
+
+    spooled = read_xbrl_member(_archive(doc), codes, spool_max_bytes=1024)
+
+    assert in_memory.path is None and spooled.data is None
+    assert spooled.name == in_memory.name
+    with open(spooled.path, "rb") as f:
+        assert f.read() == in_memory.data
+    spooled.discard()
+    assert not os.path.exists(spooled.path)
+    spooled.discard()
+
+
+def test_small_xbrl_stays_in_memory(documents):
+    doc = documents[0]
+
+    member = read_xbrl_member(_archive(doc), [doc["EDINETコード"]], spool_max_bytes=10**9)
+
+    assert member.path is None
+    assert member.source is member.data
+
+
+def test_spooled_xbrl_is_analyzed_like_the_in_memory_one_and_then_removed(documents):
+    doc = documents[0]
+    codes = [doc["fundCode"], doc["EDINETコード"]]
+    spooled = read_xbrl_member(_archive(doc), codes, spool_max_bytes=1024)
+
+    from_file = analyze_filing(doc, spooled)
+    from_memory = analyze_filing(doc, read_xbrl_member(_archive(doc), codes))
+
+    assert from_file.to_row() == from_memory.to_row()
+    assert from_file.periods == from_memory.periods
+    assert not os.path.exists(spooled.path)
+
+
+def _tail(archive: bytes, size: int = CENTRAL_DIRECTORY_PROBE_BYTES):
+    return archive[-size:], len(archive)
+
+
+def test_member_names_from_the_tail_match_the_central_directory(documents):
+    for doc in documents:
+        codes = [doc["fundCode"], doc["EDINETコード"]]
+        for archive, match in ((make_xbrl_archive(doc, archive_bytes=200_000, xbrl_bytes=50_000), match_xbrl_member),
+                               (make_csv_archive(doc), match_csv_member)):
+            with zipfile.ZipFile(io.BytesIO(archive)) as zip_file:
+                names = zip_file.namelist()
+
+            assert member_names_from_tail(*_tail(archive)) == names
+            assert match(member_names_from_tail(*_tail(archive)), codes) == match(names, codes)
+
+
+def test_member_names_from_the_tail_agree_with_find_member(documents):
+    doc = documents[0]
+    archive = make_xbrl_archive(doc, archive_bytes=200_000, xbrl_bytes=50_000)
+    codes = [doc["fundCode"], doc["EDINETコード"]]
+
+    with zipfile.ZipFile(io.BytesIO(archive)) as zip_file:
+        assert match_xbrl_member(member_names_from_tail(*_tail(archive)), codes) == find_xbrl_member(zip_file, codes)
+
+
+def _zip(names, comment=b""):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        for name in names:
+            zip_file.writestr(name, b"x" * 1000)
+        zip_file.comment = comment
+    return buffer.getvalue()
+
+
+def test_utf8_names_and_archive_comments_are_read():
+    names = ["XBRL/PublicDoc/報告書.xbrl", "XBRL/PublicDoc/0101010_honbun.htm"]
+    archive = _zip(names, comment=b"EDINET")
+
+    assert member_names_from_tail(*_tail(archive)) == names
+
+
+def test_tail_without_the_whole_central_directory_is_undecided():
+    archive = _zip([f"XBRL/PublicDoc/file{index:04}.htm" for index in range(50)])
+
+    assert member_names_from_tail(*_tail(archive, 200)) is None
+    assert member_names_from_tail(b"not a zip archive", 1000) is None
+    assert member_names_from_tail(b"", 0) is None
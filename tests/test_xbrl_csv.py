@@ -0,0 +1,39 @@
+"""
+Fact extraction from EDINET's CSV archives (type=5)
+"""
+from bench.corpus import filing_facts, make_csv_archive
+from module.config import config
+from module.periods import extraction_periods
+from module.xbrl_archive import read_csv_member
+from module.xbrl_csv import extract_period_values_from_csv
+
+
+def _element_ids(label_ids):
+    return {label: [element_id] for label, element_id in label_ids}
+
+
+def test_csv_values_match_the_filing_in_yen(documents):
+    for doc in documents:
+        member = read_csv_member(make_csv_archive(doc), [doc["fundCode"], doc["EDINETコード"]])
+        facts = filing_facts(doc)
+
+        values = extract_period_values_from_csv(
+            member.data, _element_ids((label, element_id) for label, element_id, *_ in facts),
+            config['fact_context_priority'], extraction_periods(1),
+        )
+
+        assert values["CurrentYear"] == {label: current for label, _, _, current, _, _ in facts}
+        assert values["Prior1Year"] == {label: prior for label, _, _, _, prior, _ in facts}
+
+
+def test_element_ids_are_tried_in_order(documents):
+    doc = documents[0]
+    member = read_csv_member(make_csv_archive(doc), [doc["EDINETコード"]])
+    label, element_id, _, current, _, _ = filing_facts(doc)[0]
+
+    values = extract_period_values_from_csv(
+        member.data, {label: ["jppfs_cor:Missing", element_id], "未収録": ["jppfs_cor:Missing"]},
+        config['fact_context_priority'], ["CurrentYear"],
+    )
+
+    assert values["CurrentYear"] == {label: current, "未収録": None}
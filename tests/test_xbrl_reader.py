@@ -0,0 +1,185 @@
+"""
+Row classification and per-period extraction from XBRL text blocks
+"""
+from xml.sax.saxutils import escape
+
+import pytest
+
+from bench.corpus import LAYOUTS, filing_facts, make_xbrl
+from module.config import config
+from module.xbrl_reader import (RowMatcher, XbrlDocument, build_fact_index, compile_row_matcher,
+                                extract_period_values_from_xbrl, extract_values_from_facts)
+
+SEARCH_WORDS = ("売上高", "営業利益", "当期純利益", "純資産合計", "負債純資産合計")
+
+
+def legacy_match(cells, pending, search_words):
+    """RowMatcher 導入前の、ワードごとに行を調べるループ（値の取り出しは除く）"""
+    if not cells:
+        return None
+    for word in search_words:
+        if word not in pending:
+            continue
+        if word in cells:
+            if cells.index(word) + 1 >= len(cells):
+                continue
+            return word, True
+        for i, cell in enumerate(cells):
+            if word not in cell or i + 1 >= len(cells):
+                continue
+            return word, False
+    return None
+
+
+ROWS = [
+    [],
+    ["売上高"],
+    ["売上高", "1,000"],
+    ["売上高合計", "1,000"],
+    ["売上原価", "800"],
+    ["営業利益", "200"],
+    ["営業利益又は営業損失", "200"],
+    ["当期純利益", "△50"],
+    ["親会社株主に帰属する当期純利益", "40"],
+    ["純資産合計", "300"],
+    ["負債純資産合計", "900"],
+    ["", "負債純資産合計", "900"],
+    ["※1", "純資産合計", "300", "310"],
+    ["その他の項目", "売上高"],
+    ["売上高", "営業利益", "10"],
+    ["販売費及び一般管理費", "100"],
+    ["営業活動によるキャッシュ・フロー", "120"],
+]
+
+
+@pytest.mark.parametrize("cells", ROWS)
+def test_row_matcher_matches_legacy_loop(cells):
+    for pending in (set(SEARCH_WORDS), {"営業利益", "負債純資産合計"}, {"当期純利益"}, set()):
+        assert RowMatcher(SEARCH_WORDS).match(cells, pending) == legacy_match(cells, pending, SEARCH_WORDS)
+
+
+def test_row_matcher_matches_legacy_loop_on_corpus(documents):
+    for doc in documents:
+        xbrl = XbrlDocument(make_xbrl(doc, xbrl_bytes=20_000))
+        for block_name in LAYOUTS["regular"]["blocks"]:
+            for row in xbrl.block_html(block_name).findall(".//tr"):
+                cells = [cell.text_content().strip() for cell in row.findall(".//td")] + \
+                        [cell.text_content().strip() for cell in row.findall(".//th")]
+                assert RowMatcher(SEARCH_WORDS).match(cells, set(SEARCH_WORDS)) == \
+                    legacy_match(cells, set(SEARCH_WORDS), SEARCH_WORDS)
+
+
+def test_row_matcher_is_compiled_once_per_search_words():
+    assert compile_row_matcher(SEARCH_WORDS) is compile_row_matcher(tuple(SEARCH_WORDS))
+    assert compile_row_matcher(SEARCH_WORDS) is not compile_row_matcher(SEARCH_WORDS[:2])
+
+
+def _in_millions(value):
+    # コーパスのテキストブロックは百万円未満を切り捨てて表示する
+    millions = abs(value) // 10**6 * 10**6
+    return -millions if value < 0 else millions
+
+
+def test_prior_period_values_are_read_by_column_position(documents):
+    doc = documents[0]
+    xbrl = XbrlDocument(make_xbrl(doc, xbrl_bytes=20_000))
+    facts = filing_facts(doc)
+
+    for block_name, items in LAYOUTS["regular"]["blocks"].items():
+        labels = [label for label, _, _ in items]
+        values = extract_period_values_from_xbrl(xbrl, block_name, labels, periods=("CurrentYear", "Prior1Year"))
+        for label, _, _, current, prior, fact_block in facts:
+            if fact_block != block_name:
+                continue
+            assert values["CurrentYear"][label] == _in_millions(current)
+            assert values["Prior1Year"][label] == _in_millions(prior)
+
+
+def _block_document(rows_html: str) -> XbrlDocument:
+    block = escape(f"<div><p>（単位：千円）</p><table>{rows_html}</table></div>")
+    return XbrlDocument(
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<xbrli:xbrl xmlns:xbrli="http://www.xbrl.org/2003/instance"'
+        ' xmlns:jpcrp_cor="http://disclosure.edinet-fsa.go.jp/taxonomy/jpcrp/2023-12-01/jpcrp_cor">'
+        f'<jpcrp_cor:BalanceSheetTextBlock contextRef="CurrentYearInstant">{block}</jpcrp_cor:BalanceSheetTextBlock>'
+        '</xbrli:xbrl>'.encode("utf-8")
+    )
+
+
+def test_prior_period_columns_count_from_the_right():
+    xbrl = _block_document(
+        "<tr><td>純資産合計</td><td>※2</td><td>100</td><td>200</td><td>300</td></tr>"
+        "<tr><td>負債純資産合計</td><td>※3</td><td>900</td></tr>"
+    )
+
+    values = extract_period_values_from_xbrl(
+        xbrl, "BalanceSheetTextBlock", ["純資産合計", "負債純資産合計"],
+        periods=("CurrentYear", "Prior1Year", "Prior2Year"),
+    )
+
+    assert values["CurrentYear"] == {"純資産合計": 300_000, "負債純資産合計": 900_000}
+    assert values["Prior1Year"] == {"純資産合計": 200_000, "負債純資産合計": None}
+    assert values["Prior2Year"] == {"純資産合計": 100_000, "負債純資産合計": None}
+
+
+def test_tagged_facts_match_the_filing_with_and_without_early_stop(documents):
+    context_priority = config['fact_context_priority']
+    for doc in documents:
+        xbrl = make_xbrl(doc, xbrl_bytes=50_000)
+        facts = filing_facts(doc)
+        element_ids = {label: [element_id] for label, element_id, *_ in facts}
+
+        full_index = build_fact_index(xbrl)
+        stopped_index = build_fact_index(xbrl, element_ids, context_priority, ("CurrentYear", "Prior1Year"))
+
+        assert len(stopped_index) < len(full_index)
+        for index in (full_index, stopped_index):
+            assert extract_values_from_facts(index, element_ids, context_priority) == \
+                {label: current for label, _, _, current, _, _ in facts}
+            assert extract_values_from_facts(index, element_ids, context_priority, "Prior1Year") == \
+                {label: prior for label, _, _, _, prior, _ in facts}
+
+
+def test_tagged_facts_skip_nil_values_and_text_blocks():
+    xbrl = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<xbrli:xbrl xmlns:xbrli="http://www.xbrl.org/2003/instance"'
+        ' xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"'
+        ' xmlns:jppfs_cor="http://disclosure.edinet-fsa.go.jp/taxonomy/jppfs/2023-12-01/jppfs_cor">'
+        '<jppfs_cor:NetSales contextRef="CurrentYearDuration" xsi:nil="true"/>'
+        '<jppfs_cor:RevenueTextBlock contextRef="CurrentYearDuration">&lt;p&gt;1&lt;/p&gt;</jppfs_cor:RevenueTextBlock>'
+        '<jppfs_cor:OperatingRevenue1 contextRef="CurrentYearDuration_NonConsolidatedMember">500</jppfs_cor:OperatingRevenue1>'
+        '<jppfs_cor:OperatingIncomeRatio contextRef="CurrentYearDuration">0.25</jppfs_cor:OperatingIncomeRatio>'
+        '</xbrli:xbrl>'
+    ).encode("utf-8")
+
+    index = build_fact_index(xbrl)
+    values = extract_values_from_facts(
+        index, {"売上高": ["jppfs_cor:NetSales", "jppfs_cor:OperatingRevenue1"], "営業利益": ["jppfs_cor:OperatingIncome"]},
+        config['fact_context_priority'],
+    )
+
+    assert ("jppfs_cor:RevenueTextBlock", "CurrentYearDuration") not in index
+    assert values == {"売上高": 500, "営業利益": None}
+
+
+def test_streaming_document_reads_the_same_blocks_from_a_path(documents, tmp_path):
+    doc = documents[0]
+    path = tmp_path / "filing.xbrl"
+    path.write_bytes(make_xbrl(doc, xbrl_bytes=50_000))
+    block_names = list(LAYOUTS["regular"]["blocks"])
+
+    streamed = XbrlDocument(str(path), block_names=block_names)
+    parsed = XbrlDocument(path.read_bytes())
+
+    assert streamed.root is None
+    for block_name in block_names:
+        assert streamed.block_html(block_name).text_content() == parsed.block_html(block_name).text_content()
+    assert streamed.block_html("MissingTextBlock") is None
+
+
+def test_find_block_is_rejected_in_streaming_mode(documents):
+    xbrl = XbrlDocument(make_xbrl(documents[0], xbrl_bytes=20_000), block_names=["BalanceSheetTextBlock"])
+
+    with pytest.raises(RuntimeError, match="block_html"):
+        xbrl.find_block("BalanceSheetTextBlock")